@@ -0,0 +1,3 @@
+"""
+Бенчмарки бота (запуск из корня проекта: python -m benchmarks.<имя>)
+"""
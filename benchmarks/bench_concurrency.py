@@ -0,0 +1,57 @@
+"""
+Бенчмарк: пропускная способность при конкурентных обновлениях
+
+Каждое "обновление" повторяет обращения к БД одного шага записи
+(список услуг, свободные слоты, записи пользователя). Обновления
+запускаются пачками разного размера поверх общего пула соединений:
+при синхронном драйвере пропускная способность не росла бы
+с ростом конкурентности. Требуется локальный PostgreSQL из .env.
+
+Запуск: python -m benchmarks.bench_concurrency
+"""
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+from config import MASTERS_SCHEDULE
+from database import init_db, close_all_connections, get_all_services, get_bookings_by_user
+from utils import get_available_time_slots
+
+UPDATES = 500
+CONCURRENCY_LEVELS = [1, 5, 10, 50]
+
+
+async def simulate_update(i: int, date_str: str, masters: list):
+    """Обращения к БД, которые делает обработчик одного обновления"""
+    await get_all_services()
+    await get_available_time_slots(masters[i % len(masters)], date_str)
+    await get_bookings_by_user(i)
+
+
+async def run(concurrency: int, date_str: str, masters: list):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(i: int):
+        async with semaphore:
+            await simulate_update(i, date_str, masters)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(bounded(i) for i in range(UPDATES)))
+    elapsed = time.perf_counter() - started
+
+    print(f"concurrency {concurrency:>3}: {UPDATES / elapsed:8.1f} updates/sec")
+
+
+async def main():
+    await init_db()
+    try:
+        date_str = (datetime.now().date() + timedelta(days=1)).isoformat()
+        masters = list(MASTERS_SCHEDULE.keys())
+        for concurrency in CONCURRENCY_LEVELS:
+            await run(concurrency, date_str, masters)
+    finally:
+        await close_all_connections()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,102 @@
+"""
+Бенчмарк: память и скорость хранилища состояний FSM
+
+Заполняет MemoryStorage aiogram и BoundedFSMStorage одинаковыми сессиями
+на шаге подтверждения записи (все ключи сценария заполнены) и сравнивает
+память на сессию (tracemalloc) и время update_data + get_data. Затем
+проверяет предел числа сессий: пользователи, бросившие сценарий,
+вытесняются, и память BoundedFSMStorage не растет с их числом.
+
+Запуск: STORAGE_BACKEND=memory python -m benchmarks.bench_fsm_storage
+"""
+import asyncio
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from database import init_storage, close_storage, get_all_services, services_catalogue
+from database.init_data import init_services
+from database.occupancy import SLOT_LABELS
+from handlers.client_handlers import BookingStates
+from utils import BoundedFSMStorage, schedule_index
+
+SESSIONS = 10_000
+ABANDONED = 50_000
+CAP = 10_000
+BOT_ID = 123456
+
+
+def session_data(i: int, services: list) -> dict:
+    service = services[i % len(services)]
+    return {
+        'service_id': service['id'],
+        'service_name': service['name'],
+        'service_duration': service['duration_minutes'],
+        'master': schedule_index.masters[i % len(schedule_index.masters)],
+        'booking_date': (date.today() + timedelta(days=i % 14)).isoformat(),
+        'booking_time': SLOT_LABELS[24 + i % 16],
+    }
+
+
+def key(user_id: int) -> StorageKey:
+    return StorageKey(bot_id=BOT_ID, chat_id=user_id, user_id=user_id)
+
+
+async def fill(storage, services: list, count: int):
+    for i in range(count):
+        await storage.set_state(key(i), BookingStates.confirming)
+        await storage.set_data(key(i), session_data(i, services))
+
+
+async def measure_memory(storage, services: list) -> float:
+    """Байт на сессию по приросту выделенной памяти"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    await fill(storage, services, SESSIONS)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / SESSIONS
+
+
+async def measure_speed(storage) -> float:
+    """Микросекунд на пару update_data + get_data"""
+    started = time.perf_counter()
+    for i in range(SESSIONS):
+        await storage.update_data(key(i), {'booking_time': SLOT_LABELS[30]})
+        await storage.get_data(key(i))
+    return (time.perf_counter() - started) / SESSIONS * 1e6
+
+
+async def main():
+    await init_storage()
+    try:
+        await init_services()
+        await services_catalogue.reload()
+        services = await get_all_services()
+
+        print(f"sessions: {SESSIONS}")
+        for name, storage in (
+            ("MemoryStorage", MemoryStorage()),
+            ("BoundedFSMStorage", BoundedFSMStorage(ttl=3600, max_sessions=SESSIONS)),
+        ):
+            per_session = await measure_memory(storage, services)
+            speed = await measure_speed(storage)
+            line = f"{name:18s} {per_session:7.0f} bytes/session  {speed:6.1f} us/update+get"
+            if isinstance(storage, BoundedFSMStorage):
+                line += f"  (reported: {storage.stats()['bytes_per_session']:.0f} bytes/session)"
+            print(line)
+
+        storage = BoundedFSMStorage(ttl=3600, max_sessions=CAP)
+        await fill(storage, services, ABANDONED)
+        stats = storage.stats()
+        print(f"{ABANDONED} abandoned flows, cap {CAP}: {stats['sessions']} sessions kept, "
+              f"{stats['evicted']} evicted")
+    finally:
+        await close_storage()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
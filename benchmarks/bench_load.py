@@ -0,0 +1,229 @@
+"""
+Бенчмарк: сквозная нагрузка на сценарий записи
+
+Тысячи пользователей одновременно проходят /start -> услуга -> мастер ->
+дата -> время -> подтверждение через client_router и admin_router,
+часть из них открывает /my_bookings и отменяет запись, администратор
+смотрит записи на день. Обновления подаются в Dispatcher с ботом
+без сети (benchmarks/fake_telegram.py), пользователь нажимает кнопки
+последнего показанного ему экрана.
+
+Хранилище - по STORAGE_BACKEND: 'memory' не требует PostgreSQL,
+'postgres' пишет записи в базу из .env (используйте тестовую базу).
+
+Выводит обновления в секунду, p50/p95/p99 задержки обработки одного
+обновления, обращения к хранилищу на обновление и число двойных
+бронирований: пересечений записей одного мастера, о создании которых
+пользователи получили подтверждение.
+
+Запуск: STORAGE_BACKEND=memory python -m benchmarks.bench_load
+"""
+import asyncio
+import logging
+import random
+import time
+
+from aiogram import Bot
+
+from config import ADMIN_IDS, STORAGE_BACKEND
+from database import (
+    init_storage,
+    close_storage,
+    get_repository,
+    set_repository,
+    get_all_services
+)
+from database.init_data import init_services
+from database.occupancy import span_bits
+from benchmarks.fake_telegram import (
+    FAKE_BOT_TOKEN,
+    FakeSession,
+    UpdateFactory,
+    CountingRepository,
+    build_dispatcher,
+    percentile
+)
+
+USERS = 2000
+CONCURRENCY = 200
+MY_BOOKINGS_RATE = 0.3
+CANCEL_RATE = 0.5
+ANY_MASTER_RATE = 0.1
+ADMIN_EVERY = 100
+MAX_STEPS = 12
+FIRST_USER_ID = 1_000_000
+SEED = 42
+
+
+def weighted_choice(rng: random.Random, buttons: list) -> str:
+    """Кнопка с перекосом к первым (ранние даты и время популярнее)"""
+    weights = [1 / (i + 1) for i in range(len(buttons))]
+    return rng.choices(buttons, weights)[0]
+
+
+class LoadRun:
+    """Прогон нагрузки: подача обновлений, замеры и журнал подтвержденных записей"""
+
+    def __init__(self, dp, bot, session: FakeSession):
+        self.dp = dp
+        self.bot = bot
+        self.session = session
+        self.updates = UpdateFactory(bot)
+        self.latencies = []
+        self.confirmed = {}
+        self.alerts = 0
+        self.cancelled = 0
+        self.durations = {}
+
+    async def feed(self, update, chat_id: int):
+        """Подать обновление; вернуть показанный экран (текст, callback_data кнопок) или None"""
+        started = time.perf_counter()
+        await self.dp.feed_update(self.bot, update)
+        self.latencies.append(time.perf_counter() - started)
+
+        if update.callback_query and self.session.take_alert(update.callback_query.id):
+            self.alerts += 1
+
+        screen = self.session.take_screen(chat_id)
+        if screen is None:
+            return None
+        text, markup = screen
+        buttons = [button.callback_data
+                   for row in (markup.inline_keyboard if markup else [])
+                   for button in row]
+        return text, buttons
+
+    async def book(self, rng: random.Random, user_id: int):
+        """Пройти сценарий записи, нажимая кнопки показанных экранов"""
+        screen = await self.feed(self.updates.message(user_id, "/start"), user_id)
+        choice = {}
+
+        for _ in range(MAX_STEPS):
+            if screen is None:
+                return
+            text, buttons = screen
+
+            if "Запись успешно создана" in text:
+                self.confirmed[user_id] = choice
+                return
+            if not buttons:
+                return
+
+            if buttons[0].startswith("service:"):
+                data = rng.choice(buttons)
+                choice['duration'] = self.durations[int(data.split(":")[1])]
+            elif buttons[0].startswith("master"):
+                masters = [b for b in buttons if b.startswith("master:")]
+                if "master_any" in buttons and rng.random() < ANY_MASTER_RATE:
+                    data = "master_any"
+                else:
+                    data = rng.choice(masters)
+                    choice['master'] = data.split(":")[1]
+            elif buttons[0].startswith("nearest:"):
+                data = weighted_choice(rng, buttons)
+                _, choice['master'], choice['date'], choice['time'] = data.split(":", 3)
+            elif buttons[0].startswith("date:"):
+                data = weighted_choice(rng, buttons)
+                choice['date'] = data.split(":")[1]
+            elif buttons[0].startswith("time:"):
+                data = weighted_choice(rng, buttons)
+                choice['time'] = data.split(":", 1)[1]
+            elif "confirm_booking" in buttons:
+                data = "confirm_booking"
+            else:
+                return
+
+            screen = await self.feed(self.updates.callback(user_id, data), user_id)
+
+    async def my_bookings(self, rng: random.Random, user_id: int):
+        """Открыть /my_bookings и, возможно, отменить свою запись"""
+        screen = await self.feed(self.updates.message(user_id, "/my_bookings"), user_id)
+        views = [b for b in (screen[1] if screen else []) if b.startswith("view_booking:")]
+        if not views or rng.random() >= CANCEL_RATE:
+            return
+
+        screen = await self.feed(self.updates.callback(user_id, views[0]), user_id)
+        cancels = [b for b in (screen[1] if screen else []) if b.startswith("confirm_cancel:")]
+        if not cancels:
+            return
+
+        screen = await self.feed(self.updates.callback(user_id, cancels[0]), user_id)
+        if screen and "успешно отменена" in screen[0]:
+            self.confirmed.pop(user_id, None)
+            self.cancelled += 1
+
+    async def admin(self, rng: random.Random):
+        """Администратор смотрит записи на случайный день"""
+        admin_id = ADMIN_IDS[0]
+        screen = await self.feed(self.updates.message(admin_id, "/bookings"), admin_id)
+        if screen and screen[1]:
+            await self.feed(self.updates.callback(admin_id, rng.choice(screen[1])), admin_id)
+
+    async def user(self, i: int):
+        rng = random.Random(SEED + i)
+        if i % ADMIN_EVERY == ADMIN_EVERY - 1:
+            await self.admin(rng)
+            return
+
+        user_id = FIRST_USER_ID + i
+        await self.book(rng, user_id)
+        if rng.random() < MY_BOOKINGS_RATE:
+            await self.my_bookings(rng, user_id)
+
+    def violations(self) -> int:
+        """Пересечения подтвержденных (и не отмененных) записей одного мастера"""
+        occupancy = {}
+        violations = 0
+        for choice in self.confirmed.values():
+            key = (choice['master'], choice['date'])
+            bits = span_bits(choice['time'], choice['duration'])
+            if occupancy.get(key, 0) & bits:
+                violations += 1
+            occupancy[key] = occupancy.get(key, 0) | bits
+        return violations
+
+
+async def main():
+    logging.basicConfig(level=logging.WARNING)
+
+    repository = CountingRepository(get_repository())
+    set_repository(repository)
+    await init_storage()
+
+    session = FakeSession()
+    bot = Bot(token=FAKE_BOT_TOKEN, session=session)
+    try:
+        await init_services()
+        run = LoadRun(build_dispatcher(), bot, session)
+        run.durations = {s['id']: s['duration_minutes'] for s in await get_all_services()}
+        repository.calls = 0
+
+        semaphore = asyncio.Semaphore(CONCURRENCY)
+
+        async def bounded(i: int):
+            async with semaphore:
+                await run.user(i)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(bounded(i) for i in range(USERS)))
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(run.latencies)
+        updates = len(latencies)
+        print(f"backend: {STORAGE_BACKEND}, users: {USERS}, concurrency: {CONCURRENCY}")
+        print(f"updates:             {updates} in {elapsed:.2f}s")
+        print(f"updates/sec:         {updates / elapsed:.1f}")
+        print(f"latency p50/p95/p99: {percentile(latencies, 0.50) * 1000:.2f} / "
+              f"{percentile(latencies, 0.95) * 1000:.2f} / "
+              f"{percentile(latencies, 0.99) * 1000:.2f} ms")
+        print(f"storage calls/update: {repository.calls / updates:.2f}")
+        print(f"bookings confirmed:  {len(run.confirmed) + run.cancelled} "
+              f"(cancelled {run.cancelled}, alerts {run.alerts})")
+        print(f"double bookings:     {run.violations()}")
+    finally:
+        await bot.session.close()
+        await close_storage()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
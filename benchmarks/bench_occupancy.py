@@ -0,0 +1,100 @@
+"""
+Бенчмарк: память и скорость битовых карт занятости
+
+Строит занятость всех мастеров на весь горизонт записи
+(BOOKING_DAYS_AHEAD + 1 дней) при заполненности около 50% и сравнивает
+битовые карты со списками строк-записей и множествами 'ЧЧ:ММ'.
+База данных не нужна.
+
+Запуск: python -m benchmarks.bench_occupancy
+"""
+import random
+import timeit
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+from config import BOOKING_DAYS_AHEAD
+from database.occupancy import SLOT_LABELS, iter_slots, slot_bit, slot_time
+from utils import schedule_index
+
+ROUNDS = 100000
+FILL_RATIO = 0.5
+
+
+def build_horizon(today: date):
+    """Случайная занятость: {(мастер, дата): битовая карта}"""
+    rng = random.Random(42)
+    horizon = {}
+    for i in range(BOOKING_DAYS_AHEAD + 1):
+        day = today + timedelta(days=i)
+        for master in schedule_index.masters:
+            work = schedule_index.work_mask(master)
+            occupancy = 0
+            for index in iter_slots(work):
+                if rng.random() < FILL_RATIO:
+                    occupancy |= 1 << index
+            horizon[(master, day)] = occupancy
+    return horizon
+
+
+def measure(build) -> int:
+    """Память (байт), занятая результатом build()"""
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    result = build()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    del result
+    return size
+
+
+def main():
+    today = datetime.now().date()
+    horizon = build_horizon(today)
+    keys = len(horizon)
+    booked = sum(occupancy.bit_count() for occupancy in horizon.values())
+
+    def as_bitmaps():
+        return {key: occupancy for key, occupancy in horizon.items()}
+
+    def as_label_sets():
+        return {
+            key: {SLOT_LABELS[i] for i in iter_slots(occupancy)}
+            for key, occupancy in horizon.items()
+        }
+
+    def as_rows():
+        return [
+            {'master': master, 'booking_date': day, 'booking_time': slot_time(i)}
+            for (master, day), occupancy in horizon.items()
+            for i in iter_slots(occupancy)
+        ]
+
+    print(f"horizon: {keys} (master, date) keys, {booked} booked slots")
+    for name, build in [("bitmaps", as_bitmaps), ("label sets", as_label_sets), ("dict rows", as_rows)]:
+        size = measure(build)
+        print(f"{name:<12} {size:>9} bytes   {size / keys:8.1f} bytes/key")
+
+    master = schedule_index.masters[0]
+    day = next(d for (m, d) in horizon if m == master and schedule_index.works_on(m, d))
+    occupancy = horizon[(master, day)]
+    labels = {SLOT_LABELS[i] for i in iter_slots(occupancy)}
+    now = datetime.combine(day, datetime.min.time())
+    probe = '18:00'
+    probe_bit = slot_bit(probe)
+
+    print(f"--- operations ({master}, {day})")
+    for name, func in [
+        ("free slots", lambda: schedule_index.free_slots(master, day, occupancy, now)),
+        ("first free", lambda: schedule_index.first_free_slot(master, day, occupancy, now)),
+        ("free count", lambda: schedule_index.free_count(master, day, occupancy, now)),
+        ("conflict (bit)", lambda: occupancy & probe_bit),
+        ("conflict (set)", lambda: probe in labels),
+    ]:
+        seconds = timeit.timeit(func, number=ROUNDS)
+        print(f"{name:<16} {seconds / ROUNDS * 1e9:8.0f} ns/call")
+
+
+if __name__ == "__main__":
+    main()
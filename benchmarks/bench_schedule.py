@@ -0,0 +1,93 @@
+"""
+Микробенчмарк: расчет дат и слотов по графику мастера
+
+Сравнивает прежний расчет (strptime, datetime.combine и datetime.now
+на каждый слот) с предвычисленным ScheduleIndex. База данных не нужна:
+занятые слоты передаются готовым множеством / битовой картой.
+
+Запуск: python -m benchmarks.bench_schedule
+"""
+import timeit
+from datetime import date, datetime, timedelta
+
+from config import MASTERS_SCHEDULE, BOOKING_DAYS_AHEAD, SLOT_DURATION_MINUTES
+from database.occupancy import slot_bit
+from utils import schedule_index
+
+ROUNDS = 20000
+BOOKED_TIMES = frozenset({'13:00', '15:30', '18:00'})
+OCCUPANCY = slot_bit('13:00') | slot_bit('15:30') | slot_bit('18:00')
+
+
+def legacy_dates(master: str) -> list:
+    """Прежний get_available_dates"""
+    schedule = MASTERS_SCHEDULE.get(master)
+    available_dates = []
+    today = datetime.now().date()
+    for i in range(BOOKING_DAYS_AHEAD + 1):
+        day = today + timedelta(days=i)
+        weekday = day.weekday()
+        if weekday in schedule['days']:
+            if i == 0:
+                display = f"Сегодня ({day.strftime('%d.%m')})"
+            elif i == 1:
+                display = f"Завтра ({day.strftime('%d.%m')})"
+            else:
+                weekday_names = ['ПН', 'ВТ', 'СР', 'ЧТ', 'ПТ', 'СБ', 'ВС']
+                display = f"{weekday_names[weekday]} {day.strftime('%d.%m')}"
+            available_dates.append({'display': display, 'value': day.isoformat()})
+    return available_dates
+
+
+def legacy_slots(master: str, date_str: str) -> list:
+    """Прежний get_available_time_slots без обращений к БД"""
+    schedule = MASTERS_SCHEDULE.get(master)
+    start_time = datetime.strptime(schedule['start'], '%H:%M').time()
+    end_time = datetime.strptime(schedule['end'], '%H:%M').time()
+    slots = []
+    current_time = datetime.combine(datetime.today(), start_time)
+    end_datetime = datetime.combine(datetime.today(), end_time)
+    while current_time < end_datetime:
+        slot_time = current_time.strftime('%H:%M')
+        if slot_time not in BOOKED_TIMES:
+            date_obj = datetime.fromisoformat(date_str).date()
+            if date_obj == datetime.now().date():
+                slot_datetime = datetime.strptime(slot_time, '%H:%M').time()
+                if slot_datetime <= datetime.now().time():
+                    current_time += timedelta(minutes=SLOT_DURATION_MINUTES)
+                    continue
+            slots.append(slot_time)
+        current_time += timedelta(minutes=SLOT_DURATION_MINUTES)
+    return slots
+
+
+def indexed_slots(master: str, date_str: str) -> list:
+    """Расчет слотов через ScheduleIndex"""
+    return schedule_index.free_slots(
+        master, date.fromisoformat(date_str), OCCUPANCY, datetime.now()
+    )
+
+
+def report(name: str, func):
+    seconds = timeit.timeit(func, number=ROUNDS)
+    print(f"{name:<16} {seconds / ROUNDS * 1e6:8.2f} us/call")
+    return seconds
+
+
+def main():
+    master = schedule_index.masters[0]
+    today = datetime.now().date().isoformat()
+
+    print(f"--- dates ({master})")
+    before = report("before", lambda: legacy_dates(master))
+    after = report("after", lambda: schedule_index.dates(master, datetime.now().date()))
+    print(f"speedup: x{before / after:.1f}")
+
+    print(f"--- slots ({master}, {today})")
+    before = report("before", lambda: legacy_slots(master, today))
+    after = report("after", lambda: indexed_slots(master, today))
+    print(f"speedup: x{before / after:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Бенчмарк: конфликты при записи с удержанием слотов и без него
+
+Клиенты одновременно смотрят свободное время одного мастера на одну
+дату, думают и выбирают слот. Без удержаний занятый за время раздумий
+слот обнаруживается только при создании записи, и клиенту приходится
+начинать заново с /start. С удержаниями выбор времени сразу закрепляет
+слот (или сразу показывает обновленный список), а подтверждение
+не конфликтует.
+
+Клиенты вызывают те же функции, что и обработчики бота:
+get_available_time_slots, hold_slot, create_booking и slot_holds.release.
+Каждый прогон записывает на свою пару (мастер, дата), поэтому прогоны
+не видят записей друг друга.
+
+Хранилище - по STORAGE_BACKEND: 'memory' не требует PostgreSQL,
+'postgres' пишет записи в базу из .env (используйте тестовую базу).
+
+Запуск: STORAGE_BACKEND=memory python -m benchmarks.bench_slot_holds
+"""
+import asyncio
+import itertools
+import logging
+import random
+from datetime import date
+
+from config import STORAGE_BACKEND
+from database import (
+    init_storage,
+    close_storage,
+    get_all_services,
+    create_booking,
+    slot_holds,
+    BOOKING_CREATED,
+    BOOKING_CONFLICT
+)
+from database.init_data import init_services
+from utils import schedule_index, get_available_time_slots, hold_slot
+
+USERS = 40
+ARRIVAL_WINDOW = 3.0
+THINK_TIME = (0.05, 0.4)
+CONFIRM_TIME = (0.02, 0.1)
+SEEDS = (1, 2, 3)
+
+
+class Simulation:
+    def __init__(self, use_holds: bool, seed: int, master: str, day: str, service: dict,
+                 first_user_id: int):
+        self.use_holds = use_holds
+        self.rng = random.Random(seed)
+        self.master = master
+        self.day = day
+        self.service = service
+        self.first_user_id = first_user_id
+        self.booked = 0
+        self.final_conflicts = 0
+        self.retries = 0
+        self.no_slots = 0
+        self.errors = 0
+
+    async def pick(self, user_id: int):
+        slots = await get_available_time_slots(
+            self.master, self.day, self.service['duration_minutes'], user_id
+        )
+        return self.rng.choice(slots) if slots else None
+
+    async def client(self, i: int):
+        user_id = self.first_user_id + i
+        await asyncio.sleep(self.rng.uniform(0, ARRIVAL_WINDOW))
+
+        booking_time = await self.pick(user_id)
+        while booking_time is not None:
+            await asyncio.sleep(self.rng.uniform(*THINK_TIME))
+
+            if self.use_holds:
+                held = await hold_slot(
+                    user_id, self.master, self.day, booking_time, self.service['duration_minutes']
+                )
+                if not held:
+                    # Сразу показываем обновленный список времени
+                    self.retries += 1
+                    booking_time = await self.pick(user_id)
+                    continue
+                await asyncio.sleep(self.rng.uniform(*CONFIRM_TIME))
+
+            result = await create_booking(
+                user_id, f"user{user_id}", self.service['id'], self.master, self.day, booking_time
+            )
+            if result['status'] == BOOKING_CREATED:
+                self.booked += 1
+                return
+            if result['status'] != BOOKING_CONFLICT:
+                self.errors += 1
+                return
+
+            # Ошибка на последнем шаге: клиент начинает заново с /start
+            self.final_conflicts += 1
+            slot_holds.release(user_id)
+            booking_time = await self.pick(user_id)
+
+        self.no_slots += 1
+
+    async def run(self):
+        await asyncio.gather(*(self.client(i) for i in range(USERS)))
+
+
+def report(name: str, sim: Simulation):
+    attempts = sim.booked + sim.final_conflicts
+    print(
+        f"{name:<14} booked: {sim.booked:3}  "
+        f"final-step conflicts: {sim.final_conflicts:3} ({sim.final_conflicts / max(attempts, 1):6.1%} of attempts)  "
+        f"in-flow retries: {sim.retries:3}  left without slot: {sim.no_slots:3}  errors: {sim.errors}"
+    )
+
+
+def booking_days(count: int) -> list:
+    """count пар (мастер, дата) без сегодняшнего дня: у каждого прогона свободный день"""
+    today = date.today()
+    days = [
+        (master, date_info['value'])
+        for master in schedule_index.masters
+        for date_info in schedule_index.dates(master, today)
+        if date_info['date'] != today
+    ]
+    if len(days) < count:
+        raise RuntimeError(f"Need {count} working days in the booking horizon, found {len(days)}")
+    return days[:count]
+
+
+async def main():
+    await init_storage()
+    try:
+        await init_services()
+        services = await get_all_services()
+        # Самая короткая услуга: слотов хватает на большинство клиентов
+        service = min(services, key=lambda s: s['duration_minutes'])
+        days = iter(booking_days(2 * len(SEEDS)))
+        user_ids = itertools.count(5_000_000, USERS)
+        print(f"backend: {STORAGE_BACKEND}, clients per day: {USERS}, "
+              f"service: {service['name']} ({service['duration_minutes']} min)")
+
+        for seed in SEEDS:
+            print(f"--- seed {seed}")
+            for name, use_holds in (("without holds", False), ("with holds", True)):
+                master, day = next(days)
+                sim = Simulation(use_holds, seed, master, day, service, next(user_ids))
+                await sim.run()
+                report(name, sim)
+    finally:
+        await close_storage()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(main())
@@ -0,0 +1,87 @@
+"""
+Бенчмарк: количество обращений к БД на одно нажатие даты
+
+Сравнивает старый способ (запрос на каждый слот) с одним запросом
+get_occupancy. Кэш занятости сбрасывается перед каждым нажатием, чтобы
+измерять холодный путь. Требуется локальный PostgreSQL из настроек .env.
+
+Запуск: python -m benchmarks.bench_time_slots
+"""
+import asyncio
+import time
+from datetime import date, datetime, timedelta
+
+from config import MASTERS_SCHEDULE, SLOT_DURATION_MINUTES
+import database.postgres_repository as postgres_repository
+from database import init_db, close_all_connections, availability_cache
+from utils import get_available_time_slots
+
+ROUNDS = 50
+
+
+class RoundTripCounter:
+    """Подсчет выдач соединений из пула (одна выдача = один запрос)"""
+
+    def __init__(self):
+        self.count = 0
+        self._original = postgres_repository.get_connection
+
+    def __enter__(self):
+        def counting_get_connection():
+            self.count += 1
+            return self._original()
+
+        postgres_repository.get_connection = counting_get_connection
+        return self
+
+    def __exit__(self, *exc):
+        postgres_repository.get_connection = self._original
+
+
+async def legacy_time_slots(master: str, date_str: str) -> list:
+    """Прежняя реализация: отдельный запрос на каждый слот"""
+    schedule = MASTERS_SCHEDULE[master]
+    current = datetime.strptime(schedule['start'], '%H:%M')
+    end = datetime.strptime(schedule['end'], '%H:%M')
+    slots = []
+    while current < end:
+        slot_time = current.strftime('%H:%M')
+        async with postgres_repository.get_connection() as conn:
+            count = await conn.fetchval("""
+                SELECT COUNT(*) FROM bookings
+                WHERE master = $1 AND booking_date = $2 AND booking_time = $3
+            """, master, date.fromisoformat(date_str), current.time())
+        if count == 0:
+            slots.append(slot_time)
+        current += timedelta(minutes=SLOT_DURATION_MINUTES)
+    return slots
+
+
+async def run(name: str, func, master: str, date_str: str):
+    with RoundTripCounter() as counter:
+        started = time.perf_counter()
+        for _ in range(ROUNDS):
+            availability_cache.drop_before(date.max)
+            await func(master, date_str)
+        elapsed = time.perf_counter() - started
+
+    print(
+        f"{name:<10} round trips/tap: {counter.count / ROUNDS:5.1f}   "
+        f"avg latency: {elapsed / ROUNDS * 1000:7.2f} ms"
+    )
+
+
+async def main():
+    await init_db()
+    try:
+        date_str = (datetime.now().date() + timedelta(days=1)).isoformat()
+        for master in MASTERS_SCHEDULE:
+            print(f"--- {master} ({date_str})")
+            await run("before", legacy_time_slots, master, date_str)
+            await run("after", get_available_time_slots, master, date_str)
+    finally:
+        await close_all_connections()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
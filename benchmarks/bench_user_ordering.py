@@ -0,0 +1,162 @@
+"""
+Бенчмарк: двойные нажатия с очередями пользователей и без них
+
+Пользователи проходят запись до выбора времени и дважды быстро нажимают
+разные кнопки time: - оба обновления подаются одновременно, как при
+двойном нажатии в медленной сети. Ответы Bot API приходят с задержкой
+--delay (мс), поэтому обработчики одного пользователя без очередей
+перемежаются на await.
+
+Для каждого режима выводятся:
+- пересечения: обновление пользователя начало обрабатываться, пока
+  обрабатывалось предыдущее обновление того же пользователя;
+- ошибки: исключения обработчиков, прочитавших данные FSM, которые
+  параллельное обновление успело изменить или очистить;
+- обновления в секунду: очереди не должны замедлять разных пользователей.
+
+Каждый режим выполняется в отдельном процессе с чистым хранилищем, сессиями
+FSM и удержаниями слотов, поэтому оба режима получают одинаковые обновления.
+
+Запуск: STORAGE_BACKEND=memory python -m benchmarks.bench_user_ordering --delay 5
+"""
+import argparse
+import asyncio
+import logging
+import subprocess
+import sys
+import time
+
+from aiogram import Bot
+
+from database import init_storage, close_storage
+from database.init_data import init_services
+from benchmarks.fake_telegram import (
+    FAKE_BOT_TOKEN,
+    FakeSession,
+    UpdateFactory,
+    build_dispatcher
+)
+
+USERS = 500
+FIRST_USER_ID = 3_000_000
+MODES = ('unordered', 'ordered')
+
+
+class OverlapProbe:
+    """Внутренний middleware: считает обновления, начатые во время обработки предыдущего"""
+
+    def __init__(self):
+        self.in_flight = {}
+        self.overlaps = 0
+
+    async def __call__(self, handler, event, data):
+        user_id = event.from_user.id
+        if self.in_flight.get(user_id):
+            self.overlaps += 1
+        self.in_flight[user_id] = self.in_flight.get(user_id, 0) + 1
+        try:
+            return await handler(event, data)
+        finally:
+            self.in_flight[user_id] -= 1
+            if not self.in_flight[user_id]:
+                del self.in_flight[user_id]
+
+
+class Run:
+    def __init__(self, dp, bot, session: FakeSession):
+        self.dp = dp
+        self.bot = bot
+        self.session = session
+        self.updates = UpdateFactory(bot)
+        self.fed = 0
+        self.errors = 0
+        self.double_taps = 0
+
+    async def feed(self, update):
+        self.fed += 1
+        try:
+            await self.dp.feed_update(self.bot, update)
+        except Exception:
+            self.errors += 1
+
+    async def buttons(self, update, user_id: int, prefix: str) -> list:
+        await self.feed(update)
+        screen = self.session.take_screen(user_id)
+        markup = screen[1] if screen else None
+        return [button.callback_data
+                for row in (markup.inline_keyboard if markup else [])
+                for button in row
+                if button.callback_data.startswith(prefix)]
+
+    async def user(self, i: int):
+        user_id = FIRST_USER_ID + i
+        services = await self.buttons(self.updates.message(user_id, "/start"), user_id, "service:")
+        masters = await self.buttons(
+            self.updates.callback(user_id, services[i % len(services)]), user_id, "master:"
+        )
+        dates = await self.buttons(
+            self.updates.callback(user_id, masters[i % len(masters)]), user_id, "date:"
+        )
+        if not dates:
+            return
+        times = await self.buttons(
+            self.updates.callback(user_id, dates[i % len(dates)]), user_id, "time:"
+        )
+        if len(times) < 2:
+            return
+
+        # Двойное нажатие: два разных времени одновременно
+        first, second = times[i % (len(times) - 1)], times[-1]
+        await asyncio.gather(
+            self.feed(self.updates.callback(user_id, first)),
+            self.feed(self.updates.callback(user_id, second))
+        )
+        self.double_taps += 1
+
+
+async def run_mode(mode: str, delay: float):
+    await init_storage()
+    session = FakeSession()
+    session.request_delay = delay
+    bot = Bot(token=FAKE_BOT_TOKEN, session=session)
+    try:
+        await init_services()
+        dp = build_dispatcher(ordered=mode == 'ordered')
+        probe = OverlapProbe()
+        dp.callback_query.middleware(probe)
+        run = Run(dp, bot, session)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(run.user(i) for i in range(USERS)))
+        elapsed = time.perf_counter() - started
+
+        print(f"{mode:10s} overlaps: {probe.overlaps:4d}  errors: {run.errors:4d}  "
+              f"of {run.double_taps} double taps  {run.fed / elapsed:7.1f} updates/s", flush=True)
+    finally:
+        await bot.session.close()
+        await close_storage()
+
+
+def run_all(delay_ms: float):
+    """Каждый режим - в новом процессе: состояние первого не влияет на второй"""
+    print(f"users: {USERS}, Bot API delay: {delay_ms:.0f} ms", flush=True)
+    for mode in MODES:
+        subprocess.run(
+            [sys.executable, '-m', 'benchmarks.bench_user_ordering',
+             '--delay', str(delay_ms), '--mode', mode],
+            check=True
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Double taps with and without user queues")
+    parser.add_argument('--delay', type=float, default=5,
+                        help="simulated Bot API response time, ms (default: 5)")
+    parser.add_argument('--mode', choices=MODES,
+                        help="run a single mode in this process (default: both, each in a new process)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    if args.mode:
+        asyncio.run(run_mode(args.mode, args.delay / 1000))
+    else:
+        run_all(args.delay)
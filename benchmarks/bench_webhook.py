@@ -0,0 +1,178 @@
+"""
+Бенчмарк: вебхук против длинного опроса
+
+Одни и те же синтетические пользователи (/start -> услуга -> мастер ->
+/my_bookings, шаги одного пользователя по очереди) подают обновления
+двумя способами:
+- polling: dp.start_polling забирает обновления из очереди FakeSession
+  через getUpdates, как из Telegram;
+- webhook: обновления отправляются POST-запросами на локальный
+  WebhookServer (не больше WEBHOOK_MAX_CONNECTIONS соединений, как у Telegram).
+
+Задержка - от подачи обновления до окончания его обработки; для вебхука
+отдельно выводится время ответа сервера (подтверждение Telegram).
+Сеть до Telegram моделируется задержкой --rtt (мс): ответ на getUpdates
+приходит через полный круг, а запрос вебхука - через половину круга
+(Telegram отправляет его сам). Клиент вебхука работает в том же процессе
+и цикле событий, что и сервер, поэтому его накладные расходы на HTTP
+входят в результат вебхука.
+
+Запуск: STORAGE_BACKEND=memory python -m benchmarks.bench_webhook --rtt 50
+"""
+import argparse
+import asyncio
+import logging
+import socket
+import time
+
+import aiohttp
+from aiogram import Bot
+
+from config import STORAGE_BACKEND, WEBHOOK_MAX_CONNECTIONS
+from database import init_storage, close_storage, get_all_services
+from database.init_data import init_services
+from utils import schedule_index
+from webhook import WebhookServer, SECRET_HEADER
+from benchmarks.fake_telegram import (
+    FAKE_BOT_TOKEN,
+    FakeSession,
+    UpdateFactory,
+    build_dispatcher,
+    percentile
+)
+
+USERS = 1000
+CONCURRENCY = 100
+FIRST_USER_ID = 2_000_000
+SECRET = "benchmark-secret"
+
+
+class Completions:
+    """Outer middleware: отмечает окончание обработки обновлений, которых ждут"""
+
+    def __init__(self):
+        self.waiters = {}
+
+    def expect(self, update_id: int) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self.waiters[update_id] = future
+        return future
+
+    async def __call__(self, handler, event, data):
+        try:
+            return await handler(event, data)
+        finally:
+            future = self.waiters.pop(event.update_id, None)
+            if future is not None and not future.done():
+                future.set_result(time.perf_counter())
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def run_users(updates: UpdateFactory, completions: Completions, send, services: list,
+                    first_user_id: int) -> list:
+    """Прогнать пользователей; send(update) подает обновление. Вернуть задержки"""
+    latencies = []
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def user(i: int):
+        user_id = first_user_id + i
+        steps = [
+            updates.message(user_id, "/start"),
+            updates.callback(user_id, f"service:{services[i % len(services)]['id']}"),
+            updates.callback(user_id, f"master:{schedule_index.masters[i % len(schedule_index.masters)]}"),
+            updates.message(user_id, "/my_bookings"),
+        ]
+        async with semaphore:
+            for update in steps:
+                done = completions.expect(update.update_id)
+                started = time.perf_counter()
+                await send(update)
+                latencies.append(await done - started)
+
+    await asyncio.gather(*(user(i) for i in range(USERS)))
+    return latencies
+
+
+def report(mode: str, latencies: list, elapsed: float):
+    latencies.sort()
+    print(f"{mode:8s} {len(latencies) / elapsed:8.1f} updates/s   latency p50/p95/p99: "
+          f"{percentile(latencies, 0.50) * 1000:.2f} / {percentile(latencies, 0.95) * 1000:.2f} / "
+          f"{percentile(latencies, 0.99) * 1000:.2f} ms")
+
+
+async def main(rtt: float):
+    await init_storage()
+    session = FakeSession()
+    session.get_updates_delay = rtt
+    bot = Bot(token=FAKE_BOT_TOKEN, session=session)
+    try:
+        await init_services()
+        services = await get_all_services()
+        dp = build_dispatcher()
+        completions = Completions()
+        dp.update.outer_middleware(completions)
+        updates = UpdateFactory(bot)
+        print(f"backend: {STORAGE_BACKEND}, users: {USERS}, concurrency: {CONCURRENCY}, "
+              f"updates per user: 4, rtt: {rtt * 1000:.0f} ms")
+
+        # Длинный опрос
+        async def push(update):
+            session.push_update(update)
+
+        polling = asyncio.create_task(dp.start_polling(
+            bot, handle_signals=False, close_bot_session=False, polling_timeout=1
+        ))
+        started = time.perf_counter()
+        latencies = await run_users(updates, completions, push, services, FIRST_USER_ID)
+        report("polling", latencies, time.perf_counter() - started)
+        await dp.stop_polling()
+        await polling
+
+        # Вебхук
+        port = free_port()
+        server = WebhookServer(dp, bot, secret_token=SECRET)
+        await server.start('127.0.0.1', port)
+        acks = []
+        url = f"http://127.0.0.1:{port}{server.path}"
+        connector = aiohttp.TCPConnector(limit=WEBHOOK_MAX_CONNECTIONS)
+        async with aiohttp.ClientSession(connector=connector) as client:
+            async def post(update):
+                if rtt:
+                    await asyncio.sleep(rtt / 2)
+                started = time.perf_counter()
+                async with client.post(
+                    url,
+                    data=update.model_dump_json(exclude_none=True),
+                    headers={SECRET_HEADER: SECRET, 'Content-Type': 'application/json'}
+                ) as response:
+                    response.raise_for_status()
+                acks.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            latencies = await run_users(updates, completions, post, services, FIRST_USER_ID + USERS)
+            report("webhook", latencies, time.perf_counter() - started)
+
+            async with client.post(url, data=b"{}", headers={SECRET_HEADER: "wrong"}) as response:
+                rejected = response.status
+        await server.stop()
+
+        acks.sort()
+        print(f"webhook ack p50/p99: {percentile(acks, 0.50) * 1000:.2f} / "
+              f"{percentile(acks, 0.99) * 1000:.2f} ms, wrong secret -> HTTP {rejected}")
+    finally:
+        await bot.session.close()
+        await close_storage()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare webhook and long polling")
+    parser.add_argument('--rtt', type=float, default=0,
+                        help="simulated round trip to Telegram, ms (default: 0)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(main(args.rtt / 1000))
@@ -0,0 +1,145 @@
+"""
+Проверка: запись обновлений (UpdateRecorder) не сохраняет персональные данные
+
+Записывает обновления с персональными данными - сообщение с подписью
+и контактом, геопозицию, место, опрос, inline-запрос, нажатие кнопки -
+и ищет в файле записи телефон, имена, username, подпись, координаты
+и исходные id. Затем проверяет, что записанные обновления читаются
+как Update и сохраняют то, что нужно воспроизведению: команды,
+callback_data и псевдонимы отправителей.
+
+Запуск: python -m benchmarks.check_recorder (код выхода 1 - есть утечка)
+"""
+import json
+import os
+import sys
+import tempfile
+
+from aiogram.types import Update
+
+from middlewares import UpdateRecorder, pseudonymize
+
+SALT = "check-recorder"
+USER_ID = 987654321
+CONTACT_USER_ID = 555000111
+PERSONAL = {
+    'phone': "+79991234567",
+    'first name': "Алексей",
+    'last name': "Смирнов",
+    'username': "alexey_smirnov",
+    'contact first name': "Мария",
+    'contact last name': "Иванова",
+    'vcard': "BEGIN:VCARD",
+    'caption': "Мой паспорт",
+    'text': "Мой адрес: Ленина 1",
+    'latitude': "55.751244",
+    'longitude': "37.618423",
+    'venue title': "Дом Марии",
+    'venue address': "ул. Тверская, 7",
+    'poll question': "Во сколько удобно?",
+    'inline query': "стрижка у Ивана",
+    'user id': str(USER_ID),
+    'contact user id': str(CONTACT_USER_ID),
+}
+
+
+def user() -> dict:
+    return {
+        'id': USER_ID,
+        'is_bot': False,
+        'first_name': PERSONAL['first name'],
+        'last_name': PERSONAL['last name'],
+        'username': PERSONAL['username'],
+        'language_code': 'ru',
+    }
+
+
+def message(message_id: int, **content) -> dict:
+    return {
+        'message_id': message_id,
+        'date': 1760000000,
+        'chat': {
+            'id': USER_ID,
+            'type': 'private',
+            'first_name': PERSONAL['first name'],
+            'username': PERSONAL['username'],
+        },
+        'from': user(),
+        **content,
+    }
+
+
+def updates() -> list:
+    location = {'latitude': float(PERSONAL['latitude']), 'longitude': float(PERSONAL['longitude'])}
+    return [
+        {'update_id': 1, 'message': message(1, text="/start")},
+        {'update_id': 2, 'message': message(2, text=PERSONAL['text'])},
+        {'update_id': 3, 'message': message(
+            3,
+            caption=PERSONAL['caption'],
+            photo=[{'file_id': 'photo', 'file_unique_id': 'photo', 'width': 1, 'height': 1}],
+        )},
+        {'update_id': 4, 'message': message(4, contact={
+            'phone_number': PERSONAL['phone'],
+            'first_name': PERSONAL['contact first name'],
+            'last_name': PERSONAL['contact last name'],
+            'user_id': CONTACT_USER_ID,
+            'vcard': PERSONAL['vcard'],
+        })},
+        {'update_id': 5, 'message': message(5, location=location)},
+        {'update_id': 6, 'message': message(6, venue={
+            'location': location,
+            'title': PERSONAL['venue title'],
+            'address': PERSONAL['venue address'],
+        })},
+        {'update_id': 7, 'message': message(7, poll={
+            'id': 'poll', 'question': PERSONAL['poll question'],
+            'options': [{'text': "12:00", 'voter_count': 0}],
+            'total_voter_count': 0, 'is_closed': False, 'is_anonymous': True,
+            'type': 'regular', 'allows_multiple_answers': False,
+        })},
+        {'update_id': 8, 'inline_query': {
+            'id': 'inline', 'from': user(), 'query': PERSONAL['inline query'], 'offset': '',
+            'location': location,
+        }},
+        {'update_id': 9, 'callback_query': {
+            'id': 'callback', 'from': user(), 'chat_instance': 'chat',
+            'data': "master:Иван", 'message': message(10, text="Выберите мастера"),
+        }},
+    ]
+
+
+def main() -> int:
+    fd, path = tempfile.mkstemp(suffix='.jsonl')
+    os.close(fd)
+    try:
+        recorder = UpdateRecorder(path, SALT)
+        for data in updates():
+            recorder.write(Update.model_validate(data))
+        recorder.close()
+        with open(path, encoding='utf-8') as f:
+            recorded = f.read()
+    finally:
+        os.unlink(path)
+
+    leaks = [name for name, value in PERSONAL.items() if value in recorded]
+
+    records = [json.loads(line)['u'] for line in recorded.splitlines()]
+    for record in records:
+        Update.model_validate(record)
+    pseudonym = pseudonymize(USER_ID, SALT.encode())
+    kept = (
+        records[0]['message']['text'] == "/start"
+        and records[0]['message']['from']['id'] == pseudonym
+        and records[8]['callback_query']['data'] == "master:Иван"
+        and records[8]['callback_query']['from']['id'] == pseudonym
+    )
+
+    print(f"recorded {len(records)} updates")
+    print(f"personal data found: {', '.join(leaks) if leaks else 'none'}")
+    print(f"commands, callback data and pseudonyms kept: {'yes' if kept else 'NO'}")
+    return 1 if leaks or not kept else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+"""
+Бот без сети Telegram для нагрузочных бенчмарков
+
+FakeSession отвечает на запросы бота сразу и запоминает последний экран
+(текст и клавиатуру) каждого чата, отдает поставленные в очередь
+обновления на getUpdates (для прогонов dp.start_polling), UpdateFactory строит обновления
+сообщений и нажатий кнопок, CountingRepository считает обращения
+к хранилищу. build_dispatcher подключает роутеры бота к Dispatcher
+с BoundedFSMStorage без снимков и очередями пользователей, как в main.py.
+"""
+import asyncio
+import itertools
+from datetime import datetime
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import AnswerCallbackQuery, EditMessageText, GetMe, GetUpdates, SendMessage
+from aiogram.types import Chat, Message, Update, User
+
+from config import FSM_SESSION_TTL_SECONDS, FSM_MAX_SESSIONS
+from handlers import client_router, admin_router
+from utils import BoundedFSMStorage, UserQueueIsolation
+
+# Токен правильного формата: Bot проверяет его и берет из него id бота
+FAKE_BOT_TOKEN = "123456:BENCHMARK"
+
+
+class FakeSession(BaseSession):
+    """Сессия бота без сети: ответы формируются на месте, экраны чатов запоминаются"""
+
+    def __init__(self):
+        super().__init__()
+        self._message_ids = itertools.count(1)
+        self.screens = {}
+        self.alerts = {}
+        self.requests = 0
+        self.pending_updates = asyncio.Queue()
+        # Имитация круга до Telegram для ответа на getUpdates и на прочие запросы (секунд)
+        self.get_updates_delay = 0.0
+        self.request_delay = 0.0
+
+    async def make_request(self, bot, method, timeout=None):
+        self.requests += 1
+
+        if isinstance(method, (SendMessage, EditMessageText)):
+            self.screens[method.chat_id] = (method.text, method.reply_markup)
+            return Message(
+                message_id=getattr(method, 'message_id', None) or next(self._message_ids),
+                date=datetime.now(),
+                chat=Chat(id=method.chat_id, type='private'),
+                text=method.text,
+                reply_markup=method.reply_markup
+            )
+
+        if isinstance(method, GetUpdates):
+            return await self._get_updates(method)
+
+        if self.request_delay:
+            await asyncio.sleep(self.request_delay)
+
+        if isinstance(method, GetMe):
+            return User(id=bot.id, is_bot=True, first_name="Benchmark", username="benchmark_bot")
+
+        if isinstance(method, AnswerCallbackQuery):
+            if method.show_alert:
+                self.alerts[method.callback_query_id] = method.text
+            return True
+
+        return True
+
+    async def _get_updates(self, method: GetUpdates) -> list:
+        """Длинный опрос: ждать первое обновление до method.timeout, отдать до method.limit"""
+        try:
+            first = await asyncio.wait_for(self.pending_updates.get(), method.timeout or 0.01)
+        except asyncio.TimeoutError:
+            return []
+        updates = [first]
+        limit = method.limit or 100
+        while len(updates) < limit and not self.pending_updates.empty():
+            updates.append(self.pending_updates.get_nowait())
+        if self.get_updates_delay:
+            await asyncio.sleep(self.get_updates_delay)
+        return updates
+
+    def push_update(self, update: Update):
+        """Поставить обновление в очередь для getUpdates"""
+        self.pending_updates.put_nowait(update)
+
+    async def close(self):
+        pass
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        """Загрузка файла: обработчики бота файлов не скачивают, содержимое пустое"""
+        for chunk in ():
+            yield chunk
+
+    def take_screen(self, chat_id: int):
+        """Последний экран чата (текст, клавиатура) или None; экран забирается"""
+        return self.screens.pop(chat_id, None)
+
+    def take_alert(self, callback_query_id: str):
+        """Текст всплывающего уведомления в ответ на нажатие кнопки или None"""
+        return self.alerts.pop(callback_query_id, None)
+
+
+class UpdateFactory:
+    """Обновления Telegram от имени пользователей, привязанные к боту"""
+
+    def __init__(self, bot: Bot):
+        self._bot = bot
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+
+    @staticmethod
+    def _user(user_id: int) -> dict:
+        return {
+            'id': user_id,
+            'is_bot': False,
+            'first_name': f"User{user_id}",
+            'username': f"user{user_id}",
+        }
+
+    def _message(self, user_id: int, text: str) -> dict:
+        return {
+            'message_id': next(self._message_ids),
+            'date': int(datetime.now().timestamp()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': self._user(user_id),
+            'text': text,
+        }
+
+    def from_dict(self, data: dict) -> Update:
+        """Обновление из словаря формата Bot API"""
+        return Update.model_validate(data, context={'bot': self._bot})
+
+    def message(self, user_id: int, text: str) -> Update:
+        """Сообщение пользователя (например, команда /start)"""
+        return self.from_dict({
+            'update_id': next(self._update_ids),
+            'message': self._message(user_id, text),
+        })
+
+    def callback(self, user_id: int, data: str) -> Update:
+        """Нажатие inline-кнопки с callback_data data"""
+        update_id = next(self._update_ids)
+        return self.from_dict({
+            'update_id': update_id,
+            'callback_query': {
+                'id': str(update_id),
+                'from': self._user(user_id),
+                'chat_instance': str(user_id),
+                'data': data,
+                'message': self._message(user_id, "..."),
+            },
+        })
+
+
+class CountingRepository:
+    """Обертка хранилища: считает вызовы корутин (для PostgreSQL - запросы к БД)"""
+
+    def __init__(self, repository):
+        self._repository = repository
+        self.calls = 0
+
+    def __getattr__(self, name):
+        attr = getattr(self._repository, name)
+        if not asyncio.iscoroutinefunction(attr):
+            return attr
+
+        async def counted(*args, **kwargs):
+            self.calls += 1
+            return await attr(*args, **kwargs)
+
+        return counted
+
+
+def build_dispatcher(ordered: bool = True) -> Dispatcher:
+    """
+    Dispatcher с роутерами бота (роутер подключается только к одному Dispatcher).
+
+    ordered=False - без очередей пользователей; переключить режим готового
+    диспетчера можно, заменив dp.fsm.events_isolation.
+    """
+    dp = Dispatcher(
+        storage=BoundedFSMStorage(FSM_SESSION_TTL_SECONDS, FSM_MAX_SESSIONS),
+        events_isolation=UserQueueIsolation() if ordered else None
+    )
+    dp.include_router(client_router)
+    dp.include_router(admin_router)
+    return dp
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    """Перцентиль отсортированного списка (fraction от 0 до 1)"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
@@ -0,0 +1,164 @@
+"""
+Воспроизведение записанного потока обновлений
+
+Читает файл, записанный UpdateRecorder (RECORD_UPDATES_PATH), и подает
+обновления в client_router и admin_router с ботом без сети
+(benchmarks/fake_telegram.py) с исходными интервалами, ускоренно
+(--speed N) или без пауз (--speed 0). Обновления разных пользователей
+обрабатываются параллельно, как при опросе Telegram, а обновления одного
+пользователя - по порядку, даже если ускоренное расписание их совмещает.
+Даты в callback_data сдвигаются на разницу между днем записи и сегодняшним
+днем (--keep-dates отключает).
+
+Хранилище - по STORAGE_BACKEND ('memory' не требует PostgreSQL).
+Выводит пропускную способность, p50/p95/p99 задержки обработки
+и отставание от расписания: одинаковая запись позволяет сравнивать
+версии бота на одном и том же трафике.
+
+Запуск: STORAGE_BACKEND=memory python -m benchmarks.replay updates.jsonl --speed 10
+"""
+import argparse
+import asyncio
+import json
+import logging
+import re
+import time
+from datetime import date, datetime, timedelta
+
+from aiogram import Bot
+from aiogram.dispatcher.event.bases import UNHANDLED
+
+from config import STORAGE_BACKEND
+from database import init_storage, close_storage
+from database.init_data import init_services
+from benchmarks.fake_telegram import (
+    FAKE_BOT_TOKEN,
+    FakeSession,
+    UpdateFactory,
+    build_dispatcher,
+    percentile
+)
+
+_DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+def load_records(path: str) -> list:
+    """Записи файла: список (время, обновление), упорядоченный по времени"""
+    records = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                records.append((record['t'], record['u']))
+    records.sort(key=lambda record: record[0])
+    return records
+
+
+def update_user_id(update: dict):
+    """Id отправителя обновления (или None)"""
+    for event in update.values():
+        if isinstance(event, dict) and 'from' in event:
+            return event['from']['id']
+    return None
+
+
+def shift_dates(update: dict, days: int) -> dict:
+    """Сдвинуть даты в callback_data нажатия кнопки на days дней"""
+    callback = update.get('callback_query')
+    if days and callback and callback.get('data'):
+        callback['data'] = _DATE_RE.sub(
+            lambda m: (date.fromisoformat(m.group()) + timedelta(days=days)).isoformat(),
+            callback['data']
+        )
+    return update
+
+
+async def replay(records: list, speed: float, keep_dates: bool):
+    await init_storage()
+    session = FakeSession()
+    bot = Bot(token=FAKE_BOT_TOKEN, session=session)
+    try:
+        await init_services()
+        dp = build_dispatcher()
+        updates = UpdateFactory(bot)
+
+        first_time = records[0][0]
+        days = 0 if keep_dates else (datetime.now().date() - date.fromtimestamp(first_time)).days
+
+        latencies = []
+        unhandled = 0
+        errors = 0
+        max_lag = 0.0
+
+        async def process(update, previous):
+            nonlocal unhandled, errors
+            if previous is not None:
+                await previous
+            started = time.perf_counter()
+            try:
+                response = await dp.feed_update(bot, update)
+            except Exception as e:
+                errors += 1
+                logging.warning(f"Update {update.update_id} failed: {e!r}")
+                return
+            finally:
+                latencies.append(time.perf_counter() - started)
+            if response is UNHANDLED:
+                unhandled += 1
+
+        tasks = []
+        last_task_by_user = {}
+        started = time.perf_counter()
+        for recorded_at, data in records:
+            if speed > 0:
+                due = (recorded_at - first_time) / speed
+                delay = due - (time.perf_counter() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    max_lag = max(max_lag, -delay)
+            user_id = update_user_id(data)
+            update = updates.from_dict(shift_dates(data, days))
+            task = asyncio.create_task(process(update, last_task_by_user.get(user_id)))
+            last_task_by_user[user_id] = task
+            tasks.append(task)
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        recorded_span = records[-1][0] - first_time
+        print(f"backend: {STORAGE_BACKEND}, speed: {speed or 'max'}, dates shifted by {days} days")
+        print(f"updates:             {len(latencies)} ({unhandled} unhandled, {errors} errors)")
+        print(f"recorded span:       {recorded_span:.1f}s, replayed in {elapsed:.2f}s")
+        print(f"updates/sec:         {len(latencies) / elapsed:.1f}")
+        print(f"latency p50/p95/p99: {percentile(latencies, 0.50) * 1000:.2f} / "
+              f"{percentile(latencies, 0.95) * 1000:.2f} / "
+              f"{percentile(latencies, 0.99) * 1000:.2f} ms "
+              f"(max {latencies[-1] * 1000:.2f} ms)")
+        if speed > 0:
+            print(f"max schedule lag:    {max_lag * 1000:.1f} ms")
+        print(f"bot requests:        {session.requests}")
+    finally:
+        await bot.session.close()
+        await close_storage()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded Telegram updates")
+    parser.add_argument('path', help="file written by UpdateRecorder")
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help="playback speed multiplier, 0 - no pauses (default: 1)")
+    parser.add_argument('--keep-dates', action='store_true',
+                        help="do not shift dates in callback data to today")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    records = load_records(args.path)
+    if not records:
+        print(f"No updates in {args.path}")
+        return
+    asyncio.run(replay(records, args.speed, args.keep_dates))
+
+
+if __name__ == "__main__":
+    main()
@@ -16,6 +16,72 @@ DB_NAME = os.getenv("DB_NAME", "barbershop_bot")
 DB_USER = os.getenv("DB_USER", "postgres")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "postgres")
 
+# Журнал медленных запросов: порог (мс, 0 - выключен) и доля медленных запросов
+# на чтение, для которых план EXPLAIN (ANALYZE, BUFFERS) сохраняется в файл с ротацией
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "200"))
+SLOW_QUERY_EXPLAIN_SAMPLE_RATE = float(os.getenv("SLOW_QUERY_EXPLAIN_SAMPLE_RATE", "0"))
+SLOW_QUERY_PLAN_FILE = os.getenv("SLOW_QUERY_PLAN_FILE", "slow_query_plans.log")
+SLOW_QUERY_PLAN_MAX_BYTES = 1024 * 1024
+SLOW_QUERY_PLAN_BACKUP_COUNT = 3
+
+# Хранилище данных: 'postgres' или 'memory' (в памяти процесса, для тестов и бенчмарков)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "postgres")
+
+# Размер пула соединений
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+# Максимальное ожидание свободного соединения (секунд)
+DB_POOL_ACQUIRE_TIMEOUT = float(os.getenv("DB_POOL_ACQUIRE_TIMEOUT", "5"))
+# Интервал записи статистики пула в лог (минут)
+DB_POOL_STATS_INTERVAL_MINUTES = 10
+
+# Эндпоинт метрик Prometheus (0 - выключен) и интервал сводки метрик в логе (минут)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_LOG_INTERVAL_MINUTES = 10
+
+# Запись входящих обновлений для воспроизведения (пусто - запись выключена)
+RECORD_UPDATES_PATH = os.getenv("RECORD_UPDATES_PATH", "")
+# Ключ псевдонимов пользователей в записи (пусто - случайный на каждый запуск)
+RECORD_UPDATES_SALT = os.getenv("RECORD_UPDATES_SALT", "")
+
+# Получение обновлений: 'polling' (getUpdates) или 'webhook' (HTTP-сервер бота)
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+# Публичный адрес, на который Telegram отправляет обновления (https://example.com)
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+# Секрет заголовка X-Telegram-Bot-Api-Secret-Token (пусто - случайный на каждый запуск)
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+# Одновременные соединения Telegram к вебхуку (1-100)
+WEBHOOK_MAX_CONNECTIONS = 40
+# Ожидание обработки принятых обновлений при остановке (секунд)
+WEBHOOK_DRAIN_TIMEOUT_SECONDS = 30
+
+# Обновления одного пользователя обрабатываются по очереди, разных - параллельно
+USER_UPDATES_ORDERED = os.getenv("USER_UPDATES_ORDERED", "1") == "1"
+
+# Несколько процессов (supervisor.py): число воркеров (0 - по числу ядер),
+# каталог сокетов для пересылки обновлений воркерам (пусто - временный).
+# Удержания слотов при WORKERS > 1 не общие (см. supervisor.py), поэтому по умолчанию 1
+WORKERS = int(os.getenv("WORKERS", "1"))
+SUPERVISOR_IPC_DIR = os.getenv("SUPERVISOR_IPC_DIR", "")
+# Кэш занятости в воркере: брони других воркеров видны не позже чем через TTL
+WORKER_AVAILABILITY_CACHE_TTL_SECONDS = 5
+# Ожидание остановки воркера после закрытия его канала (секунд)
+WORKER_STOP_TIMEOUT_SECONDS = 60
+
+# Хранилище состояний FSM: сессия без обращений живет FSM_SESSION_TTL_SECONDS,
+# при FSM_MAX_SESSIONS вытесняется давно не использованная
+FSM_SESSION_TTL_SECONDS = int(os.getenv("FSM_SESSION_TTL_SECONDS", "3600"))
+FSM_MAX_SESSIONS = int(os.getenv("FSM_MAX_SESSIONS", "10000"))
+# Снимки сессий для перезапуска: '' - выключены, 'file' - FSM_SNAPSHOT_PATH,
+# 'postgres' - таблица fsm_sessions
+FSM_SNAPSHOT = os.getenv("FSM_SNAPSHOT", "")
+FSM_SNAPSHOT_PATH = os.getenv("FSM_SNAPSHOT_PATH", "fsm_sessions.json")
+FSM_SNAPSHOT_INTERVAL_SECONDS = 60
+
 # Список админов (Telegram user_id)
 ADMIN_IDS = [
     208128144,  # Замените на реальные user_id админов
@@ -57,5 +123,34 @@ SLOT_DURATION_MINUTES = 30
 # Количество дней для записи (сегодня + N дней)
 BOOKING_DAYS_AHEAD = 14
 
+# Количество слотов в подборке "Любой мастер, ближайшее время"
+NEAREST_SLOTS_LIMIT = 6
+
+# Сколько вариантов замены предлагать, если выбранное время уже заняли
+ALTERNATIVE_SLOTS_LIMIT = 6
+
 # Срок хранения записей (дней)
 BOOKING_RETENTION_DAYS = 3
+
+# Очистка старых записей: размер пачки и пауза между пачками (секунд)
+CLEANUP_BATCH_SIZE = 1000
+CLEANUP_BATCH_PAUSE_SECONDS = 0.1
+
+# Переносить старые записи в таблицу bookings_archive вместо удаления
+BOOKING_ARCHIVE_ENABLED = False
+
+# Секционирование bookings по дате: 'week' или 'month'
+BOOKINGS_PARTITION_INTERVAL = 'month'
+# Насколько дней после горизонта записи секции создаются заранее
+PARTITIONS_AHEAD_DAYS = 31
+
+# Кэш занятости слотов (мастер, дата)
+AVAILABILITY_CACHE_TTL_SECONDS = 60
+AVAILABILITY_CACHE_MAX_SIZE = 512
+
+# Удержание выбранного слота до подтверждения записи (секунд)
+SLOT_HOLD_TTL_SECONDS = 180
+
+# Кэш списков записей пользователей (/my_bookings)
+USER_BOOKINGS_CACHE_TTL_SECONDS = 300
+USER_BOOKINGS_CACHE_MAX_SIZE = 1024
@@ -1,28 +1,70 @@
 """
 Database module
 """
-from .connection import init_db, get_connection, close_all_connections
+from .connection import init_db, get_connection, close_all_connections, get_pool_stats
+from .repository import (
+    BookingRepository,
+    get_repository,
+    set_repository,
+    init_storage,
+    close_storage
+)
+from .availability_cache import availability_cache
+from .slot_holds import slot_holds
+from .catalogue import services_catalogue
+from .user_bookings_cache import user_bookings_cache
+from .fsm_sessions import save_fsm_sessions, load_fsm_sessions
 from .models import (
     create_service,
+    create_services,
     get_all_services,
+    get_service,
     create_booking,
     get_bookings_by_user,
+    get_booking,
     get_bookings_by_date,
+    get_occupancy,
+    get_occupancy_horizon,
     get_bookings_by_master_date_time,
     delete_booking,
-    delete_old_bookings
+    delete_old_bookings,
+    create_booking_partitions,
+    BOOKING_CREATED,
+    BOOKING_CONFLICT,
+    BOOKING_ERROR
 )
 
 __all__ = [
     'init_db',
     'get_connection',
     'close_all_connections',
+    'get_pool_stats',
+    'BookingRepository',
+    'get_repository',
+    'set_repository',
+    'init_storage',
+    'close_storage',
+    'availability_cache',
+    'slot_holds',
+    'services_catalogue',
+    'user_bookings_cache',
+    'save_fsm_sessions',
+    'load_fsm_sessions',
     'create_service',
+    'create_services',
     'get_all_services',
+    'get_service',
     'create_booking',
     'get_bookings_by_user',
+    'get_booking',
     'get_bookings_by_date',
+    'get_occupancy',
+    'get_occupancy_horizon',
     'get_bookings_by_master_date_time',
     'delete_booking',
-    'delete_old_bookings'
+    'delete_old_bookings',
+    'create_booking_partitions',
+    'BOOKING_CREATED',
+    'BOOKING_CONFLICT',
+    'BOOKING_ERROR'
 ]
@@ -0,0 +1,95 @@
+"""
+Кэш занятости слотов мастера на дату (TTL + LRU)
+"""
+import time
+from collections import OrderedDict
+from datetime import date
+from config import AVAILABILITY_CACHE_TTL_SECONDS, AVAILABILITY_CACHE_MAX_SIZE
+
+
+class AvailabilityCache:
+    """
+    Кэш битовых карт занятости по ключу (мастер, дата).
+
+    Записи живут не дольше ttl секунд, при переполнении вытесняются
+    давно не использованные. Изменения записей патчат кэш точечно,
+    а счетчик версий не дает устаревшему результату запроса
+    перезаписать уже исправленное значение.
+    """
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._versions = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, master: str, booking_date: date):
+        """Получить битовую карту занятости из кэша или None"""
+        key = (master, booking_date)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        occupancy, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return occupancy
+
+    def version(self, master: str, booking_date: date) -> int:
+        """Текущая версия ключа (запоминается перед запросом к БД)"""
+        return self._versions.get((master, booking_date), 0)
+
+    def put(self, master: str, booking_date: date, occupancy: int, version: int):
+        """Сохранить результат запроса, если ключ не менялся во время запроса"""
+        key = (master, booking_date)
+        if self._versions.get(key, 0) != version:
+            return
+
+        self._entries[key] = (occupancy, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _patch(self, master: str, booking_date: date, update):
+        key = (master, booking_date)
+        self._versions[key] = self._versions.get(key, 0) + 1
+        entry = self._entries.get(key)
+        if entry is not None:
+            occupancy, expires_at = entry
+            self._entries[key] = (update(occupancy), expires_at)
+
+    def mark_booked(self, master: str, booking_date: date, bits: int):
+        """Отметить слоты занятыми после создания записи"""
+        self._patch(master, booking_date, lambda occupancy: occupancy | bits)
+
+    def mark_free(self, master: str, booking_date: date, bits: int):
+        """Отметить слоты свободными после удаления записи"""
+        self._patch(master, booking_date, lambda occupancy: occupancy & ~bits)
+
+    def drop_before(self, cutoff_date: date):
+        """Удалить из кэша все даты раньше cutoff_date"""
+        for key in [key for key in self._entries if key[1] < cutoff_date]:
+            del self._entries[key]
+        for key in [key for key in self._versions if key[1] < cutoff_date]:
+            del self._versions[key]
+
+    def stats(self) -> dict:
+        """Статистика кэша: попадания, промахи, размер"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'size': len(self._entries),
+        }
+
+
+availability_cache = AvailabilityCache(AVAILABILITY_CACHE_TTL_SECONDS, AVAILABILITY_CACHE_MAX_SIZE)
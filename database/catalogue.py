@@ -0,0 +1,47 @@
+"""
+Каталог услуг в памяти процесса
+"""
+from .repository import get_repository
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ServicesCatalogue:
+    """
+    Услуги, загруженные из БД один раз (при запуске или после сброса).
+
+    Хранит кортеж услуг в порядке id и словарь id -> услуга.
+    Любое изменение услуг должно вызывать invalidate().
+    """
+
+    def __init__(self):
+        self._services = None
+        self._by_id = {}
+
+    async def reload(self):
+        """Загрузить услуги из хранилища"""
+        rows = await get_repository().list_services()
+
+        self._services = tuple(dict(row) for row in rows)
+        self._by_id = {service['id']: service for service in self._services}
+        logger.info(f"Services catalogue loaded: {len(self._services)} services")
+
+    def invalidate(self):
+        """Сбросить каталог: следующее обращение загрузит его заново"""
+        self._services = None
+
+    async def all(self) -> tuple:
+        """Все услуги"""
+        if self._services is None:
+            await self.reload()
+        return self._services
+
+    async def get(self, service_id: int):
+        """Услуга по id или None"""
+        if self._services is None:
+            await self.reload()
+        return self._by_id.get(service_id)
+
+
+services_catalogue = ServicesCatalogue()
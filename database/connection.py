@@ -1,10 +1,22 @@
 """
-Управление подключением к PostgreSQL
+Управление подключением к PostgreSQL (асинхронный пул asyncpg)
 """
-import psycopg2
-from psycopg2.extras import RealDictCursor
-from psycopg2.pool import SimpleConnectionPool
-from config import DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+import asyncpg
+from config import (
+    DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD,
+    DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, DB_POOL_ACQUIRE_TIMEOUT,
+    BOOKING_DAYS_AHEAD, BOOKING_RETENTION_DAYS, PARTITIONS_AHEAD_DAYS,
+    SLOW_QUERY_THRESHOLD_MS
+)
+from monitoring import REGISTRY
+from .instrumentation import count_query
+from .migrations import apply_migrations
+from .slow_queries import slow_query_log
+from .partitions import ensure_partitions
 import logging
 
 logger = logging.getLogger(__name__)
@@ -12,94 +24,146 @@ logger = logging.getLogger(__name__)
 # Connection pool
 connection_pool = None
 
+# Статистика пула
+_pool_stats = {
+    'checked_out': 0,
+    'checkouts': 0,
+    'timeouts': 0,
+    'wait_total': 0.0,
+    'wait_max': 0.0,
+}
 
-def init_db():
-    """Инициализация базы данных и создание таблиц"""
+# Время создания соединений (по PID серверного процесса)
+_connection_created_at = {}
+
+
+async def _on_connection_created(conn):
+    """Запомнить время создания нового соединения пула и подключить журнал медленных запросов"""
+    pid = conn.get_server_pid()
+    _connection_created_at[pid] = time.monotonic()
+    conn.add_termination_listener(lambda _: _connection_created_at.pop(pid, None))
+    if SLOW_QUERY_THRESHOLD_MS > 0:
+        slow_query_log.attach(conn)
+
+
+async def init_db(timer=None):
+    """
+    Инициализация базы данных: пул соединений, миграции схемы, секции bookings.
+
+    timer - необязательный объект с методом mark(stage) для замера этапов запуска.
+    """
     global connection_pool
 
     try:
         # Создаем connection pool
-        connection_pool = SimpleConnectionPool(
-            1, 10,
+        connection_pool = await asyncpg.create_pool(
+            min_size=DB_POOL_MIN_SIZE,
+            max_size=DB_POOL_MAX_SIZE,
             host=DB_HOST,
-            port=DB_PORT,
+            port=int(DB_PORT),
             database=DB_NAME,
             user=DB_USER,
-            password=DB_PASSWORD
+            password=DB_PASSWORD,
+            init=_on_connection_created
         )
 
         logger.info("Connection pool created successfully")
-
-        # Создаем таблицы
-        conn = connection_pool.getconn()
-        try:
-            with conn.cursor() as cur:
-                # Таблица услуг
-                cur.execute("""
-                    CREATE TABLE IF NOT EXISTS services (
-                        id SERIAL PRIMARY KEY,
-                        name VARCHAR(100) NOT NULL UNIQUE,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                """)
-
-                # Таблица записей
-                cur.execute("""
-                    CREATE TABLE IF NOT EXISTS bookings (
-                        id SERIAL PRIMARY KEY,
-                        user_id BIGINT NOT NULL,
-                        username VARCHAR(100),
-                        service_id INTEGER REFERENCES services(id) ON DELETE CASCADE,
-                        master VARCHAR(50) NOT NULL,
-                        booking_date DATE NOT NULL,
-                        booking_time TIME NOT NULL,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        UNIQUE(master, booking_date, booking_time)
-                    )
-                """)
-
-                # Индексы для ускорения запросов
-                cur.execute("""
-                    CREATE INDEX IF NOT EXISTS idx_bookings_user
-                    ON bookings(user_id)
-                """)
-
-                cur.execute("""
-                    CREATE INDEX IF NOT EXISTS idx_bookings_date
-                    ON bookings(booking_date)
-                """)
-
-                cur.execute("""
-                    CREATE INDEX IF NOT EXISTS idx_bookings_master_date
-                    ON bookings(master, booking_date)
-                """)
-
-                conn.commit()
-                logger.info("Database tables created successfully")
-
-        finally:
-            connection_pool.putconn(conn)
+        slow_query_log.set_pool(connection_pool)
+        if timer is not None:
+            timer.mark('pool')
+
+        async with connection_pool.acquire() as conn:
+            applied_count = await apply_migrations(conn)
+            if applied_count > 0:
+                logger.info(f"Applied {applied_count} schema migrations")
+
+            # Секции от самой старой хранимой даты до конца горизонта записи
+            today = datetime.now().date()
+            async with conn.transaction():
+                await ensure_partitions(
+                    conn,
+                    today - timedelta(days=BOOKING_RETENTION_DAYS),
+                    today + timedelta(days=BOOKING_DAYS_AHEAD + PARTITIONS_AHEAD_DAYS)
+                )
+
+        logger.info("Database schema is up to date")
+        if timer is not None:
+            timer.mark('migrations')
 
     except Exception as e:
         logger.error(f"Database initialization error: {e}")
         raise
 
 
-def get_connection():
-    """Получить соединение из пула"""
+@asynccontextmanager
+async def get_connection():
+    """
+    Получить соединение из пула.
+
+    Используется как `async with get_connection() as conn`: соединение
+    возвращается в пул при выходе из блока. Если все соединения заняты,
+    ожидает освобождения не дольше DB_POOL_ACQUIRE_TIMEOUT секунд.
+    """
     if connection_pool is None:
         raise Exception("Connection pool is not initialized")
-    return connection_pool.getconn()
-
-
-def return_connection(conn):
-    """Вернуть соединение в пул"""
-    if connection_pool is not None:
-        connection_pool.putconn(conn)
 
+    started = time.monotonic()
+    try:
+        conn = await connection_pool.acquire(timeout=DB_POOL_ACQUIRE_TIMEOUT)
+    except asyncio.TimeoutError:
+        _pool_stats['timeouts'] += 1
+        logger.warning(
+            f"Timed out waiting {DB_POOL_ACQUIRE_TIMEOUT}s for a database connection"
+        )
+        raise
 
-def close_all_connections():
+    wait = time.monotonic() - started
+    _pool_stats['checkouts'] += 1
+    _pool_stats['wait_total'] += wait
+    _pool_stats['wait_max'] = max(_pool_stats['wait_max'], wait)
+    count_query(wait)
+    _pool_stats['checked_out'] += 1
+    try:
+        yield conn
+    finally:
+        _pool_stats['checked_out'] -= 1
+        await connection_pool.release(conn)
+
+
+def get_pool_stats() -> dict:
+    """Получить статистику пула: занятые соединения, ожидание, таймауты, возраст соединений"""
+    now = time.monotonic()
+    ages = [now - created for created in _connection_created_at.values()]
+    checkouts = _pool_stats['checkouts']
+
+    return {
+        'size': connection_pool.get_size() if connection_pool is not None else 0,
+        'idle': connection_pool.get_idle_size() if connection_pool is not None else 0,
+        'checked_out': _pool_stats['checked_out'],
+        'checkouts': checkouts,
+        'timeouts': _pool_stats['timeouts'],
+        'wait_avg_ms': _pool_stats['wait_total'] / checkouts * 1000 if checkouts else 0.0,
+        'wait_max_ms': _pool_stats['wait_max'] * 1000,
+        'connection_age_max_s': max(ages, default=0.0),
+        'connection_age_avg_s': sum(ages) / len(ages) if ages else 0.0,
+    }
+
+
+async def close_all_connections():
     """Закрыть все соединения"""
     if connection_pool is not None:
-        connection_pool.closeall()
+        await connection_pool.close()
         logger.info("All database connections closed")
+
+
+def _pool_collector() -> list:
+    stats = get_pool_stats()
+    return [
+        ('db_pool_size', 'gauge', 'Connections in the pool', stats['size']),
+        ('db_pool_idle', 'gauge', 'Idle connections in the pool', stats['idle']),
+        ('db_pool_checked_out', 'gauge', 'Connections checked out of the pool', stats['checked_out']),
+        ('db_pool_timeouts_total', 'counter', 'Timed out waits for a pool connection', stats['timeouts']),
+    ]
+
+
+REGISTRY.add_collector(_pool_collector)
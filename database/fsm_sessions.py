@@ -0,0 +1,41 @@
+"""
+Снимки сессий FSM в PostgreSQL (таблица fsm_sessions)
+"""
+import json
+from .connection import get_connection
+
+_COLUMNS = (
+    'bot_id', 'chat_id', 'user_id', 'thread_id', 'business_connection_id',
+    'destiny', 'state', 'data', 'expires_at'
+)
+
+
+async def save_fsm_sessions(sessions: list, shard: int = 0, shards: int = 1) -> None:
+    """
+    Заменить снимок сессий пользователей шарда (user_id % shards = shard).
+
+    sessions - список кортежей (bot_id, chat_id, user_id, thread_id,
+    business_connection_id, destiny, state, data, expires_at), где data -
+    словарь данных FSM, expires_at - datetime истечения сессии с часовым
+    поясом (TIMESTAMPTZ: срок не зависит от часовых поясов бота и сервера БД).
+    """
+    records = [(*session[:7], json.dumps(session[7], ensure_ascii=False), session[8])
+               for session in sessions]
+    async with get_connection() as conn:
+        async with conn.transaction():
+            await conn.execute(
+                "DELETE FROM fsm_sessions WHERE user_id % $2 = $1", shard, shards
+            )
+            if records:
+                await conn.copy_records_to_table('fsm_sessions', records=records, columns=_COLUMNS)
+
+
+async def load_fsm_sessions(shard: int = 0, shards: int = 1) -> list:
+    """Сессии пользователей шарда из снимка, кроме истекших, в формате save_fsm_sessions"""
+    async with get_connection() as conn:
+        rows = await conn.fetch(f"""
+            SELECT {', '.join(_COLUMNS)} FROM fsm_sessions
+            WHERE expires_at > now() AND user_id % $2 = $1
+            ORDER BY expires_at
+        """, shard, shards)
+    return [(*tuple(row)[:7], json.loads(row['data']), row['expires_at']) for row in rows]
@@ -1,23 +1,22 @@
 """
 Инициализация начальных данных в БД
 """
-from .models import create_service
+from .models import create_services
 import logging
 
 logger = logging.getLogger(__name__)
 
 
-def init_services():
-    """Создать начальные услуги"""
+async def init_services():
+    """Создать начальные услуги (название, длительность в минутах) одним запросом"""
     services = [
-        "Стрижка",
-        "Борода",
-        "Комплекс (стрижка + борода)",
+        ("Стрижка", 30),
+        ("Борода", 30),
+        ("Комплекс (стрижка + борода)", 60),
     ]
 
-    for service_name in services:
-        try:
-            service_id = create_service(service_name)
-            logger.info(f"Service '{service_name}' created/verified with ID: {service_id}")
-        except Exception as e:
-            logger.error(f"Error creating service '{service_name}': {e}")
+    try:
+        changed_count = await create_services(services)
+        logger.info(f"Services verified: {len(services)} total, {changed_count} created/updated")
+    except Exception as e:
+        logger.error(f"Error creating services: {e}")
@@ -0,0 +1,66 @@
+"""
+Метрики слоя базы данных
+
+Функции database.models оборачиваются декоратором instrumented: время
+вызова записывается в гистограмму по имени функции, а выдачи соединений
+из пула (один запрос) во время вызова считаются по той же функции.
+"""
+import functools
+import time
+from contextvars import ContextVar
+
+from monitoring import REGISTRY
+from .availability_cache import availability_cache
+
+DB_FUNCTION_DURATION = REGISTRY.histogram(
+    'db_function_duration_seconds', 'Duration of database.models calls', ('function',)
+)
+DB_QUERIES = REGISTRY.counter(
+    'db_queries_total', 'Database queries (pool checkouts) by database.models function', ('function',)
+)
+DB_POOL_WAIT = REGISTRY.histogram(
+    'db_pool_wait_seconds', 'Time spent waiting for a pool connection'
+)
+
+# Функция database.models, выполняющаяся в текущей задаче
+_current_function = ContextVar('db_function', default='other')
+
+
+def instrumented(func):
+    """Записывать время вызова корутины func и число ее запросов к БД"""
+    name = func.__name__
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        token = _current_function.set(name)
+        started = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            DB_FUNCTION_DURATION.observe(time.perf_counter() - started, name)
+            _current_function.reset(token)
+
+    return wrapper
+
+
+def current_function() -> str:
+    """Функция database.models, выполняющаяся в текущей задаче ('other' вне их)"""
+    return _current_function.get()
+
+
+def count_query(wait: float):
+    """Учесть выдачу соединения из пула и время ожидания"""
+    DB_QUERIES.inc(_current_function.get())
+    DB_POOL_WAIT.observe(wait)
+
+
+def _caches_collector() -> list:
+    availability = availability_cache.stats()
+    return [
+        ('availability_cache_hits_total', 'counter', 'Availability cache hits', availability['hits']),
+        ('availability_cache_misses_total', 'counter', 'Availability cache misses', availability['misses']),
+        ('availability_cache_entries', 'gauge', 'Availability cache entries', availability['size']),
+    ]
+
+
+REGISTRY.add_collector(_caches_collector)
@@ -0,0 +1,189 @@
+"""
+Хранилище услуг и записей в памяти процесса
+
+Для тестов и нагрузочных прогонов без PostgreSQL (STORAGE_BACKEND = 'memory').
+Данные теряются при перезапуске. Методы не уступают управление циклу
+событий между проверкой и изменением, поэтому каждая операция атомарна
+относительно других корутин, как транзакция в PostgreSQL.
+"""
+from datetime import datetime
+from .occupancy import span_bits
+from .repository import BookingRepository
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryRepository(BookingRepository):
+    """
+    Услуги и записи в словарях с индексами.
+
+    Индексы записей: по пользователю, по дате и по (мастер, дата) ->
+    {время начала: id}. Правила те же, что у таблиц PostgreSQL:
+    название услуги уникально, (master, booking_date, booking_time)
+    уникально, записи одного мастера не пересекаются.
+    """
+
+    def __init__(self):
+        self._services = {}
+        self._service_ids = {}
+        self._next_service_id = 1
+
+        self._bookings = {}
+        self._next_booking_id = 1
+        self._by_user = {}
+        self._by_date = {}
+        self._by_master_date = {}
+        self._archive = []
+
+    async def init(self, timer=None):
+        logger.info("In-memory storage initialized")
+
+    async def close(self):
+        pass
+
+    # ---------- Услуги ----------
+
+    def _upsert_service(self, name, duration_minutes) -> tuple:
+        """Создать или обновить услугу: (id, изменилась ли строка)"""
+        service_id = self._service_ids.get(name)
+        if service_id is None:
+            service_id = self._next_service_id
+            self._next_service_id += 1
+            self._service_ids[name] = service_id
+            self._services[service_id] = {
+                'id': service_id, 'name': name, 'duration_minutes': duration_minutes,
+            }
+            return service_id, True
+
+        service = self._services[service_id]
+        changed = service['duration_minutes'] != duration_minutes
+        service['duration_minutes'] = duration_minutes
+        return service_id, changed
+
+    async def upsert_service(self, name, duration_minutes):
+        return self._upsert_service(name, duration_minutes)[0]
+
+    async def upsert_services(self, services):
+        return sum(self._upsert_service(name, duration)[1] for name, duration in services)
+
+    async def list_services(self):
+        return [dict(self._services[service_id]) for service_id in sorted(self._services)]
+
+    # ---------- Записи ----------
+
+    def _occupancy(self, master, booking_date) -> int:
+        bookings = self._by_master_date.get((master, booking_date), {})
+        occupancy = 0
+        for booking_id in bookings.values():
+            booking = self._bookings[booking_id]
+            occupancy |= span_bits(booking['booking_time'], booking['duration_minutes'])
+        return occupancy
+
+    def _row(self, booking) -> dict:
+        """Запись в виде строки выборки (с названием услуги)"""
+        row = {key: value for key, value in booking.items()
+               if key not in ('service_id', 'duration_minutes')}
+        service = self._services.get(booking['service_id'])
+        row['service_name'] = service['name'] if service else None
+        return row
+
+    async def insert_booking(self, user_id, username, service_id, master, booking_date, booking_time):
+        service = self._services.get(service_id)
+        occupancy = self._occupancy(master, booking_date)
+        if service is None:
+            return {'booking_id': None, 'duration_minutes': None, 'occupancy': occupancy}
+
+        duration_minutes = service['duration_minutes']
+        bits = span_bits(booking_time, duration_minutes)
+        day_bookings = self._by_master_date.setdefault((master, booking_date), {})
+        if booking_time in day_bookings or occupancy & bits:
+            return {'booking_id': None, 'duration_minutes': duration_minutes, 'occupancy': occupancy}
+
+        booking_id = self._next_booking_id
+        self._next_booking_id += 1
+        self._bookings[booking_id] = {
+            'id': booking_id,
+            'user_id': user_id,
+            'username': username,
+            'service_id': service_id,
+            'master': master,
+            'booking_date': booking_date,
+            'booking_time': booking_time,
+            'duration_minutes': duration_minutes,
+            'created_at': datetime.now(),
+        }
+        day_bookings[booking_time] = booking_id
+        self._by_user.setdefault(user_id, set()).add(booking_id)
+        self._by_date.setdefault(booking_date, set()).add(booking_id)
+
+        return {'booking_id': booking_id, 'duration_minutes': duration_minutes,
+                'occupancy': occupancy | bits}
+
+    async def user_bookings(self, user_id):
+        today = datetime.now().date()
+        bookings = [self._bookings[booking_id] for booking_id in self._by_user.get(user_id, ())]
+        bookings = [booking for booking in bookings if booking['booking_date'] >= today]
+        bookings.sort(key=lambda booking: (booking['booking_date'], booking['booking_time']))
+        return [self._row(booking) for booking in bookings]
+
+    async def user_booking(self, booking_id, user_id):
+        booking = self._bookings.get(booking_id)
+        if (booking is None or booking['user_id'] != user_id
+                or booking['booking_date'] < datetime.now().date()):
+            return None
+        return {key: value for key, value in booking.items() if key != 'duration_minutes'}
+
+    async def bookings_by_date(self, booking_date):
+        bookings = [self._bookings[booking_id] for booking_id in self._by_date.get(booking_date, ())]
+        bookings.sort(key=lambda booking: (booking['booking_time'], booking['master']))
+        return [self._row(booking) for booking in bookings]
+
+    async def occupancy(self, master, booking_date):
+        return self._occupancy(master, booking_date)
+
+    async def occupancy_range(self, masters, start_date, end_date):
+        masters = set(masters)
+        return {
+            (master, booking_date): self._occupancy(master, booking_date)
+            for master, booking_date in self._by_master_date
+            if master in masters and start_date <= booking_date <= end_date
+            and self._by_master_date[(master, booking_date)]
+        }
+
+    def _remove(self, booking_id) -> dict:
+        """Удалить запись из таблицы и всех индексов"""
+        booking = self._bookings.pop(booking_id)
+        key = (booking['master'], booking['booking_date'])
+        del self._by_master_date[key][booking['booking_time']]
+        if not self._by_master_date[key]:
+            del self._by_master_date[key]
+
+        for index, index_key in ((self._by_user, booking['user_id']),
+                                 (self._by_date, booking['booking_date'])):
+            index[index_key].discard(booking_id)
+            if not index[index_key]:
+                del index[index_key]
+        return booking
+
+    async def remove_booking(self, booking_id, user_id):
+        booking = self._bookings.get(booking_id)
+        if booking is None or booking['user_id'] != user_id:
+            return None
+        self._remove(booking_id)
+        return {key: booking[key] for key in
+                ('master', 'booking_date', 'booking_time', 'duration_minutes')}
+
+    async def remove_before(self, cutoff_date, archive):
+        old_ids = [booking_id
+                   for booking_date, booking_ids in self._by_date.items()
+                   if booking_date < cutoff_date
+                   for booking_id in booking_ids]
+        for booking_id in old_ids:
+            booking = self._remove(booking_id)
+            if archive:
+                self._archive.append(dict(booking, archived_at=datetime.now()))
+        return len(old_ids)
+
+    async def prepare_dates(self, start_date, end_date):
+        return 0
@@ -0,0 +1,161 @@
+"""
+Версионированные миграции схемы
+
+Каждая миграция - (версия, описание, функция). Применённые версии хранятся
+в таблице schema_migrations, поэтому при обычном перезапуске выполняется
+один SELECT, а DDL и его блокировки на рабочих таблицах не повторяются.
+Миграции написаны идемпотентно (IF NOT EXISTS): база, созданная прежними
+версиями бота без schema_migrations, проходит их без ошибок.
+"""
+from .partitions import ensure_bookings_table
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Ключ advisory-блокировки: два одновременно запущенных бота не применяют миграции дважды
+_MIGRATIONS_LOCK_KEY = 7_240_316
+
+
+async def _create_services(conn):
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS services (
+            id SERIAL PRIMARY KEY,
+            name VARCHAR(100) NOT NULL UNIQUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+async def _add_service_duration(conn):
+    await conn.execute("""
+        ALTER TABLE services
+        ADD COLUMN IF NOT EXISTS duration_minutes INTEGER NOT NULL DEFAULT 30
+    """)
+
+
+async def _create_bookings(conn):
+    # Для ограничения исключения по (master, booking_period)
+    await conn.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+    # Секционированная таблица (обычная таблица прежних версий переносится в неё)
+    await ensure_bookings_table(conn)
+
+
+async def _create_bookings_indexes(conn):
+    await conn.execute("CREATE INDEX IF NOT EXISTS idx_bookings_user ON bookings(user_id)")
+    await conn.execute("CREATE INDEX IF NOT EXISTS idx_bookings_date ON bookings(booking_date)")
+    await conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_bookings_master_date
+        ON bookings(master, booking_date)
+    """)
+
+
+async def _create_bookings_archive(conn):
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS bookings_archive (
+            id INTEGER PRIMARY KEY,
+            user_id BIGINT NOT NULL,
+            username VARCHAR(100),
+            service_id INTEGER,
+            master VARCHAR(50) NOT NULL,
+            booking_date DATE NOT NULL,
+            booking_time TIME NOT NULL,
+            duration_minutes INTEGER NOT NULL,
+            created_at TIMESTAMP,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+async def _index_user_bookings(conn):
+    # Записи пользователя выбираются по user_id и booking_date >= сегодня:
+    # составной индекс заменяет индекс по одному user_id
+    await conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_bookings_user_date
+        ON bookings(user_id, booking_date)
+    """)
+    await conn.execute("DROP INDEX IF EXISTS idx_bookings_user")
+
+
+async def _create_fsm_sessions(conn):
+    # Снимок незавершенных сценариев записи (FSM_SNAPSHOT=postgres)
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS fsm_sessions (
+            bot_id BIGINT NOT NULL,
+            chat_id BIGINT NOT NULL,
+            user_id BIGINT NOT NULL,
+            thread_id BIGINT,
+            business_connection_id VARCHAR(100),
+            destiny VARCHAR(50) NOT NULL,
+            state VARCHAR(100),
+            data JSONB NOT NULL,
+            expires_at TIMESTAMP NOT NULL
+        )
+    """)
+
+
+async def _fsm_sessions_expires_at_tz(conn):
+    # Срок сессии с часовым поясом: бот и сервер БД могут работать в разных поясах.
+    # Прежние значения читаются в поясе сервера, как их сравнивал LOCALTIMESTAMP
+    await conn.execute("""
+        ALTER TABLE fsm_sessions ALTER COLUMN expires_at TYPE TIMESTAMPTZ
+    """)
+
+
+# Упорядоченный список миграций; новые добавляются только в конец
+MIGRATIONS = [
+    (1, "create services", _create_services),
+    (2, "add services.duration_minutes", _add_service_duration),
+    (3, "create partitioned bookings", _create_bookings),
+    (4, "create bookings indexes", _create_bookings_indexes),
+    (5, "create bookings_archive", _create_bookings_archive),
+    (6, "index bookings by (user_id, booking_date)", _index_user_bookings),
+    (7, "create fsm_sessions", _create_fsm_sessions),
+    (8, "fsm_sessions.expires_at with time zone", _fsm_sessions_expires_at_tz),
+]
+
+
+async def _applied_versions(conn) -> set:
+    """Версии уже применённых миграций (пустое множество, если таблицы ещё нет)"""
+    if await conn.fetchval("SELECT to_regclass('schema_migrations')") is None:
+        return set()
+    rows = await conn.fetch("SELECT version FROM schema_migrations")
+    return {row['version'] for row in rows}
+
+
+async def apply_migrations(conn) -> int:
+    """
+    Применить недостающие миграции по порядку.
+
+    Миграции и записи о них в schema_migrations выполняются в одной
+    транзакции под advisory-блокировкой: при ошибке схема остаётся
+    прежней. Возвращает количество применённых миграций.
+    """
+    applied = await _applied_versions(conn)
+    if all(version in applied for version, _, _ in MIGRATIONS):
+        return 0
+
+    count = 0
+    async with conn.transaction():
+        await conn.execute("SELECT pg_advisory_xact_lock($1)", _MIGRATIONS_LOCK_KEY)
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                description VARCHAR(200) NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        # Перечитываем под блокировкой: другой процесс мог успеть применить миграции
+        applied = await _applied_versions(conn)
+
+        for version, description, migrate in MIGRATIONS:
+            if version in applied:
+                continue
+            await migrate(conn)
+            await conn.execute(
+                "INSERT INTO schema_migrations (version, description) VALUES ($1, $2)",
+                version, description
+            )
+            logger.info(f"Applied migration {version}: {description}")
+            count += 1
+
+    return count
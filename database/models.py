@@ -1,161 +1,289 @@
 """
 Модели для работы с базой данных
 """
-from datetime import datetime, timedelta
-from psycopg2.extras import RealDictCursor
-from .connection import get_connection, return_connection
-from config import BOOKING_RETENTION_DAYS
+from datetime import date, datetime, time, timedelta
+from .repository import get_repository
+from .instrumentation import instrumented
+from .availability_cache import availability_cache
+from .slot_holds import slot_holds
+from .catalogue import services_catalogue
+from .user_bookings_cache import user_bookings_cache
+from .occupancy import slot_bit, span_bits
+from config import (
+    BOOKING_RETENTION_DAYS,
+    BOOKING_DAYS_AHEAD,
+    PARTITIONS_AHEAD_DAYS,
+    SLOT_DURATION_MINUTES,
+    BOOKING_ARCHIVE_ENABLED
+)
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+def _to_date(value) -> date:
+    """Привести дату в формате ISO-строки к date (asyncpg не принимает строки)"""
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _to_time(value) -> time:
+    """Привести время в формате 'ЧЧ:ММ' к time"""
+    return time.fromisoformat(value) if isinstance(value, str) else value
+
+
+# Результаты create_booking
+BOOKING_CREATED = 'created'
+BOOKING_CONFLICT = 'conflict'
+BOOKING_ERROR = 'error'
+
+
 # ========== УСЛУГИ ==========
 
-def create_service(name: str) -> int:
-    """Создать услугу"""
-    conn = get_connection()
-    try:
-        with conn.cursor() as cur:
-            cur.execute(
-                "INSERT INTO services (name) VALUES (%s) ON CONFLICT (name) DO NOTHING RETURNING id",
-                (name,)
-            )
-            result = cur.fetchone()
-            conn.commit()
-            if result:
-                return result[0]
-            else:
-                # Если услуга уже существует
-                cur.execute("SELECT id FROM services WHERE name = %s", (name,))
-                return cur.fetchone()[0]
-    finally:
-        return_connection(conn)
+@instrumented
+async def create_service(name: str, duration_minutes: int = SLOT_DURATION_MINUTES) -> int:
+    """Создать услугу (для существующей - обновить длительность)"""
+    service_id = await get_repository().upsert_service(name, duration_minutes)
+    services_catalogue.invalidate()
+    return service_id
 
 
-def get_all_services() -> list:
-    """Получить все услуги"""
-    conn = get_connection()
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute("SELECT id, name FROM services ORDER BY id")
-            return cur.fetchall()
-    finally:
-        return_connection(conn)
+@instrumented
+async def create_services(services: list) -> int:
+    """
+    Создать или обновить услуги одним запросом.
+
+    services - список пар (название, длительность в минутах). Строки,
+    у которых длительность не изменилась, не перезаписываются.
+    Возвращает количество созданных или обновленных услуг.
+    """
+    changed_count = await get_repository().upsert_services(services)
+    services_catalogue.invalidate()
+    return changed_count
+
+
+@instrumented
+async def get_all_services() -> tuple:
+    """Получить все услуги (из каталога в памяти)"""
+    return await services_catalogue.all()
+
+
+@instrumented
+async def get_service(service_id: int):
+    """Получить услугу по id (из каталога в памяти) или None"""
+    return await services_catalogue.get(service_id)
 
 
 # ========== ЗАПИСИ ==========
 
-def create_booking(user_id: int, username: str, service_id: int,
-                   master: str, booking_date: str, booking_time: str) -> bool:
-    """Создать запись"""
-    conn = get_connection()
-    try:
-        with conn.cursor() as cur:
-            cur.execute("""
-                INSERT INTO bookings (user_id, username, service_id, master, booking_date, booking_time)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            """, (user_id, username, service_id, master, booking_date, booking_time))
-            conn.commit()
-            return True
-    except Exception as e:
-        conn.rollback()
-        logger.error(f"Error creating booking: {e}")
-        return False
-    finally:
-        return_connection(conn)
+@instrumented
+async def create_booking(user_id: int, username: str, service_id: int,
+                         master: str, booking_date: str, booking_time: str) -> dict:
+    """
+    Создать запись.
+
+    Хранилище вставляет запись, только если слот свободен: пересечение
+    с другой записью мастера не считается ошибкой. Вместе со вставкой
+    читается битовая карта занятости мастера на дату, чтобы при конфликте
+    сразу предложить другое время.
 
+    Возвращает словарь:
+        status     - BOOKING_CREATED, BOOKING_CONFLICT или BOOKING_ERROR
+        booking_id - id созданной записи (или None)
+        occupancy  - занятость мастера на дату при конфликте (иначе None)
 
-def get_bookings_by_user(user_id: int) -> list:
-    """Получить записи пользователя (только будущие и сегодняшние)"""
-    conn = get_connection()
+    Удержание слота пользователем снимается только после того, как кэш
+    занятости отметил слот занятым.
+    """
+    booking_date = _to_date(booking_date)
+    booking_time = _to_time(booking_time)
+    version = availability_cache.version(master, booking_date)
     try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute("""
-                SELECT b.id, b.user_id, b.username, s.name as service_name,
-                       b.master, b.booking_date, b.booking_time, b.created_at
-                FROM bookings b
-                JOIN services s ON b.service_id = s.id
-                WHERE b.user_id = %s
-                  AND b.booking_date >= CURRENT_DATE
-                ORDER BY b.booking_date, b.booking_time
-            """, (user_id,))
-            return cur.fetchall()
+        try:
+            row = await get_repository().insert_booking(
+                user_id, username, service_id, master, booking_date, booking_time
+            )
+        except Exception as e:
+            logger.error(f"Error creating booking: {e}")
+            return {'status': BOOKING_ERROR, 'booking_id': None, 'occupancy': None}
+
+        if row['duration_minutes'] is None:
+            logger.error(f"Error creating booking: unknown service {service_id}")
+            return {'status': BOOKING_ERROR, 'booking_id': None, 'occupancy': None}
+
+        bits = span_bits(booking_time, row['duration_minutes'])
+        if row['booking_id'] is None:
+            # Слот занят: занятость из того же запроса обновляет кэш
+            # (конфликтующая запись могла зафиксироваться позже снимка)
+            occupancy = row['occupancy'] | bits
+            availability_cache.put(master, booking_date, occupancy, version)
+            return {'status': BOOKING_CONFLICT, 'booking_id': None, 'occupancy': occupancy}
+
+        availability_cache.mark_booked(master, booking_date, bits)
+        user_bookings_cache.invalidate(user_id)
+        return {'status': BOOKING_CREATED, 'booking_id': row['booking_id'], 'occupancy': None}
     finally:
-        return_connection(conn)
+        slot_holds.release(user_id)
+
+
+@instrumented
+async def get_bookings_by_user(user_id: int) -> tuple:
+    """
+    Получить записи пользователя (только будущие и сегодняшние).
+
+    Результат кэшируется в user_bookings_cache до изменения записей пользователя.
+    """
+    bookings = user_bookings_cache.get(user_id)
+    if bookings is not None:
+        return bookings
+
+    version = user_bookings_cache.version(user_id)
+    bookings = tuple(await get_repository().user_bookings(user_id))
+
+    user_bookings_cache.put(user_id, bookings, version)
+    return bookings
 
 
-def get_bookings_by_date(booking_date: str) -> list:
+@instrumented
+async def get_booking(booking_id: int, user_id: int):
+    """
+    Получить запись пользователя по id (только будущие и сегодняшние) или None.
+
+    Сначала ищет в кэше списка записей пользователя, иначе выполняет
+    выборку по первичному ключу; название услуги берется из каталога.
+    """
+    bookings = user_bookings_cache.get(user_id)
+    if bookings is not None:
+        return next((b for b in bookings if b['id'] == booking_id), None)
+
+    row = await get_repository().user_booking(booking_id, user_id)
+    if row is None:
+        return None
+
+    booking = dict(row)
+    service = await services_catalogue.get(booking.pop('service_id'))
+    booking['service_name'] = service['name'] if service else None
+    return booking
+
+
+@instrumented
+async def get_bookings_by_date(booking_date: str) -> list:
     """Получить все записи на определенную дату"""
-    conn = get_connection()
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute("""
-                SELECT b.id, b.user_id, b.username, s.name as service_name,
-                       b.master, b.booking_date, b.booking_time, b.created_at
-                FROM bookings b
-                JOIN services s ON b.service_id = s.id
-                WHERE b.booking_date = %s
-                ORDER BY b.booking_time, b.master
-            """, (booking_date,))
-            return cur.fetchall()
-    finally:
-        return_connection(conn)
+    return await get_repository().bookings_by_date(_to_date(booking_date))
 
 
-def get_bookings_by_master_date_time(master: str, booking_date: str, booking_time: str) -> bool:
-    """Проверить, занят ли слот (возвращает True если занят)"""
-    conn = get_connection()
-    try:
-        with conn.cursor() as cur:
-            cur.execute("""
-                SELECT COUNT(*) FROM bookings
-                WHERE master = %s AND booking_date = %s AND booking_time = %s
-            """, (master, booking_date, booking_time))
-            count = cur.fetchone()[0]
-            return count > 0
-    finally:
-        return_connection(conn)
+@instrumented
+async def get_occupancy(master: str, booking_date: str) -> int:
+    """
+    Получить битовую карту занятости мастера на дату одним агрегирующим запросом.
+
+    Результат кэшируется в availability_cache.
+    """
+    booking_date = _to_date(booking_date)
+    occupancy = availability_cache.get(master, booking_date)
+    if occupancy is not None:
+        return occupancy
+
+    version = availability_cache.version(master, booking_date)
+    occupancy = await get_repository().occupancy(master, booking_date)
+
+    availability_cache.put(master, booking_date, occupancy, version)
+    return occupancy
+
+
+@instrumented
+async def get_occupancy_horizon(masters, start_date: date, end_date: date) -> dict:
+    """
+    Получить битовые карты занятости мастеров на период одним запросом.
+
+    Возвращает {(мастер, дата): битовая карта} для каждого мастера и дня
+    периода (0 - свободный день). Если весь период уже есть
+    в availability_cache, запрос не выполняется.
+    """
+    days = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+    horizon = {}
+    versions = {}
+    for master in masters:
+        for day in days:
+            occupancy = availability_cache.get(master, day)
+            if occupancy is None:
+                versions[(master, day)] = availability_cache.version(master, day)
+            else:
+                horizon[(master, day)] = occupancy
 
+    if not versions:
+        return horizon
 
-def delete_booking(booking_id: int, user_id: int) -> bool:
+    occupied = await get_repository().occupancy_range(masters, start_date, end_date)
+
+    loaded = {key: occupied.get(key, 0) for key in versions}
+    for (master, day), occupancy in loaded.items():
+        availability_cache.put(master, day, occupancy, versions[(master, day)])
+    horizon.update(loaded)
+    return horizon
+
+
+@instrumented
+async def get_bookings_by_master_date_time(master: str, booking_date: str, booking_time: str) -> bool:
+    """
+    Проверить, занят ли слот (возвращает True если занят).
+
+    Оставлено для совместимости: проверка по битовой карте get_occupancy.
+    """
+    return bool(await get_occupancy(master, booking_date) & slot_bit(_to_time(booking_time)))
+
+
+@instrumented
+async def delete_booking(booking_id: int, user_id: int) -> bool:
     """Удалить запись (только свою)"""
-    conn = get_connection()
     try:
-        with conn.cursor() as cur:
-            cur.execute("""
-                DELETE FROM bookings
-                WHERE id = %s AND user_id = %s
-            """, (booking_id, user_id))
-            deleted = cur.rowcount > 0
-            conn.commit()
-            return deleted
+        deleted = await get_repository().remove_booking(booking_id, user_id)
     except Exception as e:
-        conn.rollback()
         logger.error(f"Error deleting booking: {e}")
         return False
-    finally:
-        return_connection(conn)
 
+    if deleted is None:
+        return False
 
-def delete_old_bookings():
-    """Удалить записи старше N дней"""
-    conn = get_connection()
+    user_bookings_cache.invalidate(user_id)
+    availability_cache.mark_free(
+        deleted['master'], deleted['booking_date'],
+        span_bits(deleted['booking_time'], deleted['duration_minutes'])
+    )
+    return True
+
+
+@instrumented
+async def delete_old_bookings():
+    """
+    Удалить записи старше N дней.
+
+    В PostgreSQL секции bookings, целиком лежащие до даты отсечения,
+    удаляются без построчного DELETE, а остаток - пачками по
+    CLEANUP_BATCH_SIZE с паузой между пачками.
+    При BOOKING_ARCHIVE_ENABLED записи переносятся в bookings_archive.
+    """
+    cutoff_date = datetime.now().date() - timedelta(days=BOOKING_RETENTION_DAYS)
+    action = "Archived" if BOOKING_ARCHIVE_ENABLED else "Deleted"
+
+    deleted_count = 0
     try:
-        cutoff_date = datetime.now().date() - timedelta(days=BOOKING_RETENTION_DAYS)
-        with conn.cursor() as cur:
-            cur.execute("""
-                DELETE FROM bookings
-                WHERE booking_date < %s
-            """, (cutoff_date,))
-            deleted_count = cur.rowcount
-            conn.commit()
-            if deleted_count > 0:
-                logger.info(f"Deleted {deleted_count} old bookings")
-            return deleted_count
+        deleted_count = await get_repository().remove_before(cutoff_date, BOOKING_ARCHIVE_ENABLED)
     except Exception as e:
-        conn.rollback()
         logger.error(f"Error deleting old bookings: {e}")
-        return 0
     finally:
-        return_connection(conn)
+        availability_cache.drop_before(cutoff_date)
+        slot_holds.drop_before(cutoff_date)
+        user_bookings_cache.clear()
+
+    if deleted_count > 0:
+        logger.info(f"{action} {deleted_count} old bookings")
+    return deleted_count
+
+
+@instrumented
+async def create_booking_partitions() -> int:
+    """Создать заранее секции bookings до конца горизонта записи (с запасом)"""
+    today = datetime.now().date()
+    return await get_repository().prepare_dates(
+        today, today + timedelta(days=BOOKING_DAYS_AHEAD + PARTITIONS_AHEAD_DAYS)
+    )
@@ -0,0 +1,66 @@
+"""
+Битовые карты занятости слотов за день
+
+Бит i соответствует слоту, который начинается через
+i * SLOT_DURATION_MINUTES минут после полуночи. Занятость мастера
+на дату хранится одним целым числом, а проверки свободности,
+поиск первого свободного слота и подсчет свободных слотов
+сводятся к битовым операциям.
+"""
+from datetime import time
+from config import SLOT_DURATION_MINUTES
+
+SLOTS_PER_DAY = 24 * 60 // SLOT_DURATION_MINUTES
+
+# Подписи 'ЧЧ:ММ' для всех слотов суток
+SLOT_LABELS = tuple(
+    f"{i * SLOT_DURATION_MINUTES // 60:02d}:{i * SLOT_DURATION_MINUTES % 60:02d}"
+    for i in range(SLOTS_PER_DAY)
+)
+_SLOT_BY_LABEL = {label: i for i, label in enumerate(SLOT_LABELS)}
+
+
+def slot_index(value) -> int:
+    """Номер слота для времени (time или 'ЧЧ:ММ')"""
+    if isinstance(value, str):
+        return _SLOT_BY_LABEL[value]
+    return (value.hour * 60 + value.minute) // SLOT_DURATION_MINUTES
+
+
+def slot_bit(value) -> int:
+    """Бит слота для времени (time или 'ЧЧ:ММ')"""
+    return 1 << slot_index(value)
+
+
+def slots_needed(duration_minutes: int) -> int:
+    """Сколько слотов занимает услуга заданной длительности"""
+    return -(-duration_minutes // SLOT_DURATION_MINUTES)
+
+
+def span_bits(value, duration_minutes: int) -> int:
+    """Биты всех слотов, которые занимает запись с началом value"""
+    return ((1 << slots_needed(duration_minutes)) - 1) << slot_index(value)
+
+
+def slot_time(index: int) -> time:
+    """Время начала слота"""
+    minutes = index * SLOT_DURATION_MINUTES
+    return time(minutes // 60, minutes % 60)
+
+
+def iter_slots(mask: int):
+    """Номера установленных битов по возрастанию"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def first_slot(mask: int) -> int:
+    """Номер младшего установленного бита или -1, если маска пуста"""
+    return (mask & -mask).bit_length() - 1
+
+
+def mask_labels(mask: int) -> list:
+    """Подписи 'ЧЧ:ММ' установленных битов по возрастанию"""
+    return [SLOT_LABELS[i] for i in iter_slots(mask)]
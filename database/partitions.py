@@ -0,0 +1,213 @@
+"""
+Секционирование таблицы bookings по booking_date
+
+Таблица bookings секционирована по диапазонам дат (неделя или месяц,
+BOOKINGS_PARTITION_INTERVAL). Секции создаются заранее, а хранение
+старых записей сводится к отсоединению и удалению целых секций.
+Функции принимают соединение asyncpg и не управляют пулом.
+"""
+import re
+from datetime import date, timedelta
+from config import BOOKINGS_PARTITION_INTERVAL
+import logging
+
+logger = logging.getLogger(__name__)
+
+_BOUND_RE = re.compile(r"FROM \('(\d{4}-\d{2}-\d{2})'\) TO \('(\d{4}-\d{2}-\d{2})'\)")
+
+# Секционированная таблица записей
+_CREATE_BOOKINGS_SQL = """
+    CREATE TABLE IF NOT EXISTS bookings (
+        id INTEGER NOT NULL DEFAULT nextval('bookings_id_seq'),
+        user_id BIGINT NOT NULL,
+        username VARCHAR(100),
+        service_id INTEGER REFERENCES services(id) ON DELETE CASCADE,
+        master VARCHAR(50) NOT NULL,
+        booking_date DATE NOT NULL,
+        booking_time TIME NOT NULL,
+        duration_minutes INTEGER NOT NULL DEFAULT 30,
+        booking_period TSRANGE GENERATED ALWAYS AS (
+            tsrange(
+                booking_date + booking_time,
+                booking_date + booking_time + make_interval(mins => duration_minutes)
+            )
+        ) STORED,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (id, booking_date),
+        UNIQUE (master, booking_date, booking_time)
+    ) PARTITION BY RANGE (booking_date)
+"""
+
+
+def partition_bounds(day: date) -> tuple:
+    """Границы [начало, конец) секции, в которую попадает day"""
+    if BOOKINGS_PARTITION_INTERVAL == 'week':
+        start = day - timedelta(days=day.weekday())
+        return start, start + timedelta(days=7)
+
+    start = day.replace(day=1)
+    end = (start + timedelta(days=32)).replace(day=1)
+    return start, end
+
+
+async def get_partitions(conn) -> list:
+    """Секции bookings: список (имя, начало, конец), отсортированный по началу"""
+    rows = await conn.fetch("""
+        SELECT c.relname AS name, pg_get_expr(c.relpartbound, c.oid) AS bound
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'bookings'::regclass
+    """)
+
+    partitions = []
+    for row in rows:
+        match = _BOUND_RE.search(row['bound'])
+        if match:
+            partitions.append((
+                row['name'],
+                date.fromisoformat(match.group(1)),
+                date.fromisoformat(match.group(2))
+            ))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+async def ensure_partitions(conn, start_date: date, end_date: date) -> int:
+    """
+    Создать недостающие секции, чтобы покрыть все дни от start_date до end_date.
+
+    Новая секция не пересекается с существующими (например, после смены
+    BOOKINGS_PARTITION_INTERVAL). На каждой секции создается ограничение
+    исключения на пересечение записей мастера: записи не переходят через
+    полночь, поэтому проверки внутри секции достаточно.
+    Возвращает количество созданных секций.
+    """
+    existing = [(start, end) for _, start, end in await get_partitions(conn)]
+    created = 0
+
+    day = start_date
+    while day <= end_date:
+        covering = next(((s, e) for s, e in existing if s <= day < e), None)
+        if covering:
+            day = covering[1]
+            continue
+
+        start, end = partition_bounds(day)
+        start = max([start] + [e for _, e in existing if e <= day])
+        end = min([end] + [s for s, _ in existing if s > day])
+
+        name = f"bookings_p{start.strftime('%Y%m%d')}"
+        await conn.execute(f"""
+            CREATE TABLE {name} PARTITION OF bookings
+            FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')
+        """)
+        await conn.execute(f"""
+            ALTER TABLE {name} ADD CONSTRAINT {name}_no_overlap
+            EXCLUDE USING gist (master WITH =, booking_period WITH &&)
+        """)
+        logger.info(f"Created bookings partition {name} [{start}, {end})")
+
+        existing.append((start, end))
+        created += 1
+        day = end
+
+    return created
+
+
+async def ensure_bookings_table(conn):
+    """
+    Создать секционированную таблицу bookings.
+
+    Если bookings - обычная таблица из прежних версий, данные переносятся
+    в секционированную таблицу: старая таблица переименовывается вместе
+    с индексами, создаются секции на весь диапазон дат, строки копируются,
+    последовательность id переходит к новой таблице.
+    """
+    relkind = await conn.fetchval("""
+        SELECT c.relkind FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE c.relname = 'bookings' AND n.nspname = current_schema()
+    """)
+
+    if relkind == 'p':
+        return
+
+    if relkind is None:
+        await conn.execute("CREATE SEQUENCE IF NOT EXISTS bookings_id_seq")
+        await conn.execute(_CREATE_BOOKINGS_SQL)
+        await conn.execute("ALTER SEQUENCE bookings_id_seq OWNED BY bookings.id")
+        return
+
+    logger.info("Migrating bookings to a partitioned table...")
+
+    await conn.execute("""
+        ALTER TABLE bookings
+        ADD COLUMN IF NOT EXISTS duration_minutes INTEGER NOT NULL DEFAULT 30
+    """)
+    await conn.execute("ALTER TABLE bookings RENAME TO bookings_legacy")
+    await conn.execute("""
+        DO $$
+        DECLARE
+            index_name TEXT;
+        BEGIN
+            FOR index_name IN
+                SELECT indexname FROM pg_indexes
+                WHERE tablename = 'bookings_legacy' AND schemaname = current_schema()
+            LOOP
+                EXECUTE format('ALTER INDEX %I RENAME TO %I', index_name, 'legacy_' || index_name);
+            END LOOP;
+        END
+        $$
+    """)
+    await conn.execute("ALTER SEQUENCE bookings_id_seq OWNED BY NONE")
+    await conn.execute(_CREATE_BOOKINGS_SQL)
+
+    first_date, last_date = await conn.fetchrow(
+        "SELECT MIN(booking_date), MAX(booking_date) FROM bookings_legacy"
+    )
+    if first_date is not None:
+        await ensure_partitions(conn, first_date, last_date)
+
+    status = await conn.execute("""
+        INSERT INTO bookings (id, user_id, username, service_id, master,
+                              booking_date, booking_time, duration_minutes, created_at)
+        SELECT id, user_id, username, service_id, master,
+               booking_date, booking_time, duration_minutes, created_at
+        FROM bookings_legacy
+    """)
+    await conn.execute("DROP TABLE bookings_legacy")
+    await conn.execute("ALTER SEQUENCE bookings_id_seq OWNED BY bookings.id")
+
+    logger.info(f"Bookings migrated to a partitioned table ({status.split()[-1]} rows)")
+
+
+async def drop_partitions_before(conn, cutoff_date: date, archive: bool) -> int:
+    """
+    Отсоединить и удалить секции, все даты которых раньше cutoff_date.
+
+    При archive строки секции предварительно переносятся в bookings_archive.
+    Каждая секция обрабатывается в своей транзакции.
+    Возвращает количество удаленных записей.
+    """
+    removed = 0
+    for name, _, end in await get_partitions(conn):
+        if end > cutoff_date:
+            break
+
+        async with conn.transaction():
+            rows = await conn.fetchval(f"SELECT COUNT(*) FROM {name}")
+            if archive:
+                await conn.execute(f"""
+                    INSERT INTO bookings_archive (id, user_id, username, service_id, master,
+                                                  booking_date, booking_time, duration_minutes,
+                                                  created_at)
+                    SELECT id, user_id, username, service_id, master,
+                           booking_date, booking_time, duration_minutes, created_at
+                    FROM {name}
+                """)
+            await conn.execute(f"ALTER TABLE bookings DETACH PARTITION {name}")
+            await conn.execute(f"DROP TABLE {name}")
+
+        logger.info(f"Dropped bookings partition {name} ({rows} rows)")
+        removed += rows
+
+    return removed
@@ -0,0 +1,211 @@
+"""
+Хранилище услуг и записей в PostgreSQL (asyncpg)
+"""
+import asyncio
+from .connection import init_db, get_connection, close_all_connections
+from .partitions import drop_partitions_before, ensure_partitions
+from .repository import BookingRepository
+from config import SLOT_DURATION_MINUTES, CLEANUP_BATCH_SIZE, CLEANUP_BATCH_PAUSE_SECONDS
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _affected_rows(status: str) -> int:
+    """Количество строк из статуса команды asyncpg (например, 'DELETE 3')"""
+    return int(status.split()[-1])
+
+
+def _occupancy_bits_sql(slot_minutes_param: str) -> str:
+    """
+    SQL-выражение битовой карты занятости: OR битов всех слотов,
+    которые покрывают записи мастера на дату.
+
+    slot_minutes_param - параметр запроса с длительностью слота (например, '$3').
+    """
+    slot = slot_minutes_param
+    return f"""bit_or(
+        ((1::bigint << ((duration_minutes + {slot} - 1) / {slot})) - 1)
+        << (EXTRACT(EPOCH FROM booking_time)::int / 60 / {slot})
+    )"""
+
+
+# Перенос пачки старых записей в архив
+_ARCHIVE_BATCH_SQL = """
+    WITH batch AS (
+        SELECT id FROM bookings
+        WHERE booking_date < $1
+        ORDER BY id
+        LIMIT $2
+    ), deleted AS (
+        DELETE FROM bookings b
+        USING batch
+        WHERE b.id = batch.id
+        RETURNING b.id, b.user_id, b.username, b.service_id, b.master,
+                  b.booking_date, b.booking_time, b.duration_minutes, b.created_at
+    )
+    INSERT INTO bookings_archive (id, user_id, username, service_id, master,
+                                  booking_date, booking_time, duration_minutes, created_at)
+    SELECT * FROM deleted
+"""
+
+# Удаление пачки старых записей
+_DELETE_BATCH_SQL = """
+    DELETE FROM bookings
+    WHERE id IN (
+        SELECT id FROM bookings
+        WHERE booking_date < $1
+        ORDER BY id
+        LIMIT $2
+    )
+"""
+
+
+class PostgresRepository(BookingRepository):
+    """Хранилище в PostgreSQL: пул соединений, миграции, секционированная bookings"""
+
+    async def init(self, timer=None):
+        await init_db(timer)
+
+    async def close(self):
+        await close_all_connections()
+
+    # ---------- Услуги ----------
+
+    async def upsert_service(self, name, duration_minutes):
+        async with get_connection() as conn:
+            return await conn.fetchval("""
+                INSERT INTO services (name, duration_minutes) VALUES ($1, $2)
+                ON CONFLICT (name) DO UPDATE SET duration_minutes = EXCLUDED.duration_minutes
+                RETURNING id
+            """, name, duration_minutes)
+
+    async def upsert_services(self, services):
+        names = [name for name, _ in services]
+        durations = [duration_minutes for _, duration_minutes in services]
+
+        async with get_connection() as conn:
+            status = await conn.execute("""
+                INSERT INTO services (name, duration_minutes)
+                SELECT * FROM unnest($1::varchar[], $2::integer[])
+                ON CONFLICT (name) DO UPDATE SET duration_minutes = EXCLUDED.duration_minutes
+                WHERE services.duration_minutes IS DISTINCT FROM EXCLUDED.duration_minutes
+            """, names, durations)
+        return _affected_rows(status)
+
+    async def list_services(self):
+        async with get_connection() as conn:
+            return await conn.fetch("SELECT id, name, duration_minutes FROM services ORDER BY id")
+
+    # ---------- Записи ----------
+
+    async def insert_booking(self, user_id, username, service_id, master, booking_date, booking_time):
+        # ON CONFLICT DO NOTHING: пересечение с другой записью мастера
+        # (UNIQUE и ограничения исключения секций) не считается ошибкой;
+        # в том же запросе читается занятость мастера на дату
+        async with get_connection() as conn:
+            return await conn.fetchrow(f"""
+                WITH inserted AS (
+                    INSERT INTO bookings (user_id, username, service_id, master,
+                                          booking_date, booking_time, duration_minutes)
+                    SELECT $1, $2, s.id, $4, $5, $6, s.duration_minutes
+                    FROM services s
+                    WHERE s.id = $3
+                    ON CONFLICT DO NOTHING
+                    RETURNING id, duration_minutes
+                )
+                SELECT
+                    (SELECT id FROM inserted) AS booking_id,
+                    (SELECT duration_minutes FROM services WHERE id = $3) AS duration_minutes,
+                    (SELECT COALESCE({_occupancy_bits_sql('$7')}, 0)
+                     FROM bookings
+                     WHERE master = $4 AND booking_date = $5) AS occupancy
+            """, user_id, username, service_id, master, booking_date, booking_time,
+                SLOT_DURATION_MINUTES)
+
+    async def user_bookings(self, user_id):
+        async with get_connection() as conn:
+            return await conn.fetch("""
+                SELECT b.id, b.user_id, b.username, s.name as service_name,
+                       b.master, b.booking_date, b.booking_time, b.created_at
+                FROM bookings b
+                JOIN services s ON b.service_id = s.id
+                WHERE b.user_id = $1
+                  AND b.booking_date >= CURRENT_DATE
+                ORDER BY b.booking_date, b.booking_time
+            """, user_id)
+
+    async def user_booking(self, booking_id, user_id):
+        async with get_connection() as conn:
+            return await conn.fetchrow("""
+                SELECT id, user_id, username, service_id,
+                       master, booking_date, booking_time, created_at
+                FROM bookings
+                WHERE id = $1 AND user_id = $2
+                  AND booking_date >= CURRENT_DATE
+            """, booking_id, user_id)
+
+    async def bookings_by_date(self, booking_date):
+        async with get_connection() as conn:
+            return await conn.fetch("""
+                SELECT b.id, b.user_id, b.username, s.name as service_name,
+                       b.master, b.booking_date, b.booking_time, b.created_at
+                FROM bookings b
+                JOIN services s ON b.service_id = s.id
+                WHERE b.booking_date = $1
+                ORDER BY b.booking_time, b.master
+            """, booking_date)
+
+    async def occupancy(self, master, booking_date):
+        async with get_connection() as conn:
+            return await conn.fetchval(f"""
+                SELECT COALESCE({_occupancy_bits_sql('$3')}, 0)
+                FROM bookings
+                WHERE master = $1 AND booking_date = $2
+            """, master, booking_date, SLOT_DURATION_MINUTES)
+
+    async def occupancy_range(self, masters, start_date, end_date):
+        async with get_connection() as conn:
+            rows = await conn.fetch(f"""
+                SELECT master, booking_date, {_occupancy_bits_sql('$3')} AS occupancy
+                FROM bookings
+                WHERE booking_date BETWEEN $1 AND $2
+                  AND master = ANY($4::varchar[])
+                GROUP BY master, booking_date
+            """, start_date, end_date, SLOT_DURATION_MINUTES, list(masters))
+        return {(row['master'], row['booking_date']): row['occupancy'] for row in rows}
+
+    async def remove_booking(self, booking_id, user_id):
+        async with get_connection() as conn:
+            return await conn.fetchrow("""
+                DELETE FROM bookings
+                WHERE id = $1 AND user_id = $2
+                RETURNING master, booking_date, booking_time, duration_minutes
+            """, booking_id, user_id)
+
+    async def remove_before(self, cutoff_date, archive):
+        # Секции, целиком лежащие до даты отсечения, удаляются без построчного
+        # DELETE; остаток удаляется пачками по CLEANUP_BATCH_SIZE, каждая
+        # в своей транзакции, с паузой между пачками
+        batch_sql = _ARCHIVE_BATCH_SQL if archive else _DELETE_BATCH_SQL
+        action = "Archived" if archive else "Deleted"
+
+        async with get_connection() as conn:
+            removed = await drop_partitions_before(conn, cutoff_date, archive)
+
+        while True:
+            async with get_connection() as conn:
+                status = await conn.execute(batch_sql, cutoff_date, CLEANUP_BATCH_SIZE)
+            batch_count = _affected_rows(status)
+            removed += batch_count
+
+            if batch_count < CLEANUP_BATCH_SIZE:
+                return removed
+
+            logger.info(f"{action} {removed} old bookings so far...")
+            await asyncio.sleep(CLEANUP_BATCH_PAUSE_SECONDS)
+
+    async def prepare_dates(self, start_date, end_date):
+        async with get_connection() as conn:
+            async with conn.transaction():
+                return await ensure_partitions(conn, start_date, end_date)
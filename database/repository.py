@@ -0,0 +1,136 @@
+"""
+Интерфейс хранилища услуг и записей
+
+Функции database.models работают с хранилищем через BookingRepository:
+кэши, удержания и бизнес-правила остаются в models, а реализация
+хранения выбирается настройкой STORAGE_BACKEND:
+    'postgres' - PostgreSQL (database/postgres_repository.py)
+    'memory'   - в памяти процесса (database/memory_repository.py),
+                 для тестов и нагрузочных прогонов без PostgreSQL
+"""
+from abc import ABC, abstractmethod
+from datetime import date, time
+from config import STORAGE_BACKEND
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class BookingRepository(ABC):
+    """
+    Хранилище услуг и записей.
+
+    Записи возвращаются как отображения с ключами колонок таблицы bookings
+    (id, user_id, username, service_name, master, booking_date, booking_time,
+    created_at). Хранилище обеспечивает уникальность названия услуги,
+    уникальность (master, booking_date, booking_time) и отсутствие
+    пересечений записей одного мастера.
+    """
+
+    @abstractmethod
+    async def init(self, timer=None):
+        """Подготовить хранилище (timer - необязательный замер этапов запуска)"""
+
+    @abstractmethod
+    async def close(self):
+        """Освободить ресурсы хранилища"""
+
+    # ---------- Услуги ----------
+
+    @abstractmethod
+    async def upsert_service(self, name: str, duration_minutes: int) -> int:
+        """Создать услугу или обновить длительность существующей; вернуть id"""
+
+    @abstractmethod
+    async def upsert_services(self, services: list) -> int:
+        """Создать или обновить услуги [(название, длительность)]; вернуть число изменённых"""
+
+    @abstractmethod
+    async def list_services(self) -> list:
+        """Все услуги (id, name, duration_minutes) в порядке id"""
+
+    # ---------- Записи ----------
+
+    @abstractmethod
+    async def insert_booking(self, user_id: int, username: str, service_id: int,
+                             master: str, booking_date: date, booking_time: time):
+        """
+        Вставить запись, если слот свободен.
+
+        Возвращает словарь booking_id (None при конфликте), duration_minutes
+        (None для неизвестной услуги) и occupancy - битовую карту занятости
+        мастера на дату в момент вставки.
+        """
+
+    @abstractmethod
+    async def user_bookings(self, user_id: int) -> list:
+        """Записи пользователя на сегодня и позже, по дате и времени"""
+
+    @abstractmethod
+    async def user_booking(self, booking_id: int, user_id: int):
+        """Запись пользователя на сегодня и позже (с service_id, без service_name) или None"""
+
+    @abstractmethod
+    async def bookings_by_date(self, booking_date: date) -> list:
+        """Все записи на дату, по времени и мастеру"""
+
+    @abstractmethod
+    async def occupancy(self, master: str, booking_date: date) -> int:
+        """Битовая карта занятости мастера на дату"""
+
+    @abstractmethod
+    async def occupancy_range(self, masters, start_date: date, end_date: date) -> dict:
+        """{(мастер, дата): битовая карта} для дней периода, где у мастера есть записи"""
+
+    @abstractmethod
+    async def remove_booking(self, booking_id: int, user_id: int):
+        """
+        Удалить запись пользователя.
+
+        Возвращает master, booking_date, booking_time, duration_minutes
+        удаленной записи или None, если записи нет.
+        """
+
+    @abstractmethod
+    async def remove_before(self, cutoff_date: date, archive: bool) -> int:
+        """Удалить (при archive - перенести в архив) записи раньше cutoff_date; вернуть их число"""
+
+    @abstractmethod
+    async def prepare_dates(self, start_date: date, end_date: date) -> int:
+        """Подготовить хранилище к записям на даты периода (секции); вернуть число созданных"""
+
+
+_repository = None
+
+
+def get_repository() -> BookingRepository:
+    """Хранилище, выбранное настройкой STORAGE_BACKEND (создается при первом обращении)"""
+    global _repository
+    if _repository is None:
+        if STORAGE_BACKEND == 'postgres':
+            from .postgres_repository import PostgresRepository
+            _repository = PostgresRepository()
+        elif STORAGE_BACKEND == 'memory':
+            from .memory_repository import MemoryRepository
+            _repository = MemoryRepository()
+        else:
+            raise ValueError(f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND!r}")
+        logger.info(f"Storage backend: {STORAGE_BACKEND}")
+    return _repository
+
+
+def set_repository(repository: BookingRepository):
+    """Подменить хранилище (тесты, нагрузочные прогоны)"""
+    global _repository
+    _repository = repository
+
+
+async def init_storage(timer=None):
+    """Подготовить выбранное хранилище"""
+    await get_repository().init(timer)
+
+
+async def close_storage():
+    """Закрыть выбранное хранилище"""
+    if _repository is not None:
+        await _repository.close()
@@ -0,0 +1,85 @@
+"""
+Короткие удержания слотов на время подтверждения записи
+"""
+import time
+from datetime import date
+from config import SLOT_HOLD_TTL_SECONDS
+
+
+class SlotHolds:
+    """
+    Удержания слотов: у пользователя не больше одного удержания,
+    которое хранится битовой картой слотов (в нумерации database.occupancy)
+    и сроком действия.
+
+    Отдельной очистки нет: истекшие удержания отбрасываются при чтении
+    ключа (мастер, дата), а новое удержание пользователя заменяет прежнее.
+
+    Удержания хранятся в памяти процесса. exclusive=False - записи
+    принимают и другие процессы (supervisor.py), которые удержаний этого
+    процесса не видят: слот за клиентом не закреплен, и бот его не обещает.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.exclusive = True
+        self._by_key = {}
+        self._by_user = {}
+
+    def _live_holds(self, key) -> dict:
+        """Действующие удержания ключа (истекшие удаляются)"""
+        holds = self._by_key.get(key)
+        if not holds:
+            return {}
+
+        now = time.monotonic()
+        expired = [user_id for user_id, (_, expires_at) in holds.items() if expires_at <= now]
+        for user_id in expired:
+            del holds[user_id]
+            self._by_user.pop(user_id, None)
+        if not holds:
+            del self._by_key[key]
+        return holds
+
+    def held_mask(self, master: str, booking_date: date, exclude_user: int = None) -> int:
+        """Биты слотов, удерживаемых другими пользователями"""
+        mask = 0
+        for user_id, (bits, _) in self._live_holds((master, booking_date)).items():
+            if user_id != exclude_user:
+                mask |= bits
+        return mask
+
+    def hold(self, user_id: int, master: str, booking_date: date, bits: int) -> bool:
+        """
+        Удержать слоты за пользователем (или продлить удержание).
+
+        Возвращает False, если хотя бы один слот удерживает другой пользователь.
+        """
+        if self.held_mask(master, booking_date, exclude_user=user_id) & bits:
+            return False
+
+        self.release(user_id)
+        key = (master, booking_date)
+        self._by_key.setdefault(key, {})[user_id] = (bits, time.monotonic() + self.ttl)
+        self._by_user[user_id] = key
+        return True
+
+    def release(self, user_id: int):
+        """Снять удержание пользователя"""
+        key = self._by_user.pop(user_id, None)
+        if key is None:
+            return
+        holds = self._by_key.get(key)
+        if holds is not None:
+            holds.pop(user_id, None)
+            if not holds:
+                del self._by_key[key]
+
+    def drop_before(self, cutoff_date: date):
+        """Удалить удержания на даты раньше cutoff_date"""
+        for key in [key for key in self._by_key if key[1] < cutoff_date]:
+            for user_id in self._by_key.pop(key):
+                self._by_user.pop(user_id, None)
+
+
+slot_holds = SlotHolds(SLOT_HOLD_TTL_SECONDS)
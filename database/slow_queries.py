@@ -0,0 +1,123 @@
+"""
+Журнал медленных запросов
+
+SlowQueryLog подключается к каждому соединению пула как обработчик
+запросов asyncpg (add_query_logger). Запросы дольше SLOW_QUERY_THRESHOLD_MS
+пишутся в лог с длительностью, функцией database.models, из которой они
+выполнены, и типами параметров вместо значений. Часть медленных запросов
+на чтение (SLOW_QUERY_EXPLAIN_SAMPLE_RATE) повторяется через
+EXPLAIN (ANALYZE, BUFFERS), и план сохраняется в отдельный файл
+с ротацией (SLOW_QUERY_PLAN_FILE).
+"""
+import asyncio
+import logging
+import random
+import re
+from logging.handlers import RotatingFileHandler
+
+from monitoring import REGISTRY
+from .instrumentation import current_function
+from config import (
+    SLOW_QUERY_THRESHOLD_MS,
+    SLOW_QUERY_EXPLAIN_SAMPLE_RATE,
+    SLOW_QUERY_PLAN_FILE,
+    SLOW_QUERY_PLAN_MAX_BYTES,
+    SLOW_QUERY_PLAN_BACKUP_COUNT
+)
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERIES = REGISTRY.counter(
+    'db_slow_queries_total', 'Queries slower than SLOW_QUERY_THRESHOLD_MS', ('function',)
+)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+# EXPLAIN ANALYZE выполняет запрос, поэтому повторяются только запросы на чтение
+_WRITE_RE = re.compile(r"\b(INSERT|UPDATE|DELETE|ALTER|CREATE|DROP|TRUNCATE)\b", re.IGNORECASE)
+_QUERY_LOG_LIMIT = 500
+
+
+def _normalize(query: str) -> str:
+    """Запрос одной строкой, обрезанный для лога"""
+    query = _WHITESPACE_RE.sub(' ', query).strip()
+    return query if len(query) <= _QUERY_LOG_LIMIT else query[:_QUERY_LOG_LIMIT] + '...'
+
+
+def _redact(args) -> str:
+    """Параметры запроса без значений: $1:int, $2:str, ..."""
+    return ', '.join(f"${i}:{type(arg).__name__}" for i, arg in enumerate(args or (), 1))
+
+
+class SlowQueryLog:
+    """Обработчик запросов asyncpg: лог медленных запросов и выборочные планы"""
+
+    def __init__(self, threshold_ms: float, sample_rate: float, plan_file: str):
+        self._threshold = threshold_ms / 1000
+        self._sample_rate = sample_rate
+        self._plan_file = plan_file
+        self._plans_logger = None
+        self._explaining = False
+        self._pool = None
+
+    def attach(self, conn):
+        """Подключить журнал к соединению (вызывается при создании соединения пула)"""
+        conn.add_query_logger(self.on_query)
+
+    def set_pool(self, pool):
+        """Пул для EXPLAIN (запрос плана не занимает соединение медленного запроса)"""
+        self._pool = pool
+
+    def on_query(self, record):
+        """Обработчик asyncpg: вызывается в контексте задачи, выполнившей запрос"""
+        if record.elapsed < self._threshold or record.query.lstrip()[:7].upper() == 'EXPLAIN':
+            return
+
+        function = current_function()
+        SLOW_QUERIES.inc(function)
+        logger.warning(
+            f"Slow query {record.elapsed * 1000:.0f}ms in {function}: "
+            f"{_normalize(record.query)} [{_redact(record.args)}]"
+            + (f" failed: {record.exception!r}" if record.exception else "")
+        )
+
+        if (self._sample_rate > 0 and self._pool is not None and not self._explaining
+                and record.exception is None and not _WRITE_RE.search(record.query)
+                and random.random() < self._sample_rate):
+            self._explaining = True
+            asyncio.get_running_loop().create_task(self._explain(record, function))
+
+    def _plans(self) -> logging.Logger:
+        """Логгер файла планов с ротацией (создается при первом плане)"""
+        if self._plans_logger is None:
+            handler = RotatingFileHandler(
+                self._plan_file,
+                maxBytes=SLOW_QUERY_PLAN_MAX_BYTES,
+                backupCount=SLOW_QUERY_PLAN_BACKUP_COUNT,
+                encoding='utf-8'
+            )
+            handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+            self._plans_logger = logging.getLogger(f"{__name__}.plans")
+            self._plans_logger.addHandler(handler)
+            self._plans_logger.setLevel(logging.INFO)
+            self._plans_logger.propagate = False
+        return self._plans_logger
+
+    async def _explain(self, record, function: str):
+        """Повторить запрос через EXPLAIN (ANALYZE, BUFFERS) и записать план"""
+        try:
+            async with self._pool.acquire() as conn:
+                rows = await conn.fetch(f"EXPLAIN (ANALYZE, BUFFERS) {record.query}", *record.args)
+            plan = '\n'.join(row[0] for row in rows)
+            self._plans().info(
+                f"{function} {record.elapsed * 1000:.0f}ms [{_redact(record.args)}]\n"
+                f"{_normalize(record.query)}\n{plan}\n"
+            )
+        except Exception as e:
+            logger.error(f"Error capturing query plan: {e}")
+        finally:
+            self._explaining = False
+
+
+slow_query_log = SlowQueryLog(
+    SLOW_QUERY_THRESHOLD_MS, SLOW_QUERY_EXPLAIN_SAMPLE_RATE, SLOW_QUERY_PLAN_FILE
+)
@@ -0,0 +1,73 @@
+"""
+Кэш списков записей пользователей (/my_bookings)
+"""
+import time
+from collections import OrderedDict
+from config import USER_BOOKINGS_CACHE_TTL_SECONDS, USER_BOOKINGS_CACHE_MAX_SIZE
+
+
+class UserBookingsCache:
+    """
+    Кэш результата get_bookings_by_user по user_id (TTL + LRU).
+
+    Создание и удаление записи сбрасывают кэш пользователя. Каждый сброс
+    получает номер из общего счетчика; запрос, начатый до сброса (с меньшим
+    номером), не сохраняет устаревший список. Номера сбросов хранятся не
+    более чем для max_size пользователей: вытесненный номер поднимает
+    общий порог _floor, ниже которого сохранение отклоняется для всех.
+    """
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._clock = 0
+        self._floor = 0
+        self._invalidated = OrderedDict()
+
+    def get(self, user_id: int):
+        """Список записей пользователя из кэша или None"""
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+
+        bookings, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[user_id]
+            return None
+
+        self._entries.move_to_end(user_id)
+        return bookings
+
+    def version(self, user_id: int) -> int:
+        """Текущая версия (запоминается перед запросом к БД)"""
+        return self._clock
+
+    def put(self, user_id: int, bookings: tuple, version: int):
+        """Сохранить список, если записи пользователя не менялись во время запроса"""
+        if version < self._invalidated.get(user_id, self._floor):
+            return
+
+        self._entries[user_id] = (bookings, time.monotonic() + self.ttl)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int):
+        """Сбросить кэш пользователя после изменения его записей"""
+        self._clock += 1
+        self._invalidated.pop(user_id, None)
+        self._invalidated[user_id] = self._clock
+        while len(self._invalidated) > self.max_size:
+            _, self._floor = self._invalidated.popitem(last=False)
+        self._entries.pop(user_id, None)
+
+    def clear(self):
+        """Сбросить кэш всех пользователей (и запросы, начатые до сброса)"""
+        self._clock += 1
+        self._floor = self._clock
+        self._invalidated.clear()
+        self._entries.clear()
+
+
+user_bookings_cache = UserBookingsCache(USER_BOOKINGS_CACHE_TTL_SECONDS, USER_BOOKINGS_CACHE_MAX_SIZE)
@@ -69,7 +69,7 @@ async def show_bookings_for_date(callback: CallbackQuery):
         return
 
     date_str = callback.data.split(":")[1]
-    bookings = get_bookings_by_date(date_str)
+    bookings = await get_bookings_by_date(date_str)
 
     # Форматируем дату для отображения
     date_obj = datetime.fromisoformat(date_str)
@@ -10,23 +10,34 @@ from datetime import datetime
 
 from database import (
     get_all_services,
+    get_service,
     create_booking,
     get_bookings_by_user,
-    delete_booking
+    get_booking,
+    delete_booking,
+    slot_holds,
+    BOOKING_CREATED,
+    BOOKING_CONFLICT
 )
 from keyboards import (
     get_services_keyboard,
     get_masters_keyboard,
+    get_nearest_slots_keyboard,
     get_dates_keyboard,
     get_time_slots_keyboard,
+    get_booking_confirmation_keyboard,
     get_my_bookings_keyboard,
     get_cancel_confirmation_keyboard
 )
 from utils import (
     get_available_masters,
     get_available_dates,
-    get_available_time_slots
+    get_available_time_slots,
+    get_nearest_slots,
+    get_alternative_slots,
+    hold_slot
 )
+from config import NEAREST_SLOTS_LIMIT, ALTERNATIVE_SLOTS_LIMIT, SLOT_HOLD_TTL_SECONDS
 
 router = Router()
 
@@ -37,6 +48,8 @@ class BookingStates(StatesGroup):
     choosing_master = State()
     choosing_date = State()
     choosing_time = State()
+    choosing_nearest = State()
+    confirming = State()
 
 
 # ========== КОМАНДА /start ==========
@@ -45,6 +58,7 @@ class BookingStates(StatesGroup):
 async def cmd_start(message: Message, state: FSMContext):
     """Обработчик команды /start"""
     await state.clear()
+    slot_holds.release(message.from_user.id)
 
     user_name = message.from_user.first_name or "друг"
     await message.answer(
@@ -62,7 +76,7 @@ async def cmd_start(message: Message, state: FSMContext):
 
 async def start_booking(message: Message, state: FSMContext):
     """Начать процесс записи"""
-    services = get_all_services()
+    services = await get_all_services()
 
     if not services:
         await message.answer("К сожалению, услуги временно недоступны. Попробуйте позже.")
@@ -83,15 +97,20 @@ async def process_service_selection(callback: CallbackQuery, state: FSMContext):
     service_id = int(callback.data.split(":")[1])
 
     # Находим название услуги
-    services = get_all_services()
-    service_name = next((s['name'] for s in services if s['id'] == service_id), None)
+    service = await get_service(service_id)
 
-    if not service_name:
+    if not service:
         await callback.answer("Ошибка выбора услуги", show_alert=True)
         return
 
+    service_name = service['name']
+
     # Сохраняем выбор
-    await state.update_data(service_id=service_id, service_name=service_name)
+    await state.update_data(
+        service_id=service_id,
+        service_name=service_name,
+        service_duration=service['duration_minutes']
+    )
 
     # Переходим к выбору мастера
     masters = get_available_masters()
@@ -116,7 +135,8 @@ async def process_master_selection(callback: CallbackQuery, state: FSMContext):
     await state.update_data(master=master)
 
     # Получаем доступные даты для мастера
-    dates = get_available_dates(master)
+    data = await state.get_data()
+    dates = await get_available_dates(master, data['service_duration'])
 
     if not dates:
         await callback.answer("У этого мастера нет доступных дней", show_alert=True)
@@ -124,7 +144,6 @@ async def process_master_selection(callback: CallbackQuery, state: FSMContext):
 
     await state.set_state(BookingStates.choosing_date)
 
-    data = await state.get_data()
     await callback.message.edit_text(
         f"✅ Услуга: {data['service_name']}\n"
         f"✅ Мастер: {master}\n\n"
@@ -134,6 +153,35 @@ async def process_master_selection(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 
+@router.callback_query(F.data == "master_any", BookingStates.choosing_master)
+async def process_any_master_selection(callback: CallbackQuery, state: FSMContext):
+    """Обработка выбора «Любой мастер, ближайшее время»"""
+    data = await state.get_data()
+    slots = await get_nearest_slots(NEAREST_SLOTS_LIMIT, data['service_duration'])
+
+    if not slots:
+        await callback.answer("В ближайшие дни нет свободного времени", show_alert=True)
+        return
+
+    await state.set_state(BookingStates.choosing_nearest)
+
+    await callback.message.edit_text(
+        f"✅ Услуга: {data['service_name']}\n\n"
+        "⚡ Ближайшее свободное время:",
+        reply_markup=get_nearest_slots_keyboard(slots)
+    )
+    await callback.answer()
+
+
+@router.callback_query(F.data.startswith("nearest:"), BookingStates.choosing_nearest)
+async def process_nearest_selection(callback: CallbackQuery, state: FSMContext):
+    """Обработка выбора одного из ближайших слотов"""
+    _, master, date_str, booking_time = callback.data.split(":", 3)
+
+    await state.update_data(master=master, booking_date=date_str)
+    await hold_and_confirm(callback, state, booking_time)
+
+
 # ========== ШАГ 3: ВЫБОР ДАТЫ ==========
 
 @router.callback_query(F.data.startswith("date:"), BookingStates.choosing_date)
@@ -144,14 +192,26 @@ async def process_date_selection(callback: CallbackQuery, state: FSMContext):
     # Сохраняем выбор
     await state.update_data(booking_date=date_str)
 
-    # Получаем свободные слоты
+    if not await show_time_slots(callback, state):
+        await callback.answer("На эту дату нет свободных слотов", show_alert=True)
+        return
+
+    await callback.answer()
+
+
+async def show_time_slots(callback: CallbackQuery, state: FSMContext) -> bool:
+    """Показать свободное время на выбранную дату (False, если его нет)"""
     data = await state.get_data()
     master = data['master']
-    time_slots = get_available_time_slots(master, date_str)
+    date_str = data['booking_date']
+
+    # Получаем свободные слоты
+    time_slots = await get_available_time_slots(
+        master, date_str, data['service_duration'], callback.from_user.id
+    )
 
     if not time_slots:
-        await callback.answer("На эту дату нет свободных слотов", show_alert=True)
-        return
+        return False
 
     await state.set_state(BookingStates.choosing_time)
 
@@ -166,23 +226,89 @@ async def process_date_selection(callback: CallbackQuery, state: FSMContext):
         "🕐 Шаг 4/4: Выберите время:",
         reply_markup=get_time_slots_keyboard(time_slots)
     )
-    await callback.answer()
+    return True
 
 
 # ========== ШАГ 4: ВЫБОР ВРЕМЕНИ И ПОДТВЕРЖДЕНИЕ ==========
 
 @router.callback_query(F.data.startswith("time:"), BookingStates.choosing_time)
 async def process_time_selection(callback: CallbackQuery, state: FSMContext):
-    """Обработка выбора времени и создание записи"""
+    """Обработка выбора времени"""
     booking_time = callback.data.split(":", 1)[1]
+    await hold_and_confirm(callback, state, booking_time)
 
+
+async def hold_and_confirm(callback: CallbackQuery, state: FSMContext, booking_time: str):
+    """Удержать выбранное время и попросить подтвердить запись"""
+    data = await state.get_data()
+
+    held = await hold_slot(
+        callback.from_user.id, data['master'], data['booking_date'],
+        booking_time, data['service_duration']
+    )
+
+    if not held:
+        await callback.answer("Это время только что заняли, выберите другое", show_alert=True)
+        if not await show_time_slots(callback, state):
+            await callback.message.edit_text(
+                "❌ На эту дату больше нет свободного времени.\n\n"
+                "Попробуйте снова: /start"
+            )
+            await state.clear()
+        return
+
+    await state.update_data(booking_time=booking_time)
+    await state.set_state(BookingStates.confirming)
+
+    date_obj = datetime.fromisoformat(data['booking_date'])
+    date_display = date_obj.strftime("%d.%m.%Y")
+
+    text = (
+        "📝 Проверьте запись:\n\n"
+        f"📋 Услуга: {data['service_name']}\n"
+        f"👨‍💼 Мастер: {data['master']}\n"
+        f"📅 Дата: {date_display}\n"
+        f"🕐 Время: {booking_time}"
+    )
+    # Удержание видят не все процессы бота (supervisor.py) - закрепление не обещаем
+    if slot_holds.exclusive:
+        text += f"\n\nВремя закреплено за вами на {SLOT_HOLD_TTL_SECONDS // 60} мин."
+
+    await callback.message.edit_text(text, reply_markup=get_booking_confirmation_keyboard())
+    await callback.answer()
+
+
+@router.callback_query(F.data == "confirm_booking", BookingStates.confirming)
+async def process_booking_confirmation(callback: CallbackQuery, state: FSMContext):
+    """Подтверждение и создание записи"""
+    data = await state.get_data()
+    await complete_booking(callback, state, data['booking_time'])
+
+
+@router.callback_query(F.data == "change_time", BookingStates.confirming)
+async def process_change_time(callback: CallbackQuery, state: FSMContext):
+    """Отказ от выбранного времени и возврат к выбору"""
+    slot_holds.release(callback.from_user.id)
+
+    if not await show_time_slots(callback, state):
+        await callback.message.edit_text(
+            "❌ На эту дату больше нет свободного времени.\n\n"
+            "Попробуйте снова: /start"
+        )
+        await state.clear()
+
+    await callback.answer()
+
+
+async def complete_booking(callback: CallbackQuery, state: FSMContext, booking_time: str):
+    """Создать запись по данным FSM и выбранному времени"""
     # Получаем все данные
     data = await state.get_data()
     user_id = callback.from_user.id
     username = callback.from_user.username or f"user_{user_id}"
 
     # Создаем запись
-    success = create_booking(
+    result = await create_booking(
         user_id=user_id,
         username=username,
         service_id=data['service_id'],
@@ -191,7 +317,28 @@ async def process_time_selection(callback: CallbackQuery, state: FSMContext):
         booking_time=booking_time
     )
 
-    if success:
+    if result['status'] == BOOKING_CONFLICT:
+        # Время заняли: сразу предлагаем замену по занятости из того же запроса
+        alternatives = get_alternative_slots(
+            data['master'], data['booking_date'], result['occupancy'], booking_time,
+            ALTERNATIVE_SLOTS_LIMIT, data['service_duration'], user_id
+        )
+        if alternatives:
+            await state.set_state(BookingStates.choosing_time)
+            await callback.message.edit_text(
+                f"❌ Время {booking_time} уже заняли.\n\n"
+                "🕐 Выберите другое время у этого мастера в этот день:",
+                reply_markup=get_time_slots_keyboard(alternatives)
+            )
+            await callback.answer()
+            return
+
+        await callback.message.edit_text(
+            f"❌ Время {booking_time} уже заняли, "
+            "а других свободных мест на этот день нет.\n\n"
+            "Попробуйте снова: /start"
+        )
+    elif result['status'] == BOOKING_CREATED:
         # Форматируем дату для отображения
         date_obj = datetime.fromisoformat(data['booking_date'])
         date_display = date_obj.strftime("%d.%m.%Y")
@@ -208,8 +355,7 @@ async def process_time_selection(callback: CallbackQuery, state: FSMContext):
         )
     else:
         await callback.message.edit_text(
-            "❌ Ошибка при создании записи.\n"
-            "Возможно, это время уже занято.\n\n"
+            "❌ Ошибка при создании записи.\n\n"
             "Попробуйте снова: /start"
         )
 
@@ -223,9 +369,10 @@ async def process_time_selection(callback: CallbackQuery, state: FSMContext):
 async def cmd_my_bookings(message: Message, state: FSMContext):
     """Показать записи пользователя"""
     await state.clear()
+    slot_holds.release(message.from_user.id)
 
     user_id = message.from_user.id
-    bookings = get_bookings_by_user(user_id)
+    bookings = await get_bookings_by_user(user_id)
 
     if not bookings:
         await message.answer(
@@ -247,9 +394,7 @@ async def view_booking_details(callback: CallbackQuery):
     booking_id = int(callback.data.split(":")[1])
     user_id = callback.from_user.id
 
-    # Получаем записи пользователя
-    bookings = get_bookings_by_user(user_id)
-    booking = next((b for b in bookings if b['id'] == booking_id), None)
+    booking = await get_booking(booking_id, user_id)
 
     if not booking:
         await callback.answer("Запись не найдена", show_alert=True)
@@ -275,7 +420,7 @@ async def view_booking_details(callback: CallbackQuery):
 async def cancel_back_to_list(callback: CallbackQuery):
     """Вернуться к списку записей"""
     user_id = callback.from_user.id
-    bookings = get_bookings_by_user(user_id)
+    bookings = await get_bookings_by_user(user_id)
 
     if not bookings:
         await callback.message.edit_text(
@@ -297,7 +442,7 @@ async def confirm_cancel_booking(callback: CallbackQuery):
     booking_id = int(callback.data.split(":")[1])
     user_id = callback.from_user.id
 
-    success = delete_booking(booking_id, user_id)
+    success = await delete_booking(booking_id, user_id)
 
     if success:
         await callback.message.edit_text(
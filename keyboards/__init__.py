@@ -4,8 +4,10 @@ Keyboards module
 from .inline_keyboards import (
     get_services_keyboard,
     get_masters_keyboard,
+    get_nearest_slots_keyboard,
     get_dates_keyboard,
     get_time_slots_keyboard,
+    get_booking_confirmation_keyboard,
     get_my_bookings_keyboard,
     get_cancel_confirmation_keyboard
 )
@@ -13,8 +15,10 @@ from .inline_keyboards import (
 __all__ = [
     'get_services_keyboard',
     'get_masters_keyboard',
+    'get_nearest_slots_keyboard',
     'get_dates_keyboard',
     'get_time_slots_keyboard',
+    'get_booking_confirmation_keyboard',
     'get_my_bookings_keyboard',
     'get_cancel_confirmation_keyboard'
 ]
@@ -1,24 +1,37 @@
 """
 Inline клавиатуры для бота
 """
+from functools import lru_cache
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
 
-def get_services_keyboard(services: list) -> InlineKeyboardMarkup:
-    """Клавиатура выбора услуги"""
+def get_services_keyboard(services) -> InlineKeyboardMarkup:
+    """Клавиатура выбора услуги (кэшируется по составу услуг)"""
+    return _services_keyboard(tuple(
+        (service['id'], service['name'], service['duration_minutes']) for service in services
+    ))
+
+
+@lru_cache(maxsize=4)
+def _services_keyboard(services: tuple) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
-    for service in services:
+    for service_id, name, duration_minutes in services:
         builder.button(
-            text=service['name'],
-            callback_data=f"service:{service['id']}"
+            text=f"{name} · {duration_minutes} мин",
+            callback_data=f"service:{service_id}"
         )
     builder.adjust(1)
     return builder.as_markup()
 
 
-def get_masters_keyboard(masters: list) -> InlineKeyboardMarkup:
-    """Клавиатура выбора мастера"""
+def get_masters_keyboard(masters) -> InlineKeyboardMarkup:
+    """Клавиатура выбора мастера (кэшируется по списку мастеров)"""
+    return _masters_keyboard(tuple(masters))
+
+
+@lru_cache(maxsize=4)
+def _masters_keyboard(masters: tuple) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     for master in masters:
         builder.button(
@@ -26,11 +39,32 @@ def get_masters_keyboard(masters: list) -> InlineKeyboardMarkup:
             callback_data=f"master:{master}"
         )
     builder.adjust(2)
+    builder.row(InlineKeyboardButton(
+        text="⚡ Любой мастер, ближайшее время",
+        callback_data="master_any"
+    ))
+    return builder.as_markup()
+
+
+def get_nearest_slots_keyboard(slots: list) -> InlineKeyboardMarkup:
+    """Клавиатура ближайших свободных слотов у всех мастеров"""
+    builder = InlineKeyboardBuilder()
+    for slot in slots:
+        builder.button(
+            text=slot['display'],
+            callback_data=f"nearest:{slot['master']}:{slot['date']}:{slot['time']}"
+        )
+    builder.adjust(1)
     return builder.as_markup()
 
 
 def get_dates_keyboard(dates: list) -> InlineKeyboardMarkup:
-    """Клавиатура выбора даты"""
+    """
+    Клавиатура выбора даты.
+
+    Не кэшируется: в подписях число свободных слотов, которое меняется
+    с каждой записью.
+    """
     builder = InlineKeyboardBuilder()
     for date_info in dates:
         builder.button(
@@ -53,6 +87,21 @@ def get_time_slots_keyboard(time_slots: list) -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+def get_booking_confirmation_keyboard() -> InlineKeyboardMarkup:
+    """Клавиатура подтверждения записи"""
+    builder = InlineKeyboardBuilder()
+    builder.button(
+        text="✅ Подтвердить запись",
+        callback_data="confirm_booking"
+    )
+    builder.button(
+        text="↩️ Выбрать другое время",
+        callback_data="change_time"
+    )
+    builder.adjust(1)
+    return builder.as_markup()
+
+
 def get_my_bookings_keyboard(bookings: list) -> InlineKeyboardMarkup:
     """Клавиатура со списком записей пользователя"""
     builder = InlineKeyboardBuilder()
@@ -1,16 +1,51 @@
 """
 Главный файл бота
 """
+import time
+
+# Отсчет времени запуска, включая импорты
+_STARTED = time.perf_counter()
+
 import asyncio
 import logging
+import signal
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
-from config import BOT_TOKEN
-from database import init_db, close_all_connections, delete_old_bookings
+from config import (
+    BOT_TOKEN,
+    BOT_MODE,
+    WEBHOOK_URL,
+    WEBHOOK_PATH,
+    WEBHOOK_HOST,
+    WEBHOOK_PORT,
+    WEBHOOK_SECRET,
+    WEBHOOK_MAX_CONNECTIONS,
+    WEBHOOK_DRAIN_TIMEOUT_SECONDS,
+    DB_POOL_STATS_INTERVAL_MINUTES,
+    FSM_SNAPSHOT_INTERVAL_SECONDS,
+    USER_UPDATES_ORDERED,
+    METRICS_HOST,
+    METRICS_PORT,
+    METRICS_LOG_INTERVAL_MINUTES,
+    RECORD_UPDATES_PATH,
+    RECORD_UPDATES_SALT
+)
+from database import (
+    init_storage,
+    close_storage,
+    delete_old_bookings,
+    create_booking_partitions,
+    get_pool_stats,
+    availability_cache,
+    services_catalogue
+)
 from database.init_data import init_services
 from handlers import client_router, admin_router
+from middlewares import UpdateRecorder, HandlerMetricsMiddleware
+from monitoring import REGISTRY, start_metrics_server
+from utils import StartupTimer, FirstPollMiddleware, fsm_storage, user_queues
+from webhook import WebhookServer
 
 # Настройка логирования
 logging.basicConfig(
@@ -23,46 +58,212 @@ logger = logging.getLogger(__name__)
 async def cleanup_old_bookings():
     """Периодическая очистка старых записей"""
     try:
-        deleted_count = delete_old_bookings()
+        deleted_count = await delete_old_bookings()
         if deleted_count > 0:
             logger.info(f"Cleaned up {deleted_count} old bookings")
     except Exception as e:
         logger.error(f"Error during cleanup: {e}")
 
 
-async def main():
-    """Основная функция запуска бота"""
-    # Инициализация БД
+async def create_partitions_ahead():
+    """Периодическое создание секций bookings на будущие даты"""
+    try:
+        created_count = await create_booking_partitions()
+        if created_count > 0:
+            logger.info(f"Created {created_count} bookings partitions")
+    except Exception as e:
+        logger.error(f"Error creating bookings partitions: {e}")
+
+
+async def log_db_stats():
+    """Периодическая запись статистики пула соединений и кэша"""
+    stats = get_pool_stats()
+    logger.info(
+        f"DB pool: size={stats['size']} idle={stats['idle']} "
+        f"checked_out={stats['checked_out']} checkouts={stats['checkouts']} "
+        f"timeouts={stats['timeouts']} wait_avg={stats['wait_avg_ms']:.1f}ms "
+        f"wait_max={stats['wait_max_ms']:.1f}ms "
+        f"conn_age_max={stats['connection_age_max_s']:.0f}s"
+    )
+
+    cache_stats = availability_cache.stats()
+    logger.info(
+        f"Availability cache: hits={cache_stats['hits']} misses={cache_stats['misses']} "
+        f"hit_rate={cache_stats['hit_rate']:.1%} size={cache_stats['size']}"
+    )
+
+    fsm_stats = fsm_storage.stats()
+    logger.info(
+        f"FSM sessions: active={fsm_stats['sessions']}/{fsm_stats['max_sessions']} "
+        f"expired={fsm_stats['expired']} evicted={fsm_stats['evicted']} "
+        f"bytes_per_session={fsm_stats['bytes_per_session']:.0f}"
+    )
+
+    if USER_UPDATES_ORDERED:
+        queue_stats = user_queues.stats()
+        logger.info(
+            f"User queues: active={queue_stats['queues']} waiting={queue_stats['waiting']} "
+            f"max_depth={queue_stats['max_depth']}"
+        )
+
+
+async def save_fsm_snapshot() -> int:
+    """Снимок сессий FSM (периодически и при остановке); вернуть число сессий"""
+    try:
+        return await fsm_storage.save_snapshot()
+    except Exception as e:
+        logger.error(f"Error saving FSM sessions snapshot: {e}")
+        return 0
+
+
+async def log_metrics():
+    """Периодическая сводка метрик обработчиков и функций БД"""
+    for line in REGISTRY.summary():
+        logger.info(f"Metrics: {line}")
+
+
+async def prepare_storage(timer: StartupTimer):
+    """Хранилище, услуги, каталог и сессии FSM из снимка"""
     logger.info("Initializing database...")
-    init_db()
-    init_services()
+    await init_storage(timer)
+    await init_services()
+    await services_catalogue.reload()
+    # Незавершенные сценарии записи, сохраненные перед прошлой остановкой
+    await fsm_storage.restore_snapshot()
+    timer.mark('seeding')
     logger.info("Database initialized successfully")
 
-    # Создание бота и диспетчера
-    bot = Bot(token=BOT_TOKEN)
-    storage = MemoryStorage()
-    dp = Dispatcher(storage=storage)
+
+def create_dispatcher(record_path: str = RECORD_UPDATES_PATH):
+    """
+    Dispatcher с хранилищем FSM, middleware и роутерами бота.
+
+    Возвращает (dp, recorder): recorder - UpdateRecorder, пишущий обновления
+    в record_path, или None, если путь пуст.
+    """
+    # Обновления обрабатываются параллельно, а обновления одного пользователя - по очереди
+    dp = Dispatcher(
+        storage=fsm_storage,
+        events_isolation=user_queues if USER_UPDATES_ORDERED else None
+    )
+
+    # Запись обновлений для воспроизведения (benchmarks/replay.py)
+    recorder = None
+    if record_path:
+        recorder = UpdateRecorder(record_path, RECORD_UPDATES_SALT)
+        dp.update.outer_middleware(recorder)
+
+    # Время обработчиков (действует на все роутеры)
+    metrics_middleware = HandlerMetricsMiddleware()
+    dp.message.middleware(metrics_middleware)
+    dp.callback_query.middleware(metrics_middleware)
 
     # Регистрация роутеров
     dp.include_router(client_router)
     dp.include_router(admin_router)
+    return dp, recorder
 
-    # Настройка планировщика для очистки старых записей
+
+def create_scheduler(maintenance: bool = True) -> AsyncIOScheduler:
+    """
+    Планировщик периодических задач (не запущен).
+
+    maintenance=False - без очистки записей и создания секций: при
+    нескольких процессах (supervisor.py) их выполняет только один.
+    """
     scheduler = AsyncIOScheduler()
-    # Запускать очистку каждый день в 03:00
-    scheduler.add_job(cleanup_old_bookings, 'cron', hour=3, minute=0)
+    if maintenance:
+        # Запускать очистку каждый день в 03:00
+        scheduler.add_job(cleanup_old_bookings, 'cron', hour=3, minute=0)
+        # Секции на будущие даты создаются заранее, каждый день в 02:00
+        scheduler.add_job(create_partitions_ahead, 'cron', hour=2, minute=0)
+    scheduler.add_job(log_db_stats, 'interval', minutes=DB_POOL_STATS_INTERVAL_MINUTES)
+    scheduler.add_job(log_metrics, 'interval', minutes=METRICS_LOG_INTERVAL_MINUTES)
+    if fsm_storage.snapshot is not None:
+        scheduler.add_job(save_fsm_snapshot, 'interval', seconds=FSM_SNAPSHOT_INTERVAL_SECONDS)
+    return scheduler
+
+
+async def close_bot(bot: Bot, scheduler: AsyncIOScheduler, recorder=None, metrics_runner=None):
+    """Остановка: сессия бота, планировщик, снимок FSM, хранилище, запись и метрики"""
+    await bot.session.close()
+    scheduler.shutdown()
+    # Снимок сессий FSM пишется до закрытия пула соединений
+    if fsm_storage.snapshot is not None:
+        count = await save_fsm_snapshot()
+        logger.info(f"Saved {count} FSM sessions to snapshot")
+    await close_storage()
+    if recorder is not None:
+        recorder.close()
+    if metrics_runner is not None:
+        await metrics_runner.cleanup()
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot, timer: StartupTimer):
+    """Прием обновлений через вебхук до SIGINT/SIGTERM, затем обработка принятых"""
+    server = WebhookServer(dp, bot, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_DRAIN_TIMEOUT_SECONDS)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    try:
+        await server.start(
+            WEBHOOK_HOST,
+            WEBHOOK_PORT,
+            WEBHOOK_URL,
+            allowed_updates=dp.resolve_used_update_types(),
+            max_connections=WEBHOOK_MAX_CONNECTIONS
+        )
+        timer.mark('webhook')
+        logger.info(f"Startup: {timer.summary()}")
+        await stop.wait()
+    finally:
+        await server.stop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.remove_signal_handler(sig)
+
+
+async def main():
+    """Основная функция запуска бота"""
+    if BOT_MODE not in ('polling', 'webhook'):
+        raise ValueError(f"Unknown BOT_MODE: {BOT_MODE!r} (expected 'polling' or 'webhook')")
+    if BOT_MODE == 'webhook' and not WEBHOOK_URL and not WEBHOOK_SECRET:
+        # Вебхук зарегистрирован вне бота: случайный секрет с ним не совпадет
+        raise ValueError("BOT_MODE=webhook without WEBHOOK_URL requires WEBHOOK_SECRET")
+
+    timer = StartupTimer(_STARTED)
+    timer.mark('imports')
+
+    # Инициализация БД
+    await prepare_storage(timer)
+
+    # Создание бота и диспетчера
+    bot = Bot(token=BOT_TOKEN)
+    # Разбивка времени запуска пишется в лог при первом getUpdates
+    bot.session.middleware(FirstPollMiddleware(timer))
+    dp, recorder = create_dispatcher()
+
+    # Настройка планировщика для очистки старых записей
+    scheduler = create_scheduler()
     scheduler.start()
     logger.info("Scheduler started for cleanup task")
 
+    metrics_runner = None
+    if METRICS_PORT:
+        metrics_runner = await start_metrics_server(METRICS_HOST, METRICS_PORT)
+
     try:
-        logger.info("Bot started")
-        # Запуск бота
-        await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+        logger.info(f"Bot started ({BOT_MODE})")
+        if BOT_MODE == 'webhook':
+            await run_webhook(dp, bot, timer)
+        else:
+            # Вебхук, оставшийся после режима webhook, не дает получать getUpdates
+            await bot.delete_webhook()
+            await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
     finally:
         # Закрытие соединений при завершении
-        await bot.session.close()
-        close_all_connections()
-        scheduler.shutdown()
+        await close_bot(bot, scheduler, recorder, metrics_runner)
         logger.info("Bot stopped")
 
 
@@ -0,0 +1,7 @@
+"""
+Middlewares module
+"""
+from .recorder import UpdateRecorder, pseudonymize
+from .metrics import HandlerMetricsMiddleware
+
+__all__ = ['UpdateRecorder', 'pseudonymize', 'HandlerMetricsMiddleware']
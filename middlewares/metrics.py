@@ -0,0 +1,43 @@
+"""
+Метрики обработчиков: время и ошибки по имени функции-обработчика
+"""
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from monitoring import REGISTRY
+
+HANDLER_DURATION = REGISTRY.histogram(
+    'bot_handler_duration_seconds', 'Duration of bot handlers', ('handler',)
+)
+HANDLER_ERRORS = REGISTRY.counter(
+    'bot_handler_errors_total', 'Exceptions raised by bot handlers', ('handler',)
+)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """
+    Внутренний middleware: регистрируется на наблюдателях Dispatcher
+    (dp.message, dp.callback_query) и действует на обработчики всех
+    вложенных роутеров.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        handler_object = data.get('handler')
+        name = handler_object.callback.__name__ if handler_object is not None else 'unknown'
+
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.inc(name)
+            raise
+        finally:
+            HANDLER_DURATION.observe(time.perf_counter() - started, name)
@@ -0,0 +1,134 @@
+"""
+Запись входящих обновлений для воспроизведения (benchmarks/replay.py)
+
+UpdateRecorder - внешний middleware Dispatcher: каждое обновление
+дописывается строкой JSON в файл вида
+    {"t": 1760000000.123, "u": {...обновление в формате Bot API...}}
+Сохраняются только поля, нужные для воспроизведения (_SCHEMA):
+сообщения и нажатия кнопок, id и тип чатов, id отправителей, команды
+и callback_data. Все прочее (подписи, контакты, геопозиции, опросы,
+имена и username) отбрасывается. Идентификаторы пользователей и чатов
+заменяются псевдонимами (HMAC от id с ключом), обязательное first_name -
+заглушкой. Id администраторов сохраняются, чтобы их запросы
+воспроизводились с правами администратора.
+"""
+import hashlib
+import hmac
+import json
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from config import ADMIN_IDS
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Обязательное поле пользователя в Bot API заменяется заглушкой
+_FIRST_NAME_PLACEHOLDER = 'User'
+
+# Сохраняемые поля объектов Bot API: поле -> вид вложенного объекта
+# (None - значение как есть, 'peer_id' - псевдоним, 'command' - только
+# текст команды, 'first_name' - заглушка). Поля вне схемы не пишутся.
+_SCHEMA = {
+    'update': {
+        'update_id': None,
+        'message': 'message',
+        'edited_message': 'message',
+        'callback_query': 'callback_query',
+    },
+    'message': {
+        'message_id': None,
+        'message_thread_id': None,
+        'date': None,
+        'edit_date': None,
+        'chat': 'chat',
+        'from': 'user',
+        'text': 'command',
+    },
+    'callback_query': {
+        'id': None,
+        'from': 'user',
+        'message': 'message',
+        'inline_message_id': None,
+        'chat_instance': None,
+        'data': None,
+    },
+    'user': {
+        'id': 'peer_id',
+        'is_bot': None,
+        'first_name': 'first_name',
+    },
+    'chat': {
+        'id': 'peer_id',
+        'type': None,
+    },
+}
+
+
+def pseudonymize(user_id: int, key: bytes) -> int:
+    """Псевдоним id: одинаковый для одного id и ключа, не восстанавливается без ключа"""
+    if user_id in ADMIN_IDS:
+        return user_id
+    digest = hmac.new(key, str(user_id).encode(), hashlib.sha256).digest()
+    # 48 бит: помещается в id Telegram и в BIGINT
+    return int.from_bytes(digest[:6], 'big') or 1
+
+
+def _sanitize(value: dict, key: bytes, kind: str = 'update') -> dict:
+    """Копия объекта kind только с полями _SCHEMA, без персональных данных"""
+    sanitized = {}
+    for name, field in _SCHEMA[kind].items():
+        if name not in value:
+            continue
+        item = value[name]
+        if field is None:
+            sanitized[name] = item
+        elif field == 'peer_id':
+            sanitized[name] = pseudonymize(item, key)
+        elif field == 'first_name':
+            sanitized[name] = _FIRST_NAME_PLACEHOLDER
+        elif field == 'command':
+            sanitized[name] = item if item.startswith('/') else ''
+        elif isinstance(item, dict):
+            sanitized[name] = _sanitize(item, key, field)
+    return sanitized
+
+
+class UpdateRecorder(BaseMiddleware):
+    """Дописывает обезличенные обновления в файл (по строке JSON на обновление)"""
+
+    def __init__(self, path: str, salt: str = ''):
+        # Без соли ключ случайный: псевдонимы не связываются между запусками
+        self._key = salt.encode() if salt else os.urandom(32)
+        self._file = open(path, 'a', encoding='utf-8', buffering=1)
+        self.recorded = 0
+        logger.info(f"Recording updates to {path}")
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        if isinstance(event, Update):
+            try:
+                self.write(event)
+            except Exception as e:
+                logger.error(f"Error recording update {event.update_id}: {e}")
+        return await handler(event, data)
+
+    def write(self, update: Update):
+        """Дописать обновление в файл"""
+        payload = update.model_dump(mode='json', by_alias=True, exclude_none=True)
+        record = {'t': round(time.time(), 3), 'u': _sanitize(payload, self._key)}
+        self._file.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+        self.recorded += 1
+
+    def close(self):
+        """Закрыть файл записи"""
+        self._file.close()
+        logger.info(f"Recorded {self.recorded} updates")
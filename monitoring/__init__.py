@@ -0,0 +1,13 @@
+"""
+Monitoring module
+"""
+from .metrics import Counter, Histogram, MetricsRegistry, REGISTRY
+from .server import start_metrics_server
+
+__all__ = [
+    'Counter',
+    'Histogram',
+    'MetricsRegistry',
+    'REGISTRY',
+    'start_metrics_server'
+]
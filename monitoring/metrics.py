@@ -0,0 +1,167 @@
+"""
+Счетчики и гистограммы в памяти процесса с выводом в текстовом формате Prometheus
+
+Запись значения - несколько операций со словарем и списком без блокировок
+(бот работает в одном потоке цикла событий), поэтому метрики можно держать
+включенными постоянно. Значения, которые уже считаются в других местах
+(статистика пула, кэша), добавляются сборщиками при выводе.
+"""
+from bisect import bisect_left
+
+# Границы корзин гистограмм по умолчанию (секунды)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(label_names, label_values, extra: str = '') -> str:
+    """Метки в формате {name="value",...}"""
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(label_names, label_values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class Counter:
+    """Монотонный счетчик с метками"""
+
+    type_name = 'counter'
+
+    def __init__(self, name: str, documentation: str, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values = {}
+
+    def inc(self, *label_values, amount: float = 1):
+        """Увеличить счетчик для значений меток label_values"""
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values) -> float:
+        return self._values.get(label_values, 0)
+
+    def series(self) -> dict:
+        """{значения меток: значение}"""
+        return dict(self._values)
+
+    def samples(self) -> list:
+        """Строки вывода Prometheus"""
+        return [f"{self.name}{_format_labels(self.label_names, labels)} {value}"
+                for labels, value in sorted(self._values.items())]
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами и метками"""
+
+    type_name = 'histogram'
+
+    def __init__(self, name: str, documentation: str, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        # метки -> [количество по корзинам (последняя - +Inf), сумма, количество]
+        self._series = {}
+
+    def observe(self, value: float, *label_values):
+        """Учесть значение для значений меток label_values"""
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def series(self) -> dict:
+        """{значения меток: (количество, сумма)}"""
+        return {labels: (series[2], series[1]) for labels, series in self._series.items()}
+
+    def quantile(self, fraction: float, *label_values) -> float:
+        """Оценка квантиля по верхней границе корзины (inf, если выше последней)"""
+        series = self._series.get(label_values)
+        if series is None or series[2] == 0:
+            return 0.0
+        rank = fraction * series[2]
+        cumulative = 0
+        for upper, count in zip(self.buckets + (float('inf'),), series[0]):
+            cumulative += count
+            if cumulative >= rank:
+                return upper
+        return float('inf')
+
+    def samples(self) -> list:
+        lines = []
+        for labels, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for upper, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = f'le="{upper}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, labels, le)} {cumulative}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.label_names, labels, le)} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Набор метрик процесса и сборщиков значений, вычисляемых при выводе"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+
+    def counter(self, name: str, documentation: str, label_names=()) -> Counter:
+        return self._register(Counter(name, documentation, label_names))
+
+    def histogram(self, name: str, documentation: str, label_names=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, label_names, buckets))
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def add_collector(self, collector):
+        """
+        Добавить сборщик: функцию без аргументов, возвращающую список
+        (имя, тип 'gauge'/'counter', описание, значение).
+        """
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Все метрики в текстовом формате Prometheus"""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            lines.extend(metric.samples())
+
+        for collector in self._collectors:
+            for name, type_name, documentation, value in collector():
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {type_name}")
+                lines.append(f"{name} {value}")
+        return '\n'.join(lines) + '\n'
+
+    def summary(self) -> list:
+        """Строки для лога: значения счетчиков, количество, среднее и p95 гистограмм"""
+        lines = []
+        for metric in self._metrics.values():
+            for labels, value in sorted(metric.series().items()):
+                series = f"{metric.name}[{','.join(map(str, labels))}]" if labels else metric.name
+                if isinstance(metric, Counter):
+                    lines.append(f"{series}: {value}")
+                    continue
+                count, total = value
+                lines.append(
+                    f"{series}: count={count} avg={total / count * 1000:.1f}ms "
+                    f"p95<={metric.quantile(0.95, *labels) * 1000:.0f}ms"
+                )
+        return lines
+
+
+REGISTRY = MetricsRegistry()
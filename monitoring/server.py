@@ -0,0 +1,27 @@
+"""
+Локальный HTTP-эндпоинт /metrics в текстовом формате Prometheus
+"""
+from aiohttp import web
+
+from .metrics import REGISTRY
+import logging
+
+logger = logging.getLogger(__name__)
+
+_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+async def _metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(body=REGISTRY.render().encode(), headers={'Content-Type': _CONTENT_TYPE})
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    """Запустить эндпоинт http://host:port/metrics; остановка - await runner.cleanup()"""
+    app = web.Application()
+    app.router.add_get('/metrics', _metrics_handler)
+
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Metrics endpoint: http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,516 @@
+"""
+Запуск бота в нескольких процессах
+
+Супервизор запускает WORKERS процессов-воркеров и сам принимает
+обновления (длинным опросом или вебхуком, по BOT_MODE). Каждое
+обновление пересылается по Unix-сокету воркеру, которому принадлежит
+пользователь: шард = user_id % WORKERS. Воркер обрабатывает обновления
+так же, как main.py: собственные пул соединений, хранилище FSM, очереди
+пользователей и кэши.
+
+Состояние в памяти процесса не согласуется между воркерами:
+- сессии FSM, очереди пользователей и кэш записей пользователя
+  относятся к одному пользователю и поэтому целиком живут в его шарде;
+- кэш занятости слотов живет WORKER_AVAILABILITY_CACHE_TTL_SECONDS:
+  брони других воркеров видны не позже чем через этот срок;
+- удержания слотов действуют только внутри воркера: клиент другого шарда
+  может выбрать удерживаемое время, поэтому при WORKERS > 1 бот не обещает
+  закрепить время. От двойной записи защищает ограничение в PostgreSQL,
+  и клиенту при конфликте сразу предлагаются другие варианты.
+
+Воркер подтверждает каждое обработанное обновление строкой с его
+update_id. Неподтвержденные обновления шарда хранятся в супервизоре
+и отправляются повторно перезапущенному воркеру, поэтому доставка -
+не менее одного раза: обновление, которое обрабатывалось в момент
+падения, может быть обработано дважды.
+
+Хранилище memory у каждого процесса свое, поэтому для WORKERS > 1 нужен
+STORAGE_BACKEND=postgres.
+
+Очистку записей и создание секций выполняет только воркер 0. При
+остановке (SIGINT/SIGTERM) супервизор прекращает прием, закрывает каналы,
+и каждый воркер дорабатывает принятые обновления, сохраняет снимок FSM
+и закрывает свой пул.
+
+Запуск: WORKERS=4 python supervisor.py (по умолчанию WORKERS=1)
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import tempfile
+
+from aiogram import Bot
+from aiogram.dispatcher.middlewares.user_context import UserContextMiddleware
+from aiogram.types import Update
+
+from config import (
+    BOT_TOKEN,
+    BOT_MODE,
+    STORAGE_BACKEND,
+    WORKERS,
+    SUPERVISOR_IPC_DIR,
+    WORKER_AVAILABILITY_CACHE_TTL_SECONDS,
+    WORKER_STOP_TIMEOUT_SECONDS,
+    WEBHOOK_URL,
+    WEBHOOK_PATH,
+    WEBHOOK_HOST,
+    WEBHOOK_PORT,
+    WEBHOOK_SECRET,
+    WEBHOOK_MAX_CONNECTIONS,
+    WEBHOOK_DRAIN_TIMEOUT_SECONDS,
+    METRICS_HOST,
+    METRICS_PORT,
+    RECORD_UPDATES_PATH
+)
+
+logger = logging.getLogger(__name__)
+
+# Ожидание готовности воркера (пул, миграции, услуги) при запуске
+_WORKER_START_TIMEOUT = 120
+# Наибольшее обновление, принимаемое воркером из канала (байт)
+_LINE_LIMIT = 2 ** 20
+_POLLING_TIMEOUT = 10
+_POLLING_BACKOFF_MAX = 30
+_RESTART_BACKOFF_MAX = 30
+
+
+def shard_for(user_id, shards: int) -> int:
+    """
+    Шард пользователя. Тот же остаток вычисляет таблица снимков FSM
+    (database/fsm_sessions.py), поэтому формулу нельзя менять отдельно.
+    """
+    return user_id % shards if user_id is not None else 0
+
+
+# ========== ВОРКЕР ==========
+
+class ShardReceiver:
+    """
+    Прием обновлений из канала супервизора и их обработка в отдельных задачах.
+
+    После обработки воркер отвечает в тот же канал строкой с update_id
+    (подтверждение): неподтвержденные обновления супервизор отправляет
+    повторно новому воркеру.
+
+    closed устанавливается, когда чтение из канала закончено (EOF от
+    супервизора или stop()): после этого новых задач не появляется, и
+    drain() дожидается всех принятых обновлений. Канал остается открытым
+    для подтверждений до close().
+    """
+
+    def __init__(self, dp, bot):
+        self._dp = dp
+        self._bot = bot
+        self._tasks = set()
+        self._readers = set()
+        self._writers = set()
+        self._stopping = False
+        self.closed = asyncio.Event()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Обработчик соединения: одна строка JSON - одно обновление, EOF - остановка"""
+        if self._stopping:
+            writer.close()
+            return
+        reading = asyncio.current_task()
+        self._readers.add(reading)
+        self._writers.add(writer)
+        try:
+            while line := await reader.readline():
+                try:
+                    update = Update.model_validate_json(line, context={'bot': self._bot})
+                except ValueError as e:
+                    logger.warning(f"Malformed update from supervisor: {e}")
+                    continue
+                # Задачи создаются в порядке прихода: очереди пользователей сохраняют его
+                task = asyncio.create_task(self._process(update, writer))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        except asyncio.CancelledError:
+            # stop(): чтение прекращено, непрочитанные обновления супервизор отправит повторно
+            if not self._stopping:
+                raise
+        finally:
+            self._readers.discard(reading)
+            self.closed.set()
+
+    def stop(self):
+        """Прекратить чтение (SIGTERM); принятые обновления обрабатываются и подтверждаются"""
+        self._stopping = True
+        for reading in self._readers:
+            reading.cancel()
+        if not self._readers:
+            self.closed.set()
+
+    async def _process(self, update: Update, writer: asyncio.StreamWriter):
+        try:
+            await self._dp.feed_update(self._bot, update)
+        except Exception:
+            logger.exception(f"Error processing update {update.update_id}")
+        # Подтверждается и обновление с ошибкой (повтор ее не исправит),
+        # но не отмененное в drain(): его обработка не закончена
+        if not writer.is_closing():
+            writer.write(f"{update.update_id}\n".encode())
+
+    def close(self):
+        """Закрыть каналы (после drain)"""
+        for writer in self._writers:
+            writer.close()
+
+    async def drain(self, timeout: float):
+        """Дождаться обработки принятых обновлений (не дольше timeout)"""
+        if not self._tasks:
+            return
+        logger.info(f"Draining {len(self._tasks)} updates")
+        _, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            logger.warning(f"{len(pending)} updates not finished in {timeout}s, cancelled")
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+async def worker_main(shard: int, shards: int, socket_path: str):
+    # Импорты бота - только в процессе воркера
+    from database import availability_cache, slot_holds
+    from main import prepare_storage, create_dispatcher, create_scheduler, close_bot
+    from monitoring import start_metrics_server
+    from utils import StartupTimer, fsm_storage, snapshot_from_config
+
+    timer = StartupTimer()
+    availability_cache.ttl = WORKER_AVAILABILITY_CACHE_TTL_SECONDS
+    slot_holds.exclusive = shards == 1
+    fsm_storage.snapshot = snapshot_from_config(shard, shards)
+    await prepare_storage(timer)
+
+    bot = Bot(token=BOT_TOKEN)
+    dp, recorder = create_dispatcher(f"{RECORD_UPDATES_PATH}.{shard}" if RECORD_UPDATES_PATH else "")
+    # Очистку записей и создание секций выполняет только воркер 0
+    scheduler = create_scheduler(maintenance=shard == 0)
+    scheduler.start()
+
+    metrics_runner = None
+    if METRICS_PORT:
+        metrics_runner = await start_metrics_server(METRICS_HOST, METRICS_PORT + 1 + shard)
+
+    receiver = ShardReceiver(dp, bot)
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(signal.SIGTERM, receiver.stop)
+    server = await asyncio.start_unix_server(receiver.handle, path=socket_path, limit=_LINE_LIMIT)
+    timer.mark('listen')
+    logger.info(f"Worker {shard}/{shards} ready: {timer.summary()}")
+
+    try:
+        await receiver.closed.wait()
+    finally:
+        server.close()
+        # Чтение закончено: drain ждет все принятые обновления, пул закрывается после них
+        await receiver.drain(WEBHOOK_DRAIN_TIMEOUT_SECONDS)
+        receiver.close()
+        await close_bot(bot, scheduler, recorder, metrics_runner)
+        logger.info(f"Worker {shard} stopped")
+
+
+def run_worker(shard: int, shards: int, socket_path: str):
+    """Точка входа процесса-воркера"""
+    # Ctrl+C получает вся группа процессов: воркер останавливает супервизор, закрывая канал
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f'%(asctime)s - worker-{shard} - %(name)s - %(levelname)s - %(message)s'
+    )
+    asyncio.run(worker_main(shard, shards, socket_path))
+
+
+# ========== СУПЕРВИЗОР ==========
+
+class Shard:
+    """Процесс-воркер и канал к нему"""
+
+    def __init__(self, index: int, socket_path: str):
+        self.index = index
+        self.socket_path = socket_path
+        self.process = None
+        self.writer = None
+        self.ready = asyncio.Event()
+        # Задача перезапуска завершившегося воркера (None - перезапуск не идет)
+        self.restart = None
+        # Задача чтения подтверждений из канала
+        self.acks = None
+        # Отправленные и еще не подтвержденные обновления: update_id -> строка канала
+        self.pending = {}
+
+
+class Supervisor:
+    """
+    Процессы-воркеры и пересылка им обновлений.
+
+    feed_update(bot, update) повторяет интерфейс Dispatcher, поэтому
+    супервизор подключается к WebhookServer вместо диспетчера.
+    """
+
+    def __init__(self, shards: int, ipc_dir: str):
+        self.shards = [Shard(i, os.path.join(ipc_dir, f"worker-{i}.sock")) for i in range(shards)]
+        self._context = multiprocessing.get_context('spawn')
+        self._stopping = False
+
+    async def start(self):
+        """Запустить воркеры: сначала воркер 0 (миграции и секции), затем остальные"""
+        await self._start_worker(self.shards[0])
+        await asyncio.gather(*(self._start_worker(shard) for shard in self.shards[1:]))
+        logger.info(f"Started {len(self.shards)} workers")
+
+    async def _start_worker(self, shard: Shard):
+        if shard.acks is not None:
+            shard.acks.cancel()
+            shard.acks = None
+        if shard.writer is not None:
+            shard.writer.close()
+            shard.writer = None
+        if shard.process is not None and shard.process.is_alive():
+            # Прежний процесс без канала (или зависший при запуске) не должен пережить замену
+            shard.process.terminate()
+            await asyncio.to_thread(shard.process.join, WORKER_STOP_TIMEOUT_SECONDS)
+            if shard.process.is_alive():
+                shard.process.kill()
+                await asyncio.to_thread(shard.process.join)
+        if os.path.exists(shard.socket_path):
+            os.unlink(shard.socket_path)
+        shard.process = self._context.Process(
+            target=run_worker,
+            args=(shard.index, len(self.shards), shard.socket_path),
+            name=f"bot-worker-{shard.index}"
+        )
+        shard.process.start()
+
+        # Воркер открывает сокет, когда готов принимать обновления
+        deadline = asyncio.get_running_loop().time() + _WORKER_START_TIMEOUT
+        while True:
+            if not shard.process.is_alive():
+                raise RuntimeError(f"Worker {shard.index} exited with code {shard.process.exitcode}")
+            try:
+                reader, writer = await asyncio.open_unix_connection(shard.socket_path)
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                if asyncio.get_running_loop().time() > deadline:
+                    raise RuntimeError(f"Worker {shard.index} did not start in {_WORKER_START_TIMEOUT}s")
+                await asyncio.sleep(0.1)
+
+        shard.writer = writer
+        shard.acks = asyncio.create_task(self._read_acks(shard, reader, writer))
+        if shard.pending:
+            # Обновления, не подтвержденные прежним воркером, - первыми, в порядке отправки
+            logger.warning(f"Resending {len(shard.pending)} unacknowledged updates to worker {shard.index}")
+            for line in list(shard.pending.values()):
+                writer.write(line)
+            try:
+                await writer.drain()
+            except ConnectionError as e:
+                raise RuntimeError(f"Worker {shard.index} channel closed during resend ({e})")
+        shard.ready.set()
+
+    async def _read_acks(self, shard: Shard, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Снимать подтвержденные обновления из pending; закрытие канала - сбой воркера"""
+        try:
+            while line := await reader.readline():
+                shard.pending.pop(int(line), None)
+        except ConnectionError:
+            pass
+        self._channel_lost(shard, writer, "closed by worker")
+
+    def _channel_lost(self, shard: Shard, writer: asyncio.StreamWriter, reason: str):
+        """
+        Канал воркера потерян: обновления шарда ждут перезапуска. Процесс,
+        оставшийся без канала, завершается, чтобы watch() его перезапустил.
+        """
+        # Канал уже мог смениться: новый воркер не должен сбрасываться старой ошибкой
+        if self._stopping or shard.writer is not writer:
+            return
+        shard.ready.clear()
+        if shard.process.is_alive():
+            logger.error(f"Worker {shard.index} channel {reason}, terminating the worker")
+            shard.process.terminate()
+
+    async def feed_update(self, bot: Bot, update: Update):
+        """
+        Переслать обновление воркеру шарда его пользователя.
+
+        Доставка - не менее одного раза: обновление хранится в pending
+        шарда до подтверждения воркером (после обработки) и после
+        перезапуска воркера отправляется повторно. Обновление, которое
+        воркер обрабатывал в момент сбоя, может быть обработано дважды.
+        Воркер, не готовый за _WORKER_START_TIMEOUT, - TimeoutError:
+        обновление не принято.
+        """
+        user = UserContextMiddleware.resolve_event_context(update).user
+        shard = self.shards[shard_for(user.id if user else None, len(self.shards))]
+        line = update.model_dump_json(exclude_unset=True).encode() + b'\n'
+
+        # Пока воркер перезапускается, обновления его шарда ждут
+        await asyncio.wait_for(shard.ready.wait(), _WORKER_START_TIMEOUT)
+        shard.pending[update.update_id] = line
+        writer = shard.writer
+        try:
+            writer.write(line)
+            await writer.drain()
+        except ConnectionError as e:
+            # Обновление остается в pending и уйдет новому воркеру
+            self._channel_lost(shard, writer, f"failed ({e})")
+
+    async def watch(self):
+        """Перезапускать завершившиеся воркеры (до остановки супервизора)"""
+        while not self._stopping:
+            for shard in self.shards:
+                if shard.restart is None and not shard.process.is_alive():
+                    shard.restart = asyncio.create_task(self._restart(shard))
+            await asyncio.sleep(1)
+
+    async def _restart(self, shard: Shard):
+        """Перезапустить воркер; неудачный запуск повторяется с растущей паузой"""
+        shard.ready.clear()
+        logger.error(f"Worker {shard.index} exited with code {shard.process.exitcode}, restarting")
+        backoff = 1
+        try:
+            while not self._stopping:
+                try:
+                    await self._start_worker(shard)
+                    logger.info(f"Worker {shard.index} restarted")
+                    return
+                except RuntimeError as e:
+                    logger.error(f"{e}, retrying in {backoff}s")
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, _RESTART_BACKOFF_MAX)
+        finally:
+            shard.restart = None
+
+    async def stop(self):
+        """Закрыть каналы и дождаться, пока воркеры доработают и закроют пулы"""
+        self._stopping = True
+        tasks = [task for shard in self.shards for task in (shard.restart, shard.acks) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for shard in self.shards:
+            if shard.writer is not None:
+                shard.writer.close()
+            elif shard.process is not None and shard.process.is_alive():
+                # Воркер запускался при остановке и канала к нему нет: SIGTERM
+                shard.process.terminate()
+        for shard in self.shards:
+            if shard.process is None:
+                continue
+            await asyncio.to_thread(shard.process.join, WORKER_STOP_TIMEOUT_SECONDS)
+            if shard.process.is_alive():
+                logger.warning(f"Worker {shard.index} did not stop in "
+                               f"{WORKER_STOP_TIMEOUT_SECONDS}s, terminating")
+                shard.process.terminate()
+                await asyncio.to_thread(shard.process.join)
+            if os.path.exists(shard.socket_path):
+                os.unlink(shard.socket_path)
+        logger.info("All workers stopped")
+
+
+async def poll(bot: Bot, supervisor: Supervisor, allowed_updates: list):
+    """
+    Длинный опрос getUpdates с пересылкой обновлений воркерам (до отмены).
+
+    Смещение сдвигается только после пересылки обновления: если воркер
+    недоступен, Telegram вернет обновление в следующем getUpdates.
+    """
+    # Вебхук, оставшийся после режима webhook, не дает получать getUpdates
+    await bot.delete_webhook()
+    offset = None
+    backoff = 1
+    while True:
+        try:
+            updates = await bot.get_updates(
+                offset=offset, timeout=_POLLING_TIMEOUT, allowed_updates=allowed_updates
+            )
+            for update in updates:
+                await supervisor.feed_update(bot, update)
+                offset = update.update_id + 1
+        except Exception as e:
+            logger.error(f"Error receiving or forwarding updates: {e!r}, retrying in {backoff}s")
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, _POLLING_BACKOFF_MAX)
+            continue
+        backoff = 1
+
+
+async def supervise(workers: int):
+    from handlers import client_router, admin_router
+    from webhook import WebhookServer
+
+    if BOT_MODE not in ('polling', 'webhook'):
+        raise ValueError(f"Unknown BOT_MODE: {BOT_MODE!r} (expected 'polling' or 'webhook')")
+    if BOT_MODE == 'webhook' and not WEBHOOK_URL and not WEBHOOK_SECRET:
+        raise ValueError("BOT_MODE=webhook without WEBHOOK_URL requires WEBHOOK_SECRET")
+    if STORAGE_BACKEND == 'memory' and workers > 1:
+        raise ValueError("STORAGE_BACKEND=memory is per process: WORKERS > 1 requires postgres")
+
+    allowed_updates = sorted(
+        set(client_router.resolve_used_update_types()) | set(admin_router.resolve_used_update_types())
+    )
+    ipc_dir = SUPERVISOR_IPC_DIR or tempfile.mkdtemp(prefix='barbershop-bot-')
+    os.makedirs(ipc_dir, exist_ok=True)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    def stop_on_exit(task: asyncio.Task):
+        # Прием и перезапуск воркеров работают до остановки: завершение раньше - сбой
+        if not task.cancelled():
+            logger.error(f"{task.get_name()} exited unexpectedly: {task.exception()!r}, stopping")
+            stop.set()
+
+    supervisor = Supervisor(workers, ipc_dir)
+    bot = Bot(token=BOT_TOKEN)
+    server = None
+    receiver = None
+    watcher = None
+    try:
+        await supervisor.start()
+        watcher = asyncio.create_task(supervisor.watch(), name="Worker watcher")
+        watcher.add_done_callback(stop_on_exit)
+
+        if BOT_MODE == 'webhook':
+            server = WebhookServer(
+                supervisor, bot, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_DRAIN_TIMEOUT_SECONDS
+            )
+            await server.start(
+                WEBHOOK_HOST,
+                WEBHOOK_PORT,
+                WEBHOOK_URL,
+                allowed_updates=allowed_updates,
+                max_connections=WEBHOOK_MAX_CONNECTIONS
+            )
+        else:
+            receiver = asyncio.create_task(poll(bot, supervisor, allowed_updates), name="Polling")
+            receiver.add_done_callback(stop_on_exit)
+        logger.info(f"Supervisor started ({BOT_MODE}, {workers} workers)")
+        await stop.wait()
+    finally:
+        # Сначала прекращается прием, затем воркеры дорабатывают принятые обновления
+        if server is not None:
+            await server.stop()
+        for task in (receiver, watcher):
+            if task is not None:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        await supervisor.stop()
+        await bot.session.close()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.remove_signal_handler(sig)
+        logger.info("Supervisor stopped")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - supervisor - %(name)s - %(levelname)s - %(message)s'
+    )
+    asyncio.run(supervise(WORKERS or os.cpu_count() or 1))
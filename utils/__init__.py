@@ -5,12 +5,31 @@ from .helpers import (
     get_available_masters,
     get_available_dates,
     get_available_time_slots,
+    get_nearest_slots,
+    get_alternative_slots,
+    hold_slot,
     is_admin
 )
+from .schedule import ScheduleIndex, schedule_index
+from .startup import StartupTimer, FirstPollMiddleware
+from .fsm_storage import BoundedFSMStorage, fsm_storage, snapshot_from_config
+from .user_queues import UserQueueIsolation, user_queues
 
 __all__ = [
     'get_available_masters',
     'get_available_dates',
     'get_available_time_slots',
-    'is_admin'
+    'get_nearest_slots',
+    'get_alternative_slots',
+    'hold_slot',
+    'is_admin',
+    'ScheduleIndex',
+    'schedule_index',
+    'StartupTimer',
+    'FirstPollMiddleware',
+    'BoundedFSMStorage',
+    'fsm_storage',
+    'snapshot_from_config',
+    'UserQueueIsolation',
+    'user_queues'
 ]
@@ -0,0 +1,390 @@
+"""
+Хранилище состояний FSM с ограничением памяти
+
+BoundedFSMStorage заменяет MemoryStorage aiogram. Сессия (состояние и данные
+сценария записи) хранится компактной записью: id услуги, номер мастера
+в графике, порядковый номер даты и номер слота вместо словаря строк;
+название и длительность услуги берутся из каталога при чтении. Сессия,
+к которой не обращались FSM_SESSION_TTL_SECONDS, удаляется, а при
+FSM_MAX_SESSIONS вытесняется давно не использованная: брошенные на полпути
+сценарии не копятся в памяти процесса.
+
+Необязательные снимки (FSM_SNAPSHOT) сохраняют сессии в файл или таблицу
+fsm_sessions периодически и при остановке и восстанавливают их при запуске,
+поэтому перезапуск не прерывает незавершенные записи.
+"""
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timezone
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StorageKey
+
+from config import (
+    FSM_SESSION_TTL_SECONDS,
+    FSM_MAX_SESSIONS,
+    FSM_SNAPSHOT,
+    FSM_SNAPSHOT_PATH,
+    STORAGE_BACKEND
+)
+from database import services_catalogue, save_fsm_sessions, load_fsm_sessions
+from database.occupancy import SLOT_LABELS
+from monitoring import REGISTRY
+from .schedule import schedule_index
+
+logger = logging.getLogger(__name__)
+
+_SLOT_INDEX = {label: index for index, label in enumerate(SLOT_LABELS)}
+# Размер выборки сессий для оценки памяти на сессию
+_SIZE_SAMPLE = 100
+
+
+class _Session:
+    """Компактная сессия: None в поле - значения нет (или оно лежит в extra)"""
+
+    __slots__ = ('state', 'service_id', 'service_derived', 'master', 'day', 'slot',
+                 'extra', 'expires_at')
+
+    def __init__(self):
+        self.state = None
+        self.service_id = None
+        # service_name и service_duration совпадали с каталогом и не хранятся
+        self.service_derived = False
+        self.master = None
+        self.day = None
+        self.slot = None
+        self.extra = None
+        self.expires_at = 0.0
+
+    def is_empty(self) -> bool:
+        return (self.state is None and self.service_id is None and self.master is None
+                and self.day is None and self.slot is None and not self.extra)
+
+
+def _compact_key(key: StorageKey):
+    """
+    Ключ словаря сессий: обычный ключ личного чата (без темы, бизнес-подключения
+    и с destiny по умолчанию) хранится кортежем (bot_id, chat_id, user_id)
+    """
+    if key.thread_id is None and key.business_connection_id is None and key.destiny == 'default':
+        return key.bot_id, key.chat_id, key.user_id
+    return key
+
+
+def _expand_key(key) -> StorageKey:
+    if isinstance(key, StorageKey):
+        return key
+    return StorageKey(bot_id=key[0], chat_id=key[1], user_id=key[2])
+
+
+def _deep_size(value) -> int:
+    """Размер значения вместе с вложенными контейнерами (байт)"""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_deep_size(k) + _deep_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set)):
+        size += sum(_deep_size(item) for item in value)
+    return size
+
+
+class FileSnapshot:
+    """Снимок сессий в JSON-файле (запись через временный файл и замену)"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    async def save(self, sessions: list):
+        await asyncio.to_thread(self._write, [
+            [*session[:8], session[8].timestamp()] for session in sessions
+        ])
+
+    def _write(self, sessions: list):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': 1, 'sessions': sessions}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    async def load(self) -> list:
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, encoding='utf-8') as f:
+            snapshot = json.load(f)
+        now = time.time()
+        return [(*session[:8], datetime.fromtimestamp(session[8], timezone.utc))
+                for session in snapshot['sessions'] if session[8] > now]
+
+
+class PostgresSnapshot:
+    """Снимок сессий в таблице fsm_sessions (только пользователи шарда shard из shards)"""
+
+    def __init__(self, shard: int = 0, shards: int = 1):
+        self.shard = shard
+        self.shards = shards
+
+    async def save(self, sessions: list):
+        await save_fsm_sessions(sessions, self.shard, self.shards)
+
+    async def load(self) -> list:
+        return await load_fsm_sessions(self.shard, self.shards)
+
+
+class BoundedFSMStorage(BaseStorage):
+    """
+    Сессии FSM в OrderedDict в порядке последнего обращения.
+
+    Срок жизни одинаков для всех сессий и продлевается при каждом обращении,
+    поэтому порядок обращений совпадает с порядком истечения: истекшие
+    сессии снимаются с начала словаря при добавлении новой, а сессия,
+    истекшая раньше, отбрасывается при чтении. Пустые сессии (без состояния
+    и данных) не хранятся.
+
+    snapshot - объект с методами save(sessions) и load() или None.
+    """
+
+    def __init__(self, ttl: float, max_sessions: int, snapshot=None):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.snapshot = snapshot
+        self._sessions = OrderedDict()
+        self._master_index = {master: index for index, master in enumerate(schedule_index.masters)}
+        self._expired = 0
+        self._evicted = 0
+
+    def _get(self, key, now: float = None):
+        """Действующая сессия ключа (срок продлевается) или None"""
+        session = self._sessions.get(key)
+        if session is None:
+            return None
+        now = time.monotonic() if now is None else now
+        if session.expires_at <= now:
+            del self._sessions[key]
+            self._expired += 1
+            return None
+        session.expires_at = now + self.ttl
+        self._sessions.move_to_end(key)
+        return session
+
+    def _get_or_create(self, key) -> _Session:
+        now = time.monotonic()
+        session = self._get(key, now)
+        if session is not None:
+            return session
+
+        # Сначала снимаются истекшие, затем давно не использованные сверх предела
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if oldest.expires_at > now:
+                break
+            self._sessions.popitem(last=False)
+            self._expired += 1
+        while len(self._sessions) >= self.max_sessions:
+            self._sessions.popitem(last=False)
+            self._evicted += 1
+
+        session = _Session()
+        session.expires_at = now + self.ttl
+        self._sessions[key] = session
+        return session
+
+    def _discard_if_empty(self, key, session: _Session):
+        if session.is_empty():
+            self._sessions.pop(key, None)
+
+    async def set_state(self, key: StorageKey, state=None) -> None:
+        state = state.state if isinstance(state, State) else state
+        key = _compact_key(key)
+        if state is None and key not in self._sessions:
+            return
+        session = self._get_or_create(key)
+        session.state = state
+        self._discard_if_empty(key, session)
+
+    async def get_state(self, key: StorageKey):
+        session = self._get(_compact_key(key))
+        return session.state if session is not None else None
+
+    async def set_data(self, key: StorageKey, data: dict) -> None:
+        key = _compact_key(key)
+        if not data and key not in self._sessions:
+            return
+        session = self._get_or_create(key)
+        await self._encode(session, data)
+        self._discard_if_empty(key, session)
+
+    async def get_data(self, key: StorageKey) -> dict:
+        session = self._get(_compact_key(key))
+        return await self._decode(session) if session is not None else {}
+
+    async def _encode(self, session: _Session, data: dict):
+        """Разложить данные сценария по полям сессии; прочие ключи - в extra"""
+        extra = dict(data)
+        session.service_id = session.master = session.day = session.slot = None
+        session.service_derived = False
+
+        service_id = extra.get('service_id')
+        if type(service_id) is int:
+            session.service_id = extra.pop('service_id')
+            service = await services_catalogue.get(service_id)
+            if (service is not None
+                    and extra.get('service_name') == service['name']
+                    and extra.get('service_duration') == service['duration_minutes']):
+                del extra['service_name'], extra['service_duration']
+                session.service_derived = True
+
+        master = extra.get('master')
+        if isinstance(master, str) and master in self._master_index:
+            session.master = self._master_index[extra.pop('master')]
+
+        booking_date = extra.get('booking_date')
+        if isinstance(booking_date, str):
+            try:
+                day = date.fromisoformat(booking_date)
+            except ValueError:
+                day = None
+            if day is not None and day.isoformat() == booking_date:
+                session.day = day.toordinal()
+                del extra['booking_date']
+
+        booking_time = extra.get('booking_time')
+        if isinstance(booking_time, str) and booking_time in _SLOT_INDEX:
+            session.slot = _SLOT_INDEX[extra.pop('booking_time')]
+
+        session.extra = extra or None
+
+    async def _decode(self, session: _Session) -> dict:
+        """Данные сценария в том виде, в каком их записали обработчики"""
+        data = {}
+        if session.service_id is not None:
+            data['service_id'] = session.service_id
+            if session.service_derived:
+                service = await services_catalogue.get(session.service_id)
+                if service is not None:
+                    data['service_name'] = service['name']
+                    data['service_duration'] = service['duration_minutes']
+        if session.master is not None:
+            data['master'] = schedule_index.masters[session.master]
+        if session.day is not None:
+            data['booking_date'] = date.fromordinal(session.day).isoformat()
+        if session.slot is not None:
+            data['booking_time'] = SLOT_LABELS[session.slot]
+        if session.extra:
+            data.update(session.extra)
+        return data
+
+    def stats(self) -> dict:
+        """Число сессий, истекшие и вытесненные сессии, оценка памяти на сессию (байт)"""
+        count = len(self._sessions)
+        bytes_per_session = 0
+        if count:
+            sample = list(self._sessions.items())[-_SIZE_SAMPLE:]
+            sampled = sum(
+                _deep_size(key if isinstance(key, tuple) else vars(key))
+                + sys.getsizeof(session) + sys.getsizeof(session.day)
+                + (_deep_size(session.extra) if session.extra else 0)
+                for key, session in sample
+            )
+            # Доля самого словаря (хэш-таблица и связный список порядка) на одну сессию
+            bytes_per_session = (sampled / len(sample)
+                                 + sys.getsizeof(self._sessions) / count)
+        return {
+            'sessions': count,
+            'max_sessions': self.max_sessions,
+            'expired': self._expired,
+            'evicted': self._evicted,
+            'bytes_per_session': bytes_per_session,
+        }
+
+    async def save_snapshot(self) -> int:
+        """Сохранить действующие сессии в снимок; вернуть их количество"""
+        if self.snapshot is None:
+            return 0
+        now = time.monotonic()
+        wall_now = time.time()
+        sessions = []
+        for key, session in list(self._sessions.items()):
+            if session.expires_at <= now:
+                continue
+            key = _expand_key(key)
+            sessions.append((
+                key.bot_id, key.chat_id, key.user_id, key.thread_id,
+                key.business_connection_id, key.destiny, session.state,
+                await self._decode(session),
+                # Срок в UTC: сравнивается с now() сервера БД в любом часовом поясе
+                datetime.fromtimestamp(wall_now + session.expires_at - now, timezone.utc)
+            ))
+        await self.snapshot.save(sessions)
+        return len(sessions)
+
+    async def restore_snapshot(self) -> int:
+        """Загрузить сессии из снимка (вызывается при запуске); вернуть их количество"""
+        if self.snapshot is None:
+            return 0
+        try:
+            sessions = await self.snapshot.load()
+        except Exception as e:
+            # Без снимка бот работает, незавершенные сценарии начинаются заново
+            logger.error(f"Error loading FSM sessions snapshot: {e}")
+            return 0
+        now = time.monotonic()
+        wall_now = time.time()
+        # По возрастанию срока: порядок словаря остается порядком истечения
+        sessions.sort(key=lambda session: session[8])
+        for (bot_id, chat_id, user_id, thread_id, business_connection_id,
+             destiny, state, data, expires_at) in sessions[-self.max_sessions:]:
+            key = StorageKey(
+                bot_id=bot_id, chat_id=chat_id, user_id=user_id, thread_id=thread_id,
+                business_connection_id=business_connection_id, destiny=destiny
+            )
+            session = _Session()
+            session.state = state
+            await self._encode(session, data)
+            session.expires_at = now + min(self.ttl, expires_at.timestamp() - wall_now)
+            if not session.is_empty():
+                self._sessions[_compact_key(key)] = session
+        logger.info(f"Restored {len(self._sessions)} FSM sessions from snapshot")
+        return len(self._sessions)
+
+    async def close(self) -> None:
+        # Вызывается и обработчиком остановки Dispatcher (dp.fsm.close), поэтому
+        # снимок здесь не пишется: при остановке его сохраняет main.close_bot
+        pass
+
+
+def snapshot_from_config(shard: int = 0, shards: int = 1):
+    """
+    Снимок по FSM_SNAPSHOT: '' - без снимков, 'file' или 'postgres'.
+
+    В процессе-воркере (shards > 1) снимок хранит только пользователей
+    его шарда: файл - FSM_SNAPSHOT_PATH с номером шарда, таблица -
+    строки с user_id % shards = shard.
+    """
+    if not FSM_SNAPSHOT:
+        return None
+    if FSM_SNAPSHOT == 'file':
+        return FileSnapshot(FSM_SNAPSHOT_PATH if shards == 1 else f"{FSM_SNAPSHOT_PATH}.{shard}")
+    if FSM_SNAPSHOT == 'postgres':
+        if STORAGE_BACKEND != 'postgres':
+            raise ValueError("FSM_SNAPSHOT=postgres requires STORAGE_BACKEND=postgres")
+        return PostgresSnapshot(shard, shards)
+    raise ValueError(f"Unknown FSM_SNAPSHOT: {FSM_SNAPSHOT!r} (expected '', 'file' or 'postgres')")
+
+
+fsm_storage = BoundedFSMStorage(FSM_SESSION_TTL_SECONDS, FSM_MAX_SESSIONS, snapshot_from_config())
+
+
+def _fsm_collector() -> list:
+    stats = fsm_storage.stats()
+    return [
+        ('fsm_sessions', 'gauge', 'Active FSM sessions', stats['sessions']),
+        ('fsm_session_bytes', 'gauge', 'Estimated memory per FSM session', stats['bytes_per_session']),
+        ('fsm_sessions_expired_total', 'counter', 'FSM sessions dropped after TTL', stats['expired']),
+        ('fsm_sessions_evicted_total', 'counter', 'FSM sessions evicted by the size cap', stats['evicted']),
+    ]
+
+
+REGISTRY.add_collector(_fsm_collector)
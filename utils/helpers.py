@@ -1,84 +1,157 @@
 """
 Вспомогательные функции
 """
-from datetime import datetime, timedelta, time
-from config import MASTERS_SCHEDULE, BOOKING_DAYS_AHEAD, SLOT_DURATION_MINUTES, ADMIN_IDS
-from database.models import get_bookings_by_master_date_time
+from datetime import date, datetime, timedelta
+from heapq import merge
+from itertools import islice
+from config import ADMIN_IDS, BOOKING_DAYS_AHEAD, SLOT_DURATION_MINUTES
+from database.models import get_occupancy, get_occupancy_horizon
+from database.occupancy import SLOT_LABELS, iter_slots, slot_index, span_bits
+from database.slot_holds import slot_holds
+from .schedule import schedule_index, WEEKDAY_NAMES
 
 
 def get_available_masters() -> list:
     """Получить список всех мастеров"""
-    return list(MASTERS_SCHEDULE.keys())
+    return list(schedule_index.masters)
 
 
-def get_available_dates(master: str) -> list:
-    """Получить доступные даты для мастера (сегодня + N дней)"""
-    schedule = MASTERS_SCHEDULE.get(master)
-    if not schedule:
-        return []
+async def get_available_dates(master: str, duration_minutes: int = SLOT_DURATION_MINUTES) -> list:
+    """
+    Получить доступные даты для мастера (сегодня + N дней).
 
-    available_dates = []
-    today = datetime.now().date()
+    Дни, в которые услуга длительностью duration_minutes не помещается,
+    не возвращаются, к подписи остальных добавляется число свободных
+    времен начала. Занятость всего периода загружается одним запросом.
+    """
+    now = datetime.now()
+    today = now.date()
+    dates = schedule_index.dates(master, today)
+    if not dates:
+        return []
 
-    for i in range(BOOKING_DAYS_AHEAD + 1):
-        date = today + timedelta(days=i)
-        weekday = date.weekday()
-
-        if weekday in schedule['days']:
-            # Форматируем дату для отображения
-            if i == 0:
-                display = f"Сегодня ({date.strftime('%d.%m')})"
-            elif i == 1:
-                display = f"Завтра ({date.strftime('%d.%m')})"
-            else:
-                weekday_names = ['ПН', 'ВТ', 'СР', 'ЧТ', 'ПТ', 'СБ', 'ВС']
-                display = f"{weekday_names[weekday]} {date.strftime('%d.%m')}"
+    horizon = await get_occupancy_horizon(
+        [master], today, today + timedelta(days=BOOKING_DAYS_AHEAD)
+    )
 
+    available_dates = []
+    for date_info in dates:
+        day = date_info['date']
+        occupancy = horizon[(master, day)] | slot_holds.held_mask(master, day)
+        free_count = schedule_index.free_count(master, day, occupancy, now, duration_minutes)
+        if free_count:
             available_dates.append({
-                'display': display,
-                'value': date.isoformat()
+                'display': f"{date_info['display']} · {free_count} свободно",
+                'value': date_info['value']
             })
 
     return available_dates
 
 
-def get_available_time_slots(master: str, date_str: str) -> list:
-    """Получить свободные временные слоты для мастера на дату"""
-    schedule = MASTERS_SCHEDULE.get(master)
-    if not schedule:
-        return []
-
-    # Парсим время работы
-    start_time = datetime.strptime(schedule['start'], '%H:%M').time()
-    end_time = datetime.strptime(schedule['end'], '%H:%M').time()
+async def get_available_time_slots(master: str, date_str: str,
+                                   duration_minutes: int = SLOT_DURATION_MINUTES,
+                                   user_id: int = None) -> list:
+    """
+    Получить времена начала, с которых услуга целиком помещается в свободные слоты.
 
-    # Генерируем все возможные слоты
-    slots = []
-    current_time = datetime.combine(datetime.today(), start_time)
-    end_datetime = datetime.combine(datetime.today(), end_time)
-
-    while current_time < end_datetime:
-        slot_time = current_time.strftime('%H:%M')
-
-        # Проверяем, занят ли слот
-        is_booked = get_bookings_by_master_date_time(master, date_str, slot_time)
-
-        # Если слот свободен, добавляем
-        if not is_booked:
-            # Дополнительная проверка: если дата сегодня, не показываем прошедшие слоты
-            date_obj = datetime.fromisoformat(date_str).date()
-            if date_obj == datetime.now().date():
-                slot_datetime = datetime.strptime(slot_time, '%H:%M').time()
-                current_now = datetime.now().time()
-                if slot_datetime <= current_now:
-                    current_time += timedelta(minutes=SLOT_DURATION_MINUTES)
-                    continue
+    Слоты, удерживаемые другими пользователями, считаются занятыми.
+    """
+    if not schedule_index.has_master(master):
+        return []
 
-            slots.append(slot_time)
+    # Битовая карта занятости мастера на дату - одним запросом
+    booking_date = date.fromisoformat(date_str)
+    occupancy = await get_occupancy(master, booking_date)
+    occupancy |= slot_holds.held_mask(master, booking_date, exclude_user=user_id)
+
+    # Прошедшие слоты сегодняшнего дня отсекаются по одному "сейчас"
+    return schedule_index.free_slots(
+        master, booking_date, occupancy, datetime.now(), duration_minutes
+    )
+
+
+async def hold_slot(user_id: int, master: str, date_str: str, booking_time: str,
+                    duration_minutes: int = SLOT_DURATION_MINUTES) -> bool:
+    """
+    Удержать выбранное время за пользователем до подтверждения записи.
+
+    Возвращает False, если время уже занято или удерживается другим пользователем.
+    """
+    booking_date = date.fromisoformat(date_str)
+    bits = span_bits(booking_time, duration_minutes)
+    if await get_occupancy(master, booking_date) & bits:
+        return False
+    return slot_holds.hold(user_id, master, booking_date, bits)
+
+
+def get_alternative_slots(master: str, date_str: str, occupancy: int, requested_time: str,
+                          limit: int, duration_minutes: int = SLOT_DURATION_MINUTES,
+                          user_id: int = None) -> list:
+    """
+    Подобрать замену занятому времени по уже известной занятости.
+
+    Сначала предлагаются ближайшие времена после requested_time,
+    затем - более ранние. Запросов к БД не выполняет.
+    """
+    booking_date = date.fromisoformat(date_str)
+    occupancy |= slot_holds.held_mask(master, booking_date, exclude_user=user_id)
+    free = schedule_index.free_mask(master, booking_date, occupancy, datetime.now(), duration_minutes)
+
+    requested = slot_index(requested_time)
+    later = [index for index in iter_slots(free) if index > requested]
+    earlier = [index for index in iter_slots(free) if index < requested]
+    return [SLOT_LABELS[index] for index in (later + earlier[::-1])[:limit]]
+
+
+def _tagged_slots(free_mask: int, order: int, master: str):
+    """Свободные слоты мастера как (номер слота, порядок мастера, мастер)"""
+    for index in iter_slots(free_mask):
+        yield index, order, master
+
+
+async def get_nearest_slots(limit: int, duration_minutes: int = SLOT_DURATION_MINUTES) -> list:
+    """
+    Получить limit ближайших времен начала услуги у всех мастеров.
+
+    Занятость всех мастеров на весь горизонт загружается одним запросом,
+    затем свободные слоты каждого дня сливаются по времени
+    (при равном времени - в порядке мастеров в графике).
+    """
+    now = datetime.now()
+    today = now.date()
+    masters = schedule_index.masters
+    horizon = await get_occupancy_horizon(
+        masters, today, today + timedelta(days=BOOKING_DAYS_AHEAD)
+    )
+
+    nearest = []
+    for i in range(BOOKING_DAYS_AHEAD + 1):
+        day = today + timedelta(days=i)
+        day_slots = merge(*(
+            _tagged_slots(
+                schedule_index.free_mask(
+                    master, day, horizon[(master, day)] | slot_holds.held_mask(master, day),
+                    now, duration_minutes
+                ),
+                order, master
+            )
+            for order, master in enumerate(masters)
+            if schedule_index.works_on(master, day)
+        ))
+
+        for index, _, master in islice(day_slots, limit - len(nearest)):
+            slot = SLOT_LABELS[index]
+            nearest.append({
+                'master': master,
+                'date': day.isoformat(),
+                'time': slot,
+                'display': f"{WEEKDAY_NAMES[day.weekday()]} {day.strftime('%d.%m')} {slot} · {master}"
+            })
 
-        current_time += timedelta(minutes=SLOT_DURATION_MINUTES)
+        if len(nearest) >= limit:
+            break
 
-    return slots
+    return nearest
 
 
 def is_admin(user_id: int) -> bool:
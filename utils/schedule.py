@@ -0,0 +1,131 @@
+"""
+Индекс графиков мастеров, построенный один раз при запуске
+"""
+from datetime import date, datetime, timedelta
+from config import MASTERS_SCHEDULE, BOOKING_DAYS_AHEAD, SLOT_DURATION_MINUTES
+from database.occupancy import SLOT_LABELS, first_slot, mask_labels, slots_needed
+
+WEEKDAY_NAMES = ('ПН', 'ВТ', 'СР', 'ЧТ', 'ПТ', 'СБ', 'ВС')
+
+
+class ScheduleIndex:
+    """
+    Предвычисленные графики мастеров.
+
+    Хранит для каждого мастера битовую маску рабочих слотов
+    (в нумерации database.occupancy), дни работы и обратный индекс
+    день недели -> мастера. Список дат с подписями строится один раз
+    на календарный день.
+    """
+
+    def __init__(self, schedule: dict, slot_minutes: int, days_ahead: int):
+        self.masters = tuple(schedule)
+        self.slot_minutes = slot_minutes
+        self.days_ahead = days_ahead
+        self._work_days = {}
+        self._work_masks = {}
+        self.masters_by_weekday = {weekday: () for weekday in range(7)}
+
+        for master, master_schedule in schedule.items():
+            start = self._minutes(master_schedule['start'])
+            end = self._minutes(master_schedule['end'])
+            if start % slot_minutes:
+                raise ValueError(
+                    f"Schedule of '{master}' starts at {master_schedule['start']}, "
+                    f"which is not aligned to {slot_minutes}-minute slots"
+                )
+
+            first = start // slot_minutes
+            last = -(-end // slot_minutes)
+            self._work_masks[master] = ((1 << last) - 1) ^ ((1 << first) - 1)
+            self._work_days[master] = frozenset(master_schedule['days'])
+            for weekday in master_schedule['days']:
+                self.masters_by_weekday[weekday] += (master,)
+
+        self._dates_day = None
+        self._dates_by_master = {}
+
+    @staticmethod
+    def _minutes(value: str) -> int:
+        hours, minutes = value.split(':')
+        return int(hours) * 60 + int(minutes)
+
+    def has_master(self, master: str) -> bool:
+        """Есть ли мастер в графике"""
+        return master in self._work_masks
+
+    def work_mask(self, master: str) -> int:
+        """Битовая маска рабочих слотов мастера"""
+        return self._work_masks.get(master, 0)
+
+    def slots(self, master: str) -> list:
+        """Все слоты рабочего дня мастера ('ЧЧ:ММ')"""
+        return mask_labels(self.work_mask(master))
+
+    def works_on(self, master: str, day: date) -> bool:
+        """Работает ли мастер в этот день"""
+        return day.weekday() in self._work_days.get(master, ())
+
+    def past_mask(self, booking_date: date, now: datetime) -> int:
+        """Маска слотов, которые уже начались к моменту now"""
+        if booking_date != now.date():
+            return 0
+        first_future = (now.hour * 60 + now.minute) // self.slot_minutes + 1
+        return (1 << first_future) - 1
+
+    def free_mask(self, master: str, booking_date: date, occupancy: int, now: datetime,
+                  duration_minutes: int = SLOT_DURATION_MINUTES) -> int:
+        """
+        Маска слотов, с которых можно начать услугу длительностью duration_minutes.
+
+        Слот подходит, если он не прошел, а он и следующие за ним слоты
+        на всю длительность услуги рабочие и не заняты.
+        """
+        available = self.work_mask(master) & ~occupancy
+        starts = available
+        for shift in range(1, slots_needed(duration_minutes)):
+            starts &= available >> shift
+        return starts & ~self.past_mask(booking_date, now)
+
+    def free_slots(self, master: str, booking_date: date, occupancy: int, now: datetime,
+                   duration_minutes: int = SLOT_DURATION_MINUTES) -> list:
+        """Свободные времена начала услуги ('ЧЧ:ММ')"""
+        return mask_labels(self.free_mask(master, booking_date, occupancy, now, duration_minutes))
+
+    def first_free_slot(self, master: str, booking_date: date, occupancy: int, now: datetime,
+                        duration_minutes: int = SLOT_DURATION_MINUTES):
+        """Первое свободное время начала услуги ('ЧЧ:ММ') или None"""
+        index = first_slot(self.free_mask(master, booking_date, occupancy, now, duration_minutes))
+        return SLOT_LABELS[index] if index >= 0 else None
+
+    def free_count(self, master: str, booking_date: date, occupancy: int, now: datetime,
+                   duration_minutes: int = SLOT_DURATION_MINUTES) -> int:
+        """Количество свободных времен начала услуги"""
+        return self.free_mask(master, booking_date, occupancy, now, duration_minutes).bit_count()
+
+    def dates(self, master: str, today: date) -> list:
+        """Рабочие дни мастера от today на days_ahead дней вперед (с подписями)"""
+        if self._dates_day != today:
+            self._build_dates(today)
+        return self._dates_by_master.get(master, [])
+
+    def _build_dates(self, today: date):
+        by_master = {master: [] for master in self.masters}
+        for i in range(self.days_ahead + 1):
+            day = today + timedelta(days=i)
+            if i == 0:
+                display = f"Сегодня ({day.strftime('%d.%m')})"
+            elif i == 1:
+                display = f"Завтра ({day.strftime('%d.%m')})"
+            else:
+                display = f"{WEEKDAY_NAMES[day.weekday()]} {day.strftime('%d.%m')}"
+
+            date_info = {'display': display, 'value': day.isoformat(), 'date': day}
+            for master in self.masters_by_weekday[day.weekday()]:
+                by_master[master].append(date_info)
+
+        self._dates_by_master = by_master
+        self._dates_day = today
+
+
+schedule_index = ScheduleIndex(MASTERS_SCHEDULE, SLOT_DURATION_MINUTES, BOOKING_DAYS_AHEAD)
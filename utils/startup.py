@@ -0,0 +1,49 @@
+"""
+Замер этапов запуска бота
+
+StartupTimer отмечает окончание этапов (импорты, пул, миграции, ...),
+FirstPollMiddleware отмечает первый запрос getUpdates и пишет
+итоговую разбивку времени запуска в лог.
+"""
+import time
+import logging
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.methods import GetUpdates
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTimer:
+    """Длительности этапов запуска, отсчитываемые от момента started"""
+
+    def __init__(self, started: float = None):
+        self._started = time.perf_counter() if started is None else started
+        self._last = self._started
+        self._stages = []
+
+    def mark(self, stage: str):
+        """Отметить окончание этапа stage"""
+        now = time.perf_counter()
+        self._stages.append((stage, now - self._last))
+        self._last = now
+
+    def summary(self) -> str:
+        """Строка вида "imports=310ms pool=45ms ... total=1020ms" """
+        parts = [f"{stage}={duration * 1000:.0f}ms" for stage, duration in self._stages]
+        parts.append(f"total={(self._last - self._started) * 1000:.0f}ms")
+        return ' '.join(parts)
+
+
+class FirstPollMiddleware(BaseRequestMiddleware):
+    """Отмечает этап first_poll при первом getUpdates и пишет разбивку запуска в лог"""
+
+    def __init__(self, timer: StartupTimer):
+        self._timer = timer
+        self._done = False
+
+    async def __call__(self, make_request, bot, method):
+        if not self._done and isinstance(method, GetUpdates):
+            self._done = True
+            self._timer.mark('first_poll')
+            logger.info(f"Startup: {self._timer.summary()}")
+        return await make_request(bot, method)
@@ -0,0 +1,104 @@
+"""
+Очереди обновлений по пользователям
+
+Обновления разных пользователей обрабатываются параллельно (задачи
+dp.start_polling или вебхука), а обновления одного пользователя -
+строго по очереди прихода: два быстрых нажатия date:/time: не выполняются
+одновременно внутри BookingStates, и второе видит состояние, записанное
+первым.
+
+UserQueueIsolation подключается к Dispatcher как events_isolation:
+FSMContextMiddleware берет очередь до чтения состояния и держит ее
+до конца обработки.
+"""
+from collections import deque
+from contextlib import asynccontextmanager
+import asyncio
+
+from aiogram.fsm.storage.base import BaseEventIsolation, StorageKey
+
+from monitoring import REGISTRY
+
+USER_QUEUE_DEPTH = REGISTRY.histogram(
+    'bot_user_queue_depth', 'Updates in the user queue when an update arrives',
+    buckets=(1, 2, 3, 5, 10, 20, 50)
+)
+
+
+class UserQueueIsolation(BaseEventIsolation):
+    """
+    Очередь на пользователя: deque будущих, первое - у обновления, которое
+    обрабатывается, остальные ждут своей очереди.
+
+    Очередь создается при первом обновлении и удаляется, как только
+    опустеет, поэтому неактивные пользователи не занимают память.
+    Обновление, отмененное в ожидании, уходит из очереди, не задерживая
+    следующие.
+    """
+
+    def __init__(self):
+        self._queues = {}
+
+    @asynccontextmanager
+    async def lock(self, key: StorageKey):
+        # Очередь занимается без ожидания: порядок в очереди - порядок прихода
+        queue = self._queues.get(key.user_id)
+        if queue is None:
+            queue = self._queues[key.user_id] = deque()
+        turn = asyncio.get_running_loop().create_future()
+        queue.append(turn)
+        USER_QUEUE_DEPTH.observe(len(queue))
+        if len(queue) == 1:
+            turn.set_result(None)
+
+        try:
+            await turn
+            yield
+        finally:
+            self._release(key.user_id, queue, turn)
+
+    def _release(self, user_id: int, queue: deque, turn: asyncio.Future):
+        if not queue or queue[0] is not turn:
+            # Отменено в ожидании
+            try:
+                queue.remove(turn)
+            except ValueError:
+                pass
+            return
+
+        queue.popleft()
+        # Очередь переходит к следующему ожидающему (отмененные пропускаются)
+        while queue:
+            if not queue[0].done():
+                queue[0].set_result(None)
+                return
+            queue.popleft()
+        if self._queues.get(user_id) is queue:
+            del self._queues[user_id]
+
+    def stats(self) -> dict:
+        """Активные очереди, ожидающие обновления и самая длинная очередь"""
+        depths = [len(queue) for queue in self._queues.values()]
+        return {
+            'queues': len(depths),
+            'waiting': sum(depths) - len(depths),
+            'max_depth': max(depths, default=0),
+        }
+
+    async def close(self) -> None:
+        self._queues.clear()
+
+
+user_queues = UserQueueIsolation()
+
+
+def _user_queues_collector() -> list:
+    stats = user_queues.stats()
+    return [
+        ('bot_user_queues', 'gauge', 'Users with updates in processing', stats['queues']),
+        ('bot_user_queue_waiting', 'gauge', 'Updates waiting behind the same user', stats['waiting']),
+        ('bot_user_queue_max_depth', 'gauge', 'Longest user queue', stats['max_depth']),
+    ]
+
+
+REGISTRY.add_collector(_user_queues_collector)
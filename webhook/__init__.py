@@ -0,0 +1,9 @@
+"""
+Webhook module
+"""
+from .server import WebhookServer, SECRET_HEADER
+
+__all__ = [
+    'WebhookServer',
+    'SECRET_HEADER'
+]
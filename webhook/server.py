@@ -0,0 +1,136 @@
+"""
+Прием обновлений Telegram через вебхук
+
+WebhookServer - HTTP-сервер aiohttp, альтернатива dp.start_polling. Запрос
+с неверным секретом в заголовке X-Telegram-Bot-Api-Secret-Token отклоняется,
+принятое обновление подтверждается ответом 200 сразу, а обрабатывается
+в отдельной задаче: медленный обработчик не задерживает Telegram,
+и обновления обрабатываются параллельно.
+
+При остановке сервер отвечает 503 на новые запросы (Telegram повторит их
+позже) и ждет обработки уже принятых обновлений не дольше drain_timeout.
+"""
+import asyncio
+import hmac
+import logging
+import secrets
+
+from aiogram.types import Update
+from aiohttp import web
+
+from monitoring import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+WEBHOOK_REQUESTS = REGISTRY.counter(
+    'webhook_requests_total', 'Webhook requests by response status', ('status',)
+)
+WEBHOOK_ERRORS = REGISTRY.counter(
+    'webhook_update_errors_total', 'Accepted webhook updates that failed in processing'
+)
+
+
+class WebhookServer:
+    """
+    Сервер вебхука для диспетчера dp и бота bot. Вместо Dispatcher подходит
+    любой объект с корутиной feed_update(bot, update) (supervisor.py
+    пересылает обновления процессам-воркерам).
+
+    secret_token - секрет заголовка (пустой - случайный, годится, если
+    вебхук регистрируется этим же сервером в start).
+    """
+
+    def __init__(self, dp, bot, path: str = '/webhook', secret_token: str = '',
+                 drain_timeout: float = 30.0):
+        self._dp = dp
+        self._bot = bot
+        self.path = path
+        self.secret_token = secret_token or secrets.token_urlsafe(32)
+        self._drain_timeout = drain_timeout
+        self._tasks = set()
+        self._draining = False
+        self._runner = None
+
+        self.app = web.Application()
+        self.app.router.add_post(path, self._handle)
+
+    @property
+    def in_flight(self) -> int:
+        """Принятые, но еще не обработанные обновления"""
+        return len(self._tasks)
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        secret = request.headers.get(SECRET_HEADER, '')
+        if not hmac.compare_digest(secret.encode(), self.secret_token.encode()):
+            WEBHOOK_REQUESTS.inc('401')
+            return web.Response(status=401)
+        if self._draining:
+            WEBHOOK_REQUESTS.inc('503')
+            return web.Response(status=503)
+
+        try:
+            update = Update.model_validate(await request.json(), context={'bot': self._bot})
+        except ValueError as e:
+            WEBHOOK_REQUESTS.inc('400')
+            logger.warning(f"Malformed webhook update: {e}")
+            return web.Response(status=400)
+
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        WEBHOOK_REQUESTS.inc('200')
+        return web.Response()
+
+    async def _process(self, update: Update):
+        try:
+            await self._dp.feed_update(self._bot, update)
+        except Exception:
+            WEBHOOK_ERRORS.inc()
+            logger.exception(f"Error processing update {update.update_id}")
+
+    async def start(self, host: str, port: int, url: str = '', **webhook_options):
+        """
+        Запустить сервер на host:port.
+
+        Если задан url (публичный адрес без пути), вебхук регистрируется
+        в Telegram на url + path с секретом сервера; webhook_options
+        передаются в setWebhook (allowed_updates, max_connections, ...).
+        """
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        logger.info(f"Webhook server listening on http://{host}:{port}{self.path}")
+
+        if url:
+            await self._bot.set_webhook(
+                url.rstrip('/') + self.path,
+                secret_token=self.secret_token,
+                **webhook_options
+            )
+            logger.info(f"Webhook registered: {url.rstrip('/')}{self.path}")
+
+    async def stop(self):
+        """
+        Остановить прием и дождаться обработки принятых обновлений.
+
+        Вебхук в Telegram не удаляется: обновления, пришедшие до следующего
+        запуска, Telegram доставит повторно.
+        """
+        self._draining = True
+        if self._tasks:
+            logger.info(f"Draining {len(self._tasks)} webhook updates")
+            _, pending = await asyncio.wait(set(self._tasks), timeout=self._drain_timeout)
+            if pending:
+                logger.warning(
+                    f"{len(pending)} webhook updates not finished in "
+                    f"{self._drain_timeout}s, cancelling"
+                )
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+        logger.info("Webhook server stopped")